@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Content-addressed store of conversion outputs and intermediates, shared between builds.
+
+The build manifest only knows about outputs built in this checkout, so a
+fresh clone, a second developer machine or a CI runner reconverted every
+unchanged report from scratch. The store keeps what the converters
+produce under a key made of the input hash and everything else that shapes
+the result (the same fingerprint the manifest uses):
+
+    output    DOCX, PDF and HTML files (convert_all_docs, convert_markdown_to_docs)
+    ast       pandoc JSON ASTs (pandoc_ast, pandoc_batch, pandoc_jobs)
+    diagram   rendered diagram images (diagrams)
+
+so a build anywhere that already has a key turns that conversion into a
+file copy. Files are stored once by the hash of their contents, in
+objects/, and keys/ maps each key to a content hash; every write goes to a
+temporary file first and is renamed into place, so builds on several
+machines can share the directory, or restore it from a CI cache.
+
+The store is kept under a size cap (CONVERT_STORE_MAX_MB, 1024 MB by
+default): once it grows past it, trim() deletes the least recently used
+files until it is back under 90% of the cap. Hits and misses are counted
+per kind (stats(), and the store_* counters of conversion_profile); worker
+processes hand theirs to the parent with their results (take_stats()).
+
+It lives in .conversion-cache/store; set CONVERT_STORE_DIR to use another
+directory, or CONVERT_STORE=0 to turn it off. Run `python artifact_store.py`
+to see its size, or with --trim / --clear.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import conversion_profile
+from conversion_manifest import file_hash
+
+DEFAULT_STORE_DIR = Path(__file__).parent / '.conversion-cache' / 'store'
+DEFAULT_MAX_MB = 1024
+# trim() stops once the store is this far under its cap, so it does not run on every build
+TRIM_TARGET = 0.9
+ENV_STORE = 'CONVERT_STORE'
+ENV_STORE_DIR = 'CONVERT_STORE_DIR'
+ENV_STORE_MAX_MB = 'CONVERT_STORE_MAX_MB'
+
+_stats = {}
+# Process the counts in _stats belong to: a forked worker starts with a copy of its parent's
+_stats_pid = os.getpid()
+
+
+def enabled():
+    return os.environ.get(ENV_STORE, '').strip() != '0'
+
+
+def store_dir():
+    return Path(os.environ.get(ENV_STORE_DIR, '').strip() or DEFAULT_STORE_DIR)
+
+
+def max_bytes():
+    """The size cap in bytes, from CONVERT_STORE_MAX_MB."""
+    try:
+        megabytes = float(os.environ.get(ENV_STORE_MAX_MB, '') or DEFAULT_MAX_MB)
+    except ValueError:
+        megabytes = DEFAULT_MAX_MB
+    return int(megabytes * 1024 * 1024)
+
+
+def make_key(*parts):
+    """A store key from any JSON-serializable parts (hashes, fingerprints, names)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def output_key(md_path, format_type, fingerprint_key):
+    """Key of a converted output: the source's contents and name (outputs carry it as a title), format and build."""
+    return make_key('output', format_type, file_hash(md_path), Path(md_path).name, fingerprint_key)
+
+
+def _ref_path(kind, key):
+    return store_dir() / 'keys' / kind / key[:2] / key
+
+
+def _object_path(digest):
+    return store_dir() / 'objects' / digest[:2] / digest
+
+
+def _own_stats():
+    global _stats_pid
+    if _stats_pid != os.getpid():
+        _stats.clear()
+        _stats_pid = os.getpid()
+    return _stats
+
+
+def _count(kind, outcome):
+    counts = _own_stats().setdefault(kind, {'hits': 0, 'misses': 0, 'stored': 0})
+    counts[outcome] += 1
+    conversion_profile.count(f'store_{kind}_{outcome}')
+
+
+def stats():
+    """{kind: {'hits', 'misses', 'stored'}} for this process, and the workers' counts added to it."""
+    return {kind: dict(counts) for kind, counts in _own_stats().items()}
+
+
+def take_stats():
+    """stats(), then start counting from zero; a worker process returns these with its results."""
+    counts = stats()
+    _stats.clear()
+    return counts
+
+
+def add_stats(counts):
+    """Add the counts a worker process returned (see take_stats) to this process's."""
+    for kind, worker_counts in (counts or {}).items():
+        totals = _own_stats().setdefault(kind, {'hits': 0, 'misses': 0, 'stored': 0})
+        for outcome, amount in worker_counts.items():
+            totals[outcome] = totals.get(outcome, 0) + amount
+
+
+def _copy_atomic(source, destination):
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=destination.parent, prefix=f'.{destination.name}.', suffix='.tmp')
+    os.close(fd)
+    try:
+        shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def fetch(kind, key, destination):
+    """Copy the stored file for key to destination; False on a miss (or with the store off)."""
+    if not enabled():
+        return False
+    ref = _ref_path(kind, key)
+    try:
+        digest = ref.read_text(encoding='utf-8').strip()
+        stored = _object_path(digest)
+        _copy_atomic(stored, destination)
+        # The modification time is the last use, which trim() evicts by
+        os.utime(stored)
+    except OSError:
+        _count(kind, 'misses')
+        return False
+    _count(kind, 'hits')
+    return True
+
+
+def put(kind, key, source):
+    """Store a copy of the file source under key; returns True if it is stored."""
+    if not enabled():
+        return False
+    try:
+        digest = file_hash(source)
+        stored = _object_path(digest)
+        if stored.exists():
+            os.utime(stored)
+        else:
+            _copy_atomic(source, stored)
+        ref = _ref_path(kind, key)
+        ref.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = ref.with_name(f'{ref.name}.{os.getpid()}.tmp')
+        tmp_path.write_text(digest, encoding='utf-8')
+        os.replace(tmp_path, ref)
+    except OSError as e:
+        print(f"   [WARNING] Could not add to the artifact store: {e}")
+        return False
+    _count(kind, 'stored')
+    return True
+
+
+def _objects():
+    """(path, size, last use) of every stored file."""
+    found = []
+    root = store_dir() / 'objects'
+    if not root.is_dir():
+        return found
+    for bucket in os.scandir(root):
+        if not bucket.is_dir():
+            continue
+        for entry in os.scandir(bucket.path):
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            found.append((entry.path, stat.st_size, stat.st_mtime))
+    return found
+
+
+def usage():
+    """(number of stored files, their total size in bytes)."""
+    objects = _objects()
+    return len(objects), sum(size for _, size, _ in objects)
+
+
+def trim(limit=None):
+    """Evict the least recently used files if the store is over its cap; returns (files, bytes) removed."""
+    limit = max_bytes() if limit is None else limit
+    objects = _objects()
+    total = sum(size for _, size, _ in objects)
+    if total <= limit:
+        return 0, 0
+    removed = freed = 0
+    for path, size, _ in sorted(objects, key=lambda item: item[2]):
+        if total - freed <= limit * TRIM_TARGET:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            # In use by another build (Windows), or already evicted by one
+            continue
+        removed += 1
+        freed += size
+    # Keys of evicted files are dropped here, or as misses when they are next looked up
+    _prune_keys()
+    return removed, freed
+
+
+def _prune_keys():
+    root = store_dir() / 'keys'
+    if not root.is_dir():
+        return
+    for ref in root.glob('*/*/*'):
+        try:
+            if not _object_path(ref.read_text(encoding='utf-8').strip()).exists():
+                ref.unlink()
+        except OSError:
+            continue
+
+
+def report():
+    """Trim the store if it is over its cap, and print this process's hits and misses."""
+    if not enabled():
+        return
+    removed, freed = trim()
+    counts = stats()
+    if counts:
+        parts = ', '.join(f"{kind} {c['hits']} hits / {c['misses']} misses / {c['stored']} added"
+                          for kind, c in sorted(counts.items()))
+        print(f"[INFO] Artifact store: {parts}")
+    if removed:
+        print(f"[INFO] Artifact store: evicted {removed} least recently used files ({freed / 2**20:.1f} MB)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inspect and trim the conversion artifact store.')
+    parser.add_argument('--trim', action='store_true', help='Evict least recently used files down to the cap')
+    parser.add_argument('--max-mb', type=float,
+                        help=f'Size cap for --trim (default: {ENV_STORE_MAX_MB}, or {DEFAULT_MAX_MB})')
+    parser.add_argument('--clear', action='store_true', help='Delete everything in the store')
+    args = parser.parse_args(argv)
+
+    root = store_dir()
+    if args.clear:
+        shutil.rmtree(root, ignore_errors=True)
+        print(f"[SUCCESS] Cleared {root}")
+        return 0
+    if args.trim:
+        removed, freed = trim(int(args.max_mb * 2**20) if args.max_mb is not None else None)
+        print(f"[INFO] Evicted {removed} files ({freed / 2**20:.1f} MB)")
+    count, size = usage()
+    print(f"[INFO] {root}: {count} files, {size / 2**20:.1f} of {max_bytes() / 2**20:.0f} MB")
+    for kind in sorted((root / 'keys').glob('*')):
+        print(f"   {kind.name}: {sum(1 for _ in kind.glob('*/*'))} keys")
+    if not enabled():
+        print(f"[WARNING] The store is turned off ({ENV_STORE}=0)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
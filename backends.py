@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Cached discovery of the optional conversion backends.
+
+The converter scripts used to import pypandoc, python-docx, markdown and
+the whole reportlab stack at import time, just to set their HAS_* flags.
+That costs hundreds of milliseconds even when a run turns out to be a
+no-op. This module answers "is backend X installed?" with
+importlib.util.find_spec, which does not import anything. The answers are
+cached in .conversion-cache/backends.json, together with the library
+versions and the pandoc version (the latter needs a subprocess). The cache
+is keyed by the interpreter and the modification times of its
+site-packages directories, so installing or removing a package, or
+switching virtualenvs, triggers a fresh probe. The backends themselves are
+imported by the converter functions on first use.
+
+Run `python backends.py` to re-probe and print what is available.
+"""
+
+import importlib.util
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+PROBE_CACHE = Path(__file__).parent / '.conversion-cache' / 'backends.json'
+PROBE_VERSION = 1
+
+# Backend name -> modules that must all be importable
+BACKEND_MODULES = {
+    'pypandoc': ('pypandoc',),
+    'docx': ('docx',),
+    'markdown': ('markdown',),
+    'reportlab': ('reportlab',),
+    'pypdf': ('pypdf',),
+    'pygments': ('pygments',),
+    # LibreOffice's Python bridge (python3-uno), for libreoffice_pool
+    'uno': ('uno',),
+}
+# Distributions whose versions affect the generated documents
+TRACKED_DISTRIBUTIONS = ('pypandoc', 'python-docx', 'Markdown', 'reportlab', 'pypdf', 'Pygments')
+
+_probe = None
+
+
+def _environment_key():
+    """Identify the interpreter and its installed packages cheaply (a few stat calls)."""
+    paths = []
+    for entry in sys.path:
+        # Only package directories: the project directory changes with every output written
+        if os.path.basename(entry) not in ('site-packages', 'dist-packages'):
+            continue
+        try:
+            paths.append([entry, os.stat(entry).st_mtime_ns])
+        except OSError:
+            continue
+    modules = {backend: list(names) for backend, names in BACKEND_MODULES.items()}
+    return {'executable': sys.executable, 'version': sys.version, 'paths': paths, 'modules': modules,
+            'distributions': list(TRACKED_DISTRIBUTIONS)}
+
+
+def _find_pandoc():
+    return shutil.which('pandoc')
+
+
+def _pandoc_key(pandoc_path):
+    try:
+        return [pandoc_path, os.stat(pandoc_path).st_mtime_ns] if pandoc_path else None
+    except OSError:
+        return None
+
+
+def _run_pandoc_version(pandoc_path):
+    import subprocess
+
+    try:
+        output = subprocess.run([pandoc_path, '--version'], capture_output=True, text=True, timeout=30).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    first = output.split('\n', 1)[0].split()
+    return first[1] if len(first) > 1 else None
+
+
+def _pypandoc_version(data):
+    # pypandoc may ship or download its own pandoc outside PATH
+    if not data['available'].get('pypandoc'):
+        return None
+    try:
+        import pypandoc
+        return pypandoc.get_pandoc_version()
+    except Exception:
+        return None
+
+
+def _probe_environment():
+    from importlib import metadata
+
+    available = {}
+    for backend, modules in BACKEND_MODULES.items():
+        try:
+            available[backend] = all(importlib.util.find_spec(module) is not None for module in modules)
+        except (ImportError, ValueError):
+            available[backend] = False
+    versions = {}
+    for dist in TRACKED_DISTRIBUTIONS:
+        try:
+            versions[dist] = metadata.version(dist)
+        except metadata.PackageNotFoundError:
+            versions[dist] = None
+    return {'available': available, 'versions': versions}
+
+
+def _load_cache():
+    try:
+        with open(PROBE_CACHE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if data.get('version') == PROBE_VERSION else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(data):
+    try:
+        PROBE_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = PROBE_CACHE.with_name(f'{PROBE_CACHE.name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, PROBE_CACHE)
+    except OSError:
+        # A read-only checkout just probes every run
+        pass
+
+
+def probe(refresh=False):
+    """Return the cached probe: {'available': {...}, 'versions': {...}, 'pandoc': {...}}."""
+    global _probe
+    if _probe is not None and not refresh:
+        return _probe
+
+    environment = _environment_key()
+    pandoc_path = _find_pandoc()
+    data = {} if refresh else _load_cache()
+    changed = False
+
+    if data.get('environment') != environment:
+        data = dict(_probe_environment(), version=PROBE_VERSION, environment=environment)
+        changed = True
+    pandoc = data.get('pandoc') or {}
+    if changed or pandoc.get('key') != _pandoc_key(pandoc_path):
+        data['pandoc'] = {
+            'key': _pandoc_key(pandoc_path),
+            'path': pandoc_path,
+            'version': _run_pandoc_version(pandoc_path) if pandoc_path else _pypandoc_version(data),
+        }
+        changed = True
+
+    if changed:
+        _save_cache(data)
+    _probe = data
+    return data
+
+
+def available(backend):
+    """True if every module a backend needs is installed (nothing is imported)."""
+    return probe()['available'].get(backend, False)
+
+
+def library_versions():
+    """Versions of the tracked distributions (None when not installed)."""
+    return dict(probe()['versions'])
+
+
+def pandoc_version():
+    """Version string of the pandoc on PATH (or pypandoc's own pandoc), or None."""
+    return probe()['pandoc']['version']
+
+
+if __name__ == '__main__':
+    result = probe(refresh=True)
+    for name, ok in result['available'].items():
+        print(f"[{'SUCCESS' if ok else 'SKIPPED'}] {name}: {'available' if ok else 'not installed'}")
+    print(f"[INFO] pandoc: {result['pandoc']['version'] or 'not found'}")
+    print(f"[INFO] Probe cached in {PROBE_CACHE}")
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Markdown converters on a reproducible synthetic corpus.
+
+A seeded generator writes a corpus of configurable size and shape. Each
+backend then converts every document in its own fresh worker process, so
+the peak RSS it reports belongs to that backend alone. Results are printed
+and can be written as JSON: throughput (docs/s, MB/s), peak RSS and
+p50/p95 per-document latency. With --baseline, the run fails when a
+backend's throughput drops by more than --max-regression.
+
+Usage:
+    python benchmark_converters.py                               # 50 documents, every backend
+    python benchmark_converters.py -n 1000 --backends simple,enhanced --output bench.json
+    python benchmark_converters.py --baseline bench.json --max-regression 0.15
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import resource
+    HAS_RESOURCE = True
+except ImportError:
+    HAS_RESOURCE = False
+
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+BACKENDS = ('pypandoc', 'simple', 'enhanced', 'streaming', 'reportlab', 'docx_to_pdf_simple')
+
+_WORDS = (
+    'escrow payment vendor order wallet refund dispute settlement account balance transfer '
+    'bank partner webhook callback token session security audit firestore function deploy '
+    'customer product checkout delivery logistics tracking invoice ledger report status'
+).split()
+_LANGUAGES = ('javascript', 'python', 'json', 'bash', '')
+
+
+def _sentence(rng, words=12):
+    text = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(words // 2, words)))
+    if rng.random() < 0.3:
+        text += f' **{rng.choice(_WORDS)} {rng.choice(_WORDS)}**'
+    if rng.random() < 0.2:
+        text += f' `{rng.choice(_WORDS)}()`'
+    return text[0].upper() + text[1:] + '.'
+
+
+def generate_document(rng, sections=8, heading_depth=3, table_density=0.3, code_ratio=0.2, table_rows=8):
+    """Return the Markdown text of one synthetic report."""
+    lines = [f'# {_sentence(rng, 5)[:-1]}', '', _sentence(rng, 20), '']
+    for _ in range(sections):
+        level = rng.randint(2, max(2, heading_depth))
+        lines += [f'{"#" * level} {_sentence(rng, 4)[:-1]}', '']
+        for _ in range(rng.randint(1, 3)):
+            lines += [_sentence(rng, 24), '']
+        roll = rng.random()
+        if roll < table_density:
+            columns = rng.randint(2, 5)
+            lines.append('| ' + ' | '.join(rng.choice(_WORDS).title() for _ in range(columns)) + ' |')
+            lines.append('|' + '---|' * columns)
+            for row in range(table_rows):
+                lines.append('| ' + ' | '.join(f'{rng.choice(_WORDS)} {row}' for _ in range(columns)) + ' |')
+            lines.append('')
+        elif roll < table_density + code_ratio:
+            lines.append(f'```{rng.choice(_LANGUAGES)}')
+            for _ in range(rng.randint(3, 15)):
+                lines.append(f'{"    " * rng.randint(0, 2)}{rng.choice(_WORDS)}({rng.choice(_WORDS)}, {rng.randint(0, 99)});')
+            lines += ['```', '']
+        else:
+            marker = rng.choice(('-', '1.', '- [ ]'))
+            for _ in range(rng.randint(2, 6)):
+                lines.append(f'{marker} {_sentence(rng, 8)}')
+                if rng.random() < 0.2:
+                    lines.append(f'  - {_sentence(rng, 6)}')
+            lines.append('')
+        if rng.random() < 0.1:
+            lines += ['---', '']
+    return '\n'.join(lines) + '\n'
+
+
+def generate_corpus(corpus_dir, documents=50, seed=0, **shape):
+    """Write a reproducible synthetic corpus and return the list of file paths.
+
+    shape is passed to generate_document (sections, heading_depth,
+    table_density, code_ratio, table_rows). The same seed and shape always
+    produce the same files.
+    """
+    corpus_dir = Path(corpus_dir)
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for index in range(documents):
+        path = corpus_dir / f'doc_{index:05d}.md'
+        path.write_text(generate_document(rng, **shape), encoding='utf-8')
+        paths.append(path)
+    return paths
+
+
+def _peak_rss_mb():
+    if HAS_RESOURCE:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    if HAS_PSUTIL:
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    return None
+
+
+def _backend_function(backend):
+    """Return (convert(md_path, out_dir) -> bool, setup(md_paths, out_dir)) for a backend, or None if unavailable."""
+    if backend == 'pypandoc':
+        import convert_markdown_to_docs
+        if not convert_markdown_to_docs.HAS_PYPANDOC:
+            return None
+        return (lambda md, out: convert_markdown_to_docs.convert_with_pypandoc(str(md), str(out / 'out.docx'))), None
+    if backend == 'simple':
+        import convert_markdown_to_docs
+        if not convert_markdown_to_docs.HAS_DOCX_CONVERSION:
+            return None
+        return (lambda md, out: convert_markdown_to_docs.convert_markdown_to_word_simple(str(md), str(out / 'out.docx'))), None
+    if backend == 'enhanced':
+        import convert_security_report
+        if not convert_security_report.HAS_DOCX_CONVERSION:
+            return None
+        return (lambda md, out: convert_security_report.convert_markdown_to_word_enhanced(str(md), str(out / 'out.docx'))), None
+    if backend == 'streaming':
+        import docx_stream
+        return (lambda md, out: docx_stream.convert_markdown_to_word_streaming(str(md), str(out / 'out.docx'))), None
+    if backend == 'reportlab':
+        import convert_to_pdf
+        if not convert_to_pdf.HAS_REPORTLAB:
+            return None
+        return (lambda md, out: convert_to_pdf.markdown_to_pdf_reportlab(str(md), str(out / 'out.pdf'))), None
+    if backend == 'docx_to_pdf_simple':
+        import convert_to_pdf
+        import docx_stream
+        if not (convert_to_pdf.HAS_REPORTLAB and convert_to_pdf.HAS_DOCX):
+            return None
+
+        def setup(md_paths, out):
+            # Only the DOCX -> PDF step is timed; the Word inputs are built beforehand
+            for md in md_paths:
+                docx_stream.convert_markdown_to_word_streaming(str(md), str(out / f'{md.stem}.docx'))
+
+        return (lambda md, out: convert_to_pdf.docx_to_pdf_simple(str(out / f'{md.stem}.docx'), str(out / 'out.pdf'))), setup
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def run_backend(backend, md_paths, work_dir):
+    """Convert every document with one backend. Runs inside a fresh worker process."""
+    md_paths = [Path(p) for p in md_paths]
+    out_dir = Path(work_dir) / backend
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        functions = _backend_function(backend)
+    if functions is None:
+        return {'available': False}
+    convert, setup = functions
+    if setup:
+        setup(md_paths, out_dir)
+    rss_before = _peak_rss_mb()
+
+    latencies = []
+    failures = 0
+    started = time.perf_counter()
+    for md_path in md_paths:
+        doc_started = time.perf_counter()
+        # Converters report their own errors on stdout; keep the benchmark output readable
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            try:
+                ok = convert(md_path, out_dir)
+            except Exception:
+                ok = False
+        latencies.append(time.perf_counter() - doc_started)
+        failures += 0 if ok else 1
+    elapsed = time.perf_counter() - started
+
+    total_bytes = sum(p.stat().st_size for p in md_paths)
+    latencies.sort()
+    return {
+        'available': True,
+        'documents': len(md_paths),
+        'failures': failures,
+        'seconds': round(elapsed, 3),
+        'docs_per_second': round(len(md_paths) / elapsed, 2) if elapsed else None,
+        'mb_per_second': round(total_bytes / (1024 * 1024) / elapsed, 3) if elapsed else None,
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 2),
+        'rss_before_mb': rss_before,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def run_benchmarks(md_paths, backends=BACKENDS, work_dir=None):
+    """Run each backend in a fresh process and return {backend: result}."""
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory(prefix='convert-bench-', dir=work_dir) as tmp:
+        for backend in backends:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                try:
+                    results[backend] = pool.submit(run_backend, backend, [str(p) for p in md_paths], tmp).result()
+                except Exception as e:
+                    results[backend] = {'available': True, 'error': f'Worker error: {e}'}
+    return results
+
+
+def compare_to_baseline(report, baseline, max_regression):
+    """Return a list of messages for backends whose docs/s fell more than max_regression below the baseline."""
+    regressions = []
+    for backend, result in report['backends'].items():
+        previous = baseline.get('backends', {}).get(backend, {})
+        if not result.get('docs_per_second') or not previous.get('docs_per_second'):
+            continue
+        if result['failures'] == result['documents'] or previous.get('failures') == previous.get('documents'):
+            continue
+        change = result['docs_per_second'] / previous['docs_per_second'] - 1
+        if change < -max_regression:
+            regressions.append(f"{backend}: {previous['docs_per_second']} -> {result['docs_per_second']} docs/s "
+                               f"({change:+.0%})")
+    return regressions
+
+
+def print_report(report):
+    corpus = report['corpus']
+    print("\n" + "=" * 60)
+    print(f"[BENCHMARK] {corpus['documents']} documents, {corpus['megabytes']} MB (seed {corpus['seed']})")
+    print("=" * 60)
+    for backend, result in report['backends'].items():
+        if not result.get('available'):
+            print(f"   {backend:<20} [SKIPPED] backend not installed")
+        elif result.get('error'):
+            print(f"   {backend:<20} [ERROR] {result['error']}")
+        elif result['failures'] == result['documents']:
+            print(f"   {backend:<20} [FAILED] every document failed to convert")
+        else:
+            print(f"   {backend:<20} {result['docs_per_second']:>8} docs/s {result['mb_per_second']:>8} MB/s  "
+                  f"p50 {result['p50_ms']}ms  p95 {result['p95_ms']}ms  "
+                  f"peak RSS {result['peak_rss_mb']} MB  failures {result['failures']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Markdown converters on a synthetic corpus.')
+    parser.add_argument('-n', '--documents', type=int, default=50, help='Number of documents (default: 50)')
+    parser.add_argument('--seed', type=int, default=0, help='Corpus random seed (default: 0)')
+    parser.add_argument('--sections', type=int, default=8, help='Sections per document (default: 8)')
+    parser.add_argument('--heading-depth', type=int, default=3, help='Deepest heading level (default: 3)')
+    parser.add_argument('--table-density', type=float, default=0.3,
+                        help='Fraction of sections with a table (default: 0.3)')
+    parser.add_argument('--table-rows', type=int, default=8, help='Rows per table (default: 8)')
+    parser.add_argument('--code-ratio', type=float, default=0.2,
+                        help='Fraction of sections with a code fence (default: 0.2)')
+    parser.add_argument('--backends', default=','.join(BACKENDS),
+                        help=f"Comma-separated backends (default: {','.join(BACKENDS)})")
+    parser.add_argument('--corpus-dir', help='Keep the generated corpus here instead of a temporary directory')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--baseline', help='Earlier JSON report to compare throughput against')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='Allowed docs/s drop versus the baseline, as a fraction (default: 0.2)')
+    args = parser.parse_args(argv)
+
+    args.backends = [b.strip() for b in args.backends.split(',') if b.strip()]
+    unknown = [b for b in args.backends if b not in BACKENDS]
+    if unknown:
+        parser.error(f"Unknown backend(s): {', '.join(unknown)}")
+    if not 1 <= args.documents <= 10000:
+        parser.error('--documents must be between 1 and 10000')
+    if args.table_density + args.code_ratio > 1:
+        parser.error('--table-density and --code-ratio must add up to at most 1')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    shape = {
+        'sections': args.sections,
+        'heading_depth': args.heading_depth,
+        'table_density': args.table_density,
+        'table_rows': args.table_rows,
+        'code_ratio': args.code_ratio,
+    }
+
+    corpus_dir = Path(args.corpus_dir) if args.corpus_dir else Path(tempfile.mkdtemp(prefix='convert-corpus-'))
+    try:
+        print(f"[GENERATING] {args.documents} documents -> {corpus_dir}")
+        md_paths = generate_corpus(corpus_dir, args.documents, args.seed, **shape)
+        total_bytes = sum(p.stat().st_size for p in md_paths)
+
+        print(f"[BENCHMARKING] {', '.join(args.backends)}")
+        report = {
+            'corpus': dict(shape, documents=args.documents, seed=args.seed,
+                           megabytes=round(total_bytes / (1024 * 1024), 3)),
+            'python': sys.version.split()[0],
+            'backends': run_benchmarks(md_paths, args.backends),
+        }
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n[SUCCESS] Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_to_baseline(report, json.load(f), args.max_regression)
+        if regressions:
+            print("\n[ERROR] Throughput regressions against the baseline:")
+            for message in regressions:
+                print(f"   {message}")
+            return 1
+        print("\n[SUCCESS] No throughput regressions against the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Syntax highlighting of fenced code blocks for the Word and PDF writers.
+
+A fence with a language Pygments knows (```python, ```bash, ```json, ...)
+is lexed into colored runs: OOXML runs for the .docx writers and
+<font>/<b>/<i> markup for reportlab. Fences without a language, or with
+one Pygments does not know, stay plain Consolas text.
+
+The same config, curl and JSON snippets recur across many reports, so
+the lexed runs are memoized per process, keyed by (language, hash of
+the code), together with each rendering made from them. A batch worker
+converts many files, so a repeated snippet is lexed once per worker.
+
+Without Pygments (pip install Pygments), every code block stays plain.
+"""
+
+import functools
+import hashlib
+from collections import OrderedDict
+
+import backends
+import conversion_profile
+
+HAS_PYGMENTS = backends.available('pygments')
+
+# Pygments style whose token colors are used; 'default' reads well on white paper
+STYLE_NAME = 'default'
+# Distinct code blocks kept per process
+CACHE_SIZE = 2048
+
+_cache = OrderedDict()
+
+
+@functools.lru_cache(maxsize=None)
+def _lexer(lang):
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+
+    try:
+        # Keep the code exactly as written: no stripped or added newlines
+        return get_lexer_by_name(lang, stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def _style():
+    from pygments.styles import get_style_by_name
+
+    return get_style_by_name(STYLE_NAME)
+
+
+@functools.lru_cache(maxsize=None)
+def _token_format(token_type):
+    """(color, bold, italic) for a token type; color is hex RRGGBB or None."""
+    style = _style()
+    # Some lexers make up token types the style does not list: use the nearest ancestor's format
+    while not style.styles_token(token_type) and token_type.parent is not None:
+        token_type = token_type.parent
+    style = style.style_for_token(token_type)
+    return style['color'] or None, bool(style['bold']), bool(style['italic'])
+
+
+def can_highlight(lang):
+    return HAS_PYGMENTS and bool(lang) and _lexer(lang.lower()) is not None
+
+
+def _lex(lexer, code):
+    """Lines of (text, color, bold, italic) runs, adjacent runs with one format merged."""
+    lines = [[]]
+    for token_type, value in lexer.get_tokens(code):
+        fmt = _token_format(token_type)
+        for index, part in enumerate(value.split('\n')):
+            if index:
+                lines.append([])
+            if not part:
+                continue
+            line = lines[-1]
+            if part.isspace():
+                # Whitespace looks the same in any color: join it to its neighbour instead of a run of its own
+                fmt_here = line[-1][1:] if line else (None, False, False)
+            else:
+                fmt_here = fmt
+            if line and line[-1][1:] == fmt_here:
+                line[-1] = (line[-1][0] + part,) + fmt_here
+            elif line and line[-1][0].isspace():
+                # A leading whitespace run takes the format of the text after it
+                line[-1] = (line[-1][0] + part,) + fmt_here
+            else:
+                line.append((part,) + fmt_here)
+    return tuple(tuple(line) for line in lines)
+
+
+def _entry(lang, code):
+    """The memo entry for a code block: {'lines': runs, <rendering>: ...}; None if it cannot be highlighted."""
+    if not can_highlight(lang):
+        return None
+    lang = lang.lower()
+    key = (lang, hashlib.sha1(code.encode('utf-8')).digest())
+    entry = _cache.get(key)
+    if entry is not None:
+        _cache.move_to_end(key)
+        conversion_profile.count('highlight_hits')
+        return entry
+    with conversion_profile.stage('highlight'):
+        entry = _cache[key] = {'lines': _lex(_lexer(lang), code)}
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return entry
+
+
+def highlight(lang, code):
+    """Lines of (text, color, bold, italic) runs for a code block, or None if it cannot be highlighted."""
+    entry = _entry(lang, code)
+    return entry['lines'] if entry else None
+
+
+def docx_runs_xml(lang, code, font, size):
+    """<w:r> elements for a code block, lines separated by breaks; None if it cannot be highlighted."""
+    entry = _entry(lang, code)
+    if entry is None:
+        return None
+    key = ('docx', font, size)
+    if key not in entry:
+        from docx_stream import run_xml
+
+        entry[key] = '<w:r><w:br/></w:r>'.join(
+            ''.join(run_xml(text, bold=bold, italic=italic, color=color, font=font, size=size)
+                    for text, color, bold, italic in line)
+            for line in entry['lines']
+        )
+    return entry[key]
+
+
+def reportlab_markup(lang, code, max_line_length=None):
+    """XPreformatted markup for a code block, hard-wrapped at max_line_length; None if it cannot be highlighted."""
+    entry = _entry(lang, code)
+    if entry is None:
+        return None
+    key = ('reportlab', max_line_length)
+    if key not in entry:
+        from xml.sax.saxutils import escape
+
+        lines = []
+        for line in entry['lines']:
+            parts = []
+            column = 0
+            for text, color, bold, italic in line:
+                while text:
+                    if max_line_length and column >= max_line_length:
+                        parts.append('\n')
+                        column = 0
+                    chunk = text[:max_line_length - column] if max_line_length else text
+                    text = text[len(chunk):]
+                    column += len(chunk)
+                    markup = escape(chunk)
+                    if bold:
+                        markup = f'<b>{markup}</b>'
+                    if italic:
+                        markup = f'<i>{markup}</i>'
+                    if color:
+                        markup = f'<font color="#{color}">{markup}</font>'
+                    parts.append(markup)
+            lines.append(''.join(parts))
+        entry[key] = '\n'.join(lines)
+    return entry[key]
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Build manifest for incremental Markdown -> Word/PDF conversion.
+
+Each output is recorded with the hash of its source, a fingerprint of the
+converter code, library versions and options that produced it, and the hash
+of the output itself. A later run skips an output when all of these still
+match, and rebuilds it when the source, converter or options changed or the
+output went missing or was modified.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+import backends
+
+MANIFEST_NAME = '.conversion-manifest.json'
+MANIFEST_VERSION = 1
+
+# Modules whose code shapes the outputs; editing any of them invalidates the build manifest.
+# Every converter script builds its identity from this one list, so they share manifest entries.
+# Build tooling the converters import that does not change what they write is left out (see NOT_CONVERTER_MODULES).
+CONVERTER_MODULES = ('code_highlight', 'conversion_manifest', 'convert_all_docs', 'convert_markdown_to_docs',
+                     'convert_security_report', 'convert_to_pdf', 'diagrams', 'doc_templates', 'docx_stream',
+                     'docx_tables', 'html_output', 'libreoffice_pool', 'markdown_blocks', 'markdown_inline',
+                     'pandoc_ast', 'pandoc_batch', 'pandoc_jobs', 'pdf_engines', 'section_cache')
+NOT_CONVERTER_MODULES = (
+    'artifact_store',      # caches outputs, keyed by this fingerprint
+    'backends',            # availability probes; the library versions are part of the identity already
+    'conversion_profile',  # timings
+    'file_watcher',        # --watch
+    'search_index',        # the search database, not the outputs
+    'shards',              # which runner builds a file, not how
+)
+
+_identity_cache = {}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def converter_identity(*converter_files):
+    """Describe the converter code and library versions used for a build.
+
+    The result is cached per process, so the converter scripts are hashed
+    once per run. Library and pandoc versions come from the backends probe,
+    which is cached across runs.
+    """
+    key = tuple(sorted(str(Path(p).resolve()) for p in converter_files))
+    if key in _identity_cache:
+        return _identity_cache[key]
+
+    identity = {'python': '.'.join(map(str, sys.version_info[:2]))}
+    for path in key:
+        identity[Path(path).name] = file_hash(path)
+    identity.update(backends.library_versions())
+    if identity.get('pypandoc'):
+        identity['pandoc'] = backends.pandoc_version()
+
+    _identity_cache[key] = identity
+    return identity
+
+
+def converter_files():
+    """Paths of the CONVERTER_MODULES, which live next to this file."""
+    root = Path(__file__).parent
+    return [root / f'{name}.py' for name in CONVERTER_MODULES]
+
+
+def fingerprint(identity, format_type, options=None):
+    """Hash the converter identity, output format and options into one key."""
+    payload = json.dumps(
+        {'identity': identity, 'format': format_type, 'options': options or {}},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def conversion_options(toc=False):
+    """Options that change the generated documents and therefore the build fingerprint."""
+    # Imported here: these converter modules import this one
+    import convert_security_report
+    import diagrams
+    import doc_templates
+
+    return {
+        'toc': toc,
+        'font': convert_security_report.DEFAULT_FONT_NAME,
+        'font_size': convert_security_report.DEFAULT_FONT_SIZE,
+        'table_style': convert_security_report.TABLE_STYLE,
+        'template': doc_templates.template_identity(),
+        # Installing (or changing) a diagram renderer turns code text into images
+        'diagrams': diagrams.identities(),
+    }
+
+
+def build_fingerprint(format_type, toc=False, streaming=False):
+    """Fingerprint of the converters, library versions and options for one format.
+
+    Every converter script keys its manifest entries with this, so an output
+    one of them built is up to date for the others.
+    """
+    import convert_to_pdf
+    import pdf_engines
+
+    identity = converter_identity(*converter_files())
+    options = conversion_options(toc)
+    if streaming and format_type == 'docx':
+        options['docx_writer'] = 'streaming'
+    if format_type == 'pdf':
+        # Installing a faster engine changes which one renders the PDFs
+        options['pdf_engine'] = pdf_engines.best_engine()
+        # Chapter rendering starts every chapter on a new page
+        options['pdf_chapters'] = os.environ.get(convert_to_pdf.ENV_CHAPTERS, '')
+    return fingerprint(identity, format_type, options)
+
+
+class BuildManifest:
+    """On-disk record of which outputs were built from which inputs."""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else Path(__file__).parent / MANIFEST_NAME
+        self.root = self.path.parent
+        self.entries = {}
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """Load the manifest, starting empty if it is missing or unreadable."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.entries = data.get('outputs', {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        """Write the manifest atomically if anything changed."""
+        if not self._dirty:
+            return
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'outputs': self.entries}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def _key(self, output_file):
+        output_file = Path(output_file).resolve()
+        try:
+            return output_file.relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return output_file.as_posix()
+
+    def _source_hash(self, source_file, entry):
+        """Hash the source, reusing the recorded hash when size and mtime are unchanged."""
+        stat = Path(source_file).stat()
+        if entry and entry.get('source_size') == stat.st_size and entry.get('source_mtime_ns') == stat.st_mtime_ns:
+            return entry['source_hash'], stat
+        return file_hash(source_file), stat
+
+    def is_up_to_date(self, source_file, output_file, fingerprint_key):
+        """Return True if output_file was built from the current source with the same fingerprint."""
+        entry = self.entries.get(self._key(output_file))
+        if not entry or entry.get('fingerprint') != fingerprint_key:
+            return False
+
+        output_file = Path(output_file)
+        if not output_file.exists() or not Path(source_file).exists():
+            return False
+
+        source_hash, _ = self._source_hash(source_file, entry)
+        if source_hash != entry.get('source_hash'):
+            return False
+
+        out_stat = output_file.stat()
+        if entry.get('output_size') == out_stat.st_size and entry.get('output_mtime_ns') == out_stat.st_mtime_ns:
+            return True
+        return file_hash(output_file) == entry.get('output_hash')
+
+    def record(self, source_file, output_file, fingerprint_key, backend=None):
+        """Record a freshly built output."""
+        entry = self.entries.get(self._key(output_file))
+        source_hash, source_stat = self._source_hash(source_file, entry)
+        output_file = Path(output_file)
+        out_stat = output_file.stat()
+        self.entries[self._key(output_file)] = {
+            'source': self._key(source_file),
+            'source_hash': source_hash,
+            'source_size': source_stat.st_size,
+            'source_mtime_ns': source_stat.st_mtime_ns,
+            'fingerprint': fingerprint_key,
+            'backend': backend,
+            'output_hash': file_hash(output_file),
+            'output_size': out_stat.st_size,
+            'output_mtime_ns': out_stat.st_mtime_ns,
+        }
+        self._dirty = True
+
+    def entry(self, output_file):
+        """(key, recorded entry or None) for an output."""
+        key = self._key(output_file)
+        return key, self.entries.get(key)
+
+    def merge(self, entries):
+        """Add entries recorded by another build of the same tree, e.g. another shard."""
+        if entries:
+            self.entries.update(entries)
+            self._dirty = True
+
+    def forget(self, output_file):
+        """Drop an output from the manifest, e.g. after a failed rebuild."""
+        if self.entries.pop(self._key(output_file), None) is not None:
+            self._dirty = True
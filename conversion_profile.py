@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing and profiling for the converters.
+
+Every converter entry point wraps its work in profile_file(). Its stages
+(read, lex, build, save, pandoc, render) are marked with stage() or
+timed_iter(), and its counters (lines, blocks, tables, runs, output_bytes)
+are bumped with count(). Stage times are exclusive: time spent lexing
+inside the DOM-building loop counts as 'lex', not 'build'. Time outside
+any marked stage is document construction and is charged to 'build'.
+
+All of this is a no-op unless switched on through the environment, so the
+scripts need no edits to be measured:
+
+    CONVERT_TIMINGS=1                 per-file and aggregate stage timings
+    CONVERT_PROFILE=cprofile          also write <output>.prof next to each output
+    CONVERT_PROFILE=tracemalloc       also write <output>.tracemalloc.txt (top allocations)
+    CONVERT_PROFILE=cprofile,tracemalloc
+"""
+
+import functools
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+ENV_TIMINGS = 'CONVERT_TIMINGS'
+ENV_PROFILE = 'CONVERT_PROFILE'
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+TRACEMALLOC_TOP = 25
+
+_active = None
+_completed = []
+
+
+def profile_modes():
+    """Return the profilers requested through CONVERT_PROFILE."""
+    requested = os.environ.get(ENV_PROFILE, '').lower().split(',')
+    return {mode.strip() for mode in requested} & set(PROFILE_MODES)
+
+
+def timings_enabled():
+    return os.environ.get(ENV_TIMINGS, '') not in ('', '0') or bool(profile_modes())
+
+
+class FileStats:
+    """Exclusive stage times and counters for converting one file."""
+
+    def __init__(self, source, output):
+        self.source = str(source)
+        self.output = str(output)
+        self.stages = {}
+        self.counters = {}
+        self.seconds = 0.0
+        self._stack = []
+        self._started = self._mark = time.perf_counter()
+
+    def _charge(self):
+        now = time.perf_counter()
+        if self._stack:
+            name = self._stack[-1]
+            self.stages[name] = self.stages.get(name, 0.0) + now - self._mark
+        self._mark = now
+
+    def enter(self, name):
+        self._charge()
+        self._stack.append(name)
+
+    def exit(self):
+        self._charge()
+        self._stack.pop()
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def finish(self):
+        while self._stack:
+            self.exit()
+        self.seconds = time.perf_counter() - self._started
+        unmarked = self.seconds - sum(self.stages.values())
+        if unmarked > 0:
+            self.stages['build'] = self.stages.get('build', 0.0) + unmarked
+
+    def as_dict(self):
+        return {
+            'source': self.source,
+            'output': self.output,
+            'seconds': round(self.seconds, 4),
+            'stages': {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            'counters': dict(self.counters),
+        }
+
+
+class _Stage:
+    __slots__ = ('stats', 'name')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.stats.enter(self.name)
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stats.exit()
+
+
+class _NullStage:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name):
+    """Context manager charging the enclosed time to a stage of the current file."""
+    if _active is None:
+        return _NULL_STAGE
+    return _Stage(_active, name)
+
+
+def count(name, amount=1):
+    """Add to a counter of the current file."""
+    if _active is not None:
+        _active.count(name, amount)
+
+
+def active():
+    """True while a file is being recorded (use to skip work that only feeds counters)."""
+    return _active is not None
+
+
+def timed_iter(iterable, name, counter=None):
+    """Charge the time spent producing each item to a stage, counting items under counter."""
+    if _active is None:
+        return iterable
+    return _timed(iterable, _active, name, counter)
+
+
+def _timed(iterable, stats, name, counter):
+    iterator = iter(iterable)
+    while True:
+        stats.enter(name)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            stats.exit()
+        if counter:
+            stats.count(counter)
+        yield item
+
+
+@contextmanager
+def profile_file(source, output):
+    """Record timings (and optional profiles) for converting source into output.
+
+    Yields the FileStats being recorded, or None when timings are off. Nested
+    calls (a converter calling another converter) join the outer record.
+    """
+    global _active
+    if _active is not None or not timings_enabled():
+        yield _active
+        return
+
+    import cProfile
+    import tracemalloc
+
+    stats = _active = FileStats(source, output)
+    modes = profile_modes()
+    profiler = cProfile.Profile() if 'cprofile' in modes else None
+    trace = 'tracemalloc' in modes and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start(10)
+    if profiler:
+        profiler.enable()
+    try:
+        yield stats
+    finally:
+        if profiler:
+            profiler.disable()
+        _active = None
+        stats.finish()
+        try:
+            stats.count('input_bytes', Path(source).stat().st_size)
+            if Path(output).exists():
+                stats.count('output_bytes', Path(output).stat().st_size)
+            if profiler:
+                profiler.dump_stats(f'{output}.prof')
+            if trace:
+                _write_tracemalloc(stats, f'{output}.tracemalloc.txt')
+        except OSError as e:
+            print(f"[WARNING] Could not write profile for {Path(output).name}: {e}")
+        finally:
+            if trace:
+                tracemalloc.stop()
+        _completed.append(stats)
+
+
+def profiled(func):
+    """Decorator recording a converter call as profile_file(first_arg, second_arg)."""
+    @functools.wraps(func)
+    def wrapper(source, output, *args, **kwargs):
+        with profile_file(source, output):
+            return func(source, output, *args, **kwargs)
+    return wrapper
+
+
+def _write_tracemalloc(stats, path):
+    import tracemalloc
+
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    stats.count('peak_traced_bytes', peak)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'Peak traced memory: {peak / (1024 * 1024):.2f} MB while converting {stats.source}\n')
+        f.write(f'Top {TRACEMALLOC_TOP} allocation sites still alive at the end:\n')
+        for entry in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+            f.write(f'{entry}\n')
+
+
+def pop_completed():
+    """Return the FileStats recorded so far in this process and clear the list."""
+    records = list(_completed)
+    _completed.clear()
+    return records
+
+
+def aggregate(records):
+    """Sum per-file timing dicts (FileStats.as_dict()) into totals."""
+    totals = {'files': 0, 'seconds': 0.0, 'stages': {}, 'counters': {}}
+    for record in records:
+        totals['files'] += 1
+        totals['seconds'] += record['seconds']
+        for name, seconds in record['stages'].items():
+            totals['stages'][name] = totals['stages'].get(name, 0.0) + seconds
+        for name, value in record['counters'].items():
+            totals['counters'][name] = totals['counters'].get(name, 0) + value
+    totals['seconds'] = round(totals['seconds'], 4)
+    totals['stages'] = {name: round(seconds, 4) for name, seconds in totals['stages'].items()}
+    return totals
+
+
+def format_stages(stages):
+    ordered = sorted(stages.items(), key=lambda item: item[1], reverse=True)
+    return ', '.join(f'{name} {seconds:.3f}s' for name, seconds in ordered)
+
+
+def print_report(records=None):
+    """Print per-file and total stage timings (records default to this process's files)."""
+    if records is None:
+        records = [stats.as_dict() for stats in pop_completed()]
+    if not records:
+        return
+    print("\n[TIMINGS]")
+    for record in records:
+        print(f"   {Path(record['output']).name}: {record['seconds']:.3f}s ({format_stages(record['stages'])})")
+    totals = aggregate(records)
+    counters = ', '.join(f'{name}={value}' for name, value in sorted(totals['counters'].items()))
+    print(f"   [TOTAL] {totals['files']} outputs in {totals['seconds']:.3f}s ({format_stages(totals['stages'])})")
+    if counters:
+        print(f"   [COUNTERS] {counters}")
@@ -0,0 +1,708 @@
+#!/usr/bin/env python3
+"""
+Batch-convert Markdown files to Word (.docx), PDF and HTML formats in parallel.
+
+Every (file, format) pair is an independent job, so a full rebuild of the
+report corpus scales with the number of cores instead of running serially.
+
+Usage:
+    python convert_all_docs.py                        # every *.md in the project root
+    python convert_all_docs.py docs "*_GUIDE.md" -j 8
+    python convert_all_docs.py README.md --formats docx --toc
+    python convert_all_docs.py --formats html         # just the browsable html/ bundle
+    python convert_all_docs.py docs -r --watch        # rebuild on every save
+    python convert_all_docs.py --shard 2/4            # this runner's quarter of the files (see shards)
+
+Every run also updates the full-text search index (see search_index).
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import artifact_store
+import backends
+import conversion_profile
+import file_watcher
+import convert_markdown_to_docs
+import convert_security_report
+import convert_to_pdf
+import diagrams
+import doc_templates
+import docx_stream
+import html_output
+import pandoc_ast
+import pandoc_batch
+import pandoc_jobs
+import pdf_engines
+import search_index
+import section_cache
+import shards
+from conversion_manifest import BuildManifest, build_fingerprint
+
+SUPPORTED_FORMATS = ('docx', 'pdf', 'html')
+
+# Sources at least this large go straight to the constant-memory DOCX writer:
+# pandoc and python-docx both hold the whole document in memory
+STREAMING_THRESHOLD_BYTES = 32 * 1024 * 1024
+
+
+def collect_markdown_files(patterns, recursive=False):
+    """Expand files, directories and glob patterns into a sorted list of .md paths."""
+    found = {}
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            matches = path.rglob('*.md') if recursive else path.glob('*.md')
+        elif path.is_file():
+            matches = [path]
+        else:
+            matches = (Path(m) for m in glob.glob(pattern, recursive=recursive))
+        for match in matches:
+            if match.is_file() and match.suffix.lower() == '.md':
+                found[str(match.resolve())] = match.resolve()
+    return [found[key] for key in sorted(found)]
+
+
+def output_path_for(md_path, format_type, output_dir=None):
+    """Return the output path for a source file, next to it unless output_dir is given."""
+    target = md_path.with_suffix(f'.{format_type}')
+    if output_dir:
+        target = Path(output_dir) / target.name
+    elif format_type == 'html':
+        # Pages share a stylesheet and an index page, so they get a folder of their own
+        target = md_path.parent / html_output.HTML_DIR / target.name
+    return target
+
+
+class OutputCollision(ValueError):
+    """Two sources would be converted to the same output file."""
+
+
+def check_output_paths(md_files, formats, output_dir=None):
+    """Raise OutputCollision if two sources map to one output, e.g. same-named files with -o DIR -r."""
+    sources = {}
+    for md_path in md_files:
+        for format_type in formats:
+            sources.setdefault(output_path_for(md_path, format_type, output_dir).resolve(), []).append(md_path)
+    collisions = {output: paths for output, paths in sources.items() if len(paths) > 1}
+    if collisions:
+        lines = [f"   {output} <- {', '.join(str(path) for path in paths)}"
+                 for output, paths in sorted(collisions.items())]
+        raise OutputCollision(f"{len(collisions)} outputs would be written by more than one source; rename the "
+                              f"sources or convert them to separate output directories:\n" + '\n'.join(lines))
+
+
+def pandoc_extra_args(toc=False):
+    return convert_security_report.PANDOC_EXTRA_ARGS if toc else ['--standalone']
+
+
+def make_result(md_path, output_file, format_type, backend, success, seconds, error=None, timings=None):
+    """Build the result entry reported for one (file, format) job."""
+    output_file = Path(output_file)
+    success = bool(success and output_file.exists())
+    if not success and not error:
+        if backend is None and format_type == 'pdf':
+            error = 'No working PDF engine (see python pdf_engines.py)'
+        elif backend is None and format_type == 'html':
+            error = 'No HTML renderer available. Install markdown (pip install markdown)'
+        elif backend is None:
+            error = 'No conversion method available. Install pypandoc or python-docx'
+        elif format_type == 'pdf':
+            error = f'PDF conversion failed ({backend})'
+        else:
+            error = f'{backend} conversion failed'
+    result = {
+        'source': str(md_path),
+        'format': format_type,
+        'output': str(output_file),
+        'backend': backend,
+        'success': success,
+        'seconds': round(seconds, 3),
+        'bytes': output_file.stat().st_size if success else 0,
+        'error': None if success else error,
+    }
+    if timings:
+        result['timings'] = timings
+    return result
+
+
+def with_store_stats(result):
+    """Attach this worker's artifact store counters to a result, for run_batch to add up."""
+    counts = artifact_store.take_stats()
+    if counts:
+        result['store'] = counts
+    return result
+
+
+def use_streaming_writer(md_path, format_type, streaming=False):
+    """True if a DOCX job should use the constant-memory writer instead of pandoc/python-docx."""
+    if format_type != 'docx':
+        return False
+    return streaming or Path(md_path).stat().st_size >= STREAMING_THRESHOLD_BYTES
+
+
+def convert_job(md_path, output_file, format_type, toc=False, use_pandoc=True, streaming=False):
+    """Convert one Markdown file to one format. Runs inside a worker process."""
+    with conversion_profile.profile_file(md_path, output_file) as stats:
+        backend, success, seconds = _convert(md_path, output_file, format_type, toc, use_pandoc, streaming)
+    timings = stats.as_dict() if stats else None
+    return with_store_stats(make_result(md_path, output_file, format_type, backend, success, seconds,
+                                        timings=timings))
+
+
+def _convert(md_path, output_file, format_type, toc, use_pandoc, streaming):
+    """Run the backends in order of preference; returns (backend, success, seconds)."""
+    started = time.perf_counter()
+    extra_args = pandoc_extra_args(toc)
+    backend = None
+    success = False
+
+    if use_streaming_writer(md_path, format_type, streaming):
+        success = docx_stream.convert_markdown_to_word_streaming(str(md_path), str(output_file))
+        return 'streaming', success, time.perf_counter() - started
+
+    if format_type == 'pdf':
+        # Only engines the probe found working are tried, fastest first
+        engines = pdf_engines.engine_order(include_pandoc=use_pandoc)
+        backend = pdf_engines.convert(md_path, output_file, extra_args, engines)
+        if backend is None and engines:
+            return engines[-1], False, time.perf_counter() - started
+        return backend, backend is not None, time.perf_counter() - started
+
+    if format_type == 'html':
+        if not backends.available('markdown'):
+            return None, False, time.perf_counter() - started
+        success = html_output.convert_markdown_to_html(str(md_path), str(output_file))
+        return 'python-markdown', success, time.perf_counter() - started
+
+    if use_pandoc and convert_markdown_to_docs.HAS_PYPANDOC:
+        backend = 'pypandoc'
+        success = convert_markdown_to_docs.convert_with_pypandoc(
+            str(md_path), str(output_file), format_type, extra_args=extra_args
+        )
+
+    if not success and convert_security_report.HAS_DOCX_CONVERSION:
+        backend = 'python-docx'
+        ast = pandoc_ast.cached_ast(md_path)
+        if ast is not None:
+            success = convert_security_report.convert_ast_to_word_enhanced(ast, str(output_file),
+                                                                             section_cache.enabled(md_path))
+        else:
+            success = convert_security_report.convert_markdown_to_word_enhanced(str(md_path), str(output_file))
+
+    return backend, success, time.perf_counter() - started
+
+
+def convert_chunk_job(jobs, toc=False, timeout=None, pdf_engine='pdflatex'):
+    """Convert a chunk of jobs with a single pandoc process. Runs inside a worker process.
+
+    timeout is per job: pandoc is stopped when one job runs longer, and restarted on the rest.
+    Outputs that pandoc could not produce fall back to python-docx (DOCX) or the
+    non-pandoc PDF engines.
+    """
+    batch = pandoc_batch.convert_batch(jobs, toc=toc, pdf_engine=pdf_engine, ast_cache_dir=pandoc_ast.AST_CACHE_DIR,
+                                       reference_doc=doc_templates.reference_docx(),
+                                       timeout=timeout)
+    results = []
+    for md_path, output_file, format_type in jobs:
+        status = batch[str(Path(output_file).resolve())]
+        if not status['success']:
+            results.append(convert_job(md_path, output_file, format_type, toc, use_pandoc=False))
+            continue
+        timings = None
+        if conversion_profile.timings_enabled():
+            # The whole chunk ran inside one pandoc process; only its per-file wall time is known
+            timings = {'source': str(md_path), 'output': str(output_file), 'seconds': status['seconds'],
+                       'stages': {'pandoc': status['seconds']}, 'counters': {}}
+        results.append(with_store_stats(make_result(md_path, output_file, format_type, 'pandoc-batch',
+                                                    status['success'], status['seconds'], status['error'],
+                                                    timings)))
+    return results
+
+
+def split_into_chunks(jobs, count):
+    """Split jobs into at most count chunks of similar total source size.
+
+    All formats of one source stay in the same chunk so pandoc parses it once.
+    """
+    by_source = {}
+    for job in jobs:
+        by_source.setdefault(job[0], []).append(job)
+
+    chunks = [[] for _ in range(max(1, min(count, len(by_source))))]
+    loads = [0] * len(chunks)
+    # Largest sources first, each onto the least loaded chunk
+    for source in sorted(by_source, key=lambda s: Path(s).stat().st_size, reverse=True):
+        target = loads.index(min(loads))
+        chunks[target].extend(by_source[source])
+        loads[target] += Path(source).stat().st_size
+    return [chunk for chunk in chunks if chunk]
+
+
+def skipped_result(md_path, output_file, format_type):
+    """Result entry for an output that the manifest says is already up to date."""
+    return {
+        'source': str(md_path),
+        'format': format_type,
+        'output': str(output_file),
+        'backend': 'cache',
+        'success': True,
+        'skipped': True,
+        'seconds': 0.0,
+        'bytes': Path(output_file).stat().st_size,
+        'error': None,
+    }
+
+
+def run_batch(md_files, formats=SUPPORTED_FORMATS, workers=None, output_dir=None, toc=False,
+              manifest=None, force=False, per_file=False, streaming=False, pool=None,
+              timeout=pandoc_jobs.DEFAULT_TIMEOUT, retries=pandoc_jobs.DEFAULT_RETRIES):
+    """Fan the conversion jobs out across a process pool and yield results as they finish.
+
+    When a recent pandoc is installed, each worker converts a whole chunk of
+    files in one pandoc process (see pandoc_batch). With per_file, or an older
+    pandoc, every (file, format) pair is its own pandoc subprocess, run
+    concurrently by pandoc_jobs with a timeout and retries; failed outputs
+    fall back to python-docx or reportlab in the pool. Without pandoc, every
+    pair is a pure-Python job in the pool. PDFs only go through pandoc when
+    the fastest working PDF engine (see pdf_engines) is one pandoc drives;
+    otherwise they are rendered in the pool. With a manifest, outputs
+    whose source, converter and options are unchanged are skipped, and every
+    successful build is recorded. Outputs found in the artifact store (see
+    artifact_store) are copied from it instead of converted, and every new
+    output is added to it. DOCX outputs of very large sources, or all
+    of them with streaming, use the constant-memory writer in docx_stream.
+    An existing pool (see watch) is reused instead of starting a new one.
+    Raises OutputCollision, before converting anything, if two sources would
+    overwrite each other's outputs.
+    """
+    check_output_paths(md_files, formats, output_dir)
+    if output_dir:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    def record(result):
+        # AST and diagram lookups happen in the workers, which report their counts with the result
+        artifact_store.add_stats(result.pop('store', None))
+        if manifest:
+            if result['success']:
+                manifest.record(result['source'], result['output'],
+                                fingerprints[result['format']], result['backend'])
+            else:
+                manifest.forget(result['output'])
+        if result['success'] and result['backend'] != 'store' and result['output'] in store_keys:
+            artifact_store.put('output', store_keys[result['output']], result['output'])
+        return result
+
+    use_store = artifact_store.enabled()
+    fingerprints = {format_type: build_fingerprint(format_type, toc, streaming)
+                    for format_type in formats} if manifest or use_store else {}
+    store_keys = {}
+    jobs = []
+    streaming_jobs = []
+    for md_path in md_files:
+        for format_type in formats:
+            output_file = output_path_for(md_path, format_type, output_dir)
+            if manifest and not force and manifest.is_up_to_date(md_path, output_file, fingerprints[format_type]):
+                yield skipped_result(md_path, output_file, format_type)
+                continue
+            if use_store:
+                started = time.perf_counter()
+                key = store_keys[str(output_file)] = artifact_store.output_key(md_path, format_type,
+                                                                               fingerprints[format_type])
+                if not force and artifact_store.fetch('output', key, output_file):
+                    yield record(make_result(md_path, output_file, format_type, 'store', True,
+                                             time.perf_counter() - started))
+                    continue
+            if use_streaming_writer(md_path, format_type, streaming):
+                streaming_jobs.append((md_path, output_file, format_type))
+            else:
+                jobs.append((md_path, output_file, format_type))
+    if not jobs and not streaming_jobs:
+        return
+    # Render each new diagram once, in parallel, before the workers and pandoc look them up
+    diagrams.prerender(sorted({job[0] for job in jobs + streaming_jobs}), workers)
+
+    use_batch = not per_file and convert_markdown_to_docs.HAS_PYPANDOC and pandoc_batch.is_available()
+    pandoc_path = None if use_batch or not jobs else pandoc_jobs.find_pandoc()
+    pdf_engine = pdf_engines.best_engine() if 'pdf' in formats else None
+    # The batch filter runs LaTeX itself; per-file pandoc also drives the HTML engines
+    pdf_via_pandoc = pdf_engine in (pdf_engines.LATEX_ENGINES if use_batch else pdf_engines.PANDOC_ENGINES)
+    # HTML pages are always rendered in the pool, by html_output
+    pandoc_formats = ('docx', 'pdf') if pdf_via_pandoc else ('docx',)
+    pandoc_work = [job for job in jobs if job[2] in pandoc_formats] if use_batch or pandoc_path else []
+    direct_jobs = [job for job in jobs if job not in pandoc_work]
+    workers = workers or os.cpu_count() or 1
+    pool_workers = pandoc_concurrency = workers
+    if pandoc_path and pandoc_work and (direct_jobs or streaming_jobs):
+        # Per-file pandoc runs beside the pool: -j is split between them, not given to each
+        pandoc_concurrency = max(1, workers // 2)
+        pool_workers = max(1, workers - pandoc_concurrency)
+    # Imported here so a run with nothing to rebuild never loads multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from contextlib import nullcontext
+
+    with nullcontext(pool) if pool else ProcessPoolExecutor(max_workers=pool_workers) as pool:
+        futures = {}
+        if use_batch and pandoc_work:
+            futures = {
+                pool.submit(convert_chunk_job, chunk, toc, timeout, pdf_engine): chunk
+                for chunk in split_into_chunks(pandoc_work, workers)
+            }
+        for job in direct_jobs:
+            futures[pool.submit(convert_job, *job, toc)] = [job]
+        for job in streaming_jobs:
+            futures[pool.submit(convert_job, *job, toc, streaming=True)] = [job]
+
+        if pandoc_path and pandoc_work:
+            by_output = {str(output_file): (md_path, output_file, format_type)
+                         for md_path, output_file, format_type in pandoc_work}
+            pandoc_queue = [pandoc_jobs.pandoc_job(md_path, output_file, format_type, pandoc_extra_args(toc),
+                                                   pandoc_path, pdf_engine)
+                            for md_path, output_file, format_type in pandoc_work]
+            for status in pandoc_jobs.iter_results(pandoc_queue, pandoc_concurrency, timeout, retries):
+                job = by_output[status['output']]
+                if status['success']:
+                    yield record(make_result(*job, 'pandoc', True, status['seconds']))
+                else:
+                    futures[pool.submit(convert_job, *job, toc, use_pandoc=False)] = [job]
+
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+                if isinstance(results, dict):
+                    results = [results]
+            except Exception as e:
+                # A crashed worker must not take the rest of the batch down with it
+                results = [
+                    make_result(md_path, output_file, format_type, None, False, 0.0, f'Worker error: {e}')
+                    for md_path, output_file, format_type in futures[future]
+                ]
+            for result in results:
+                yield record(result)
+
+
+def warm_worker():
+    """Import the installed backends so the first rebuild in this worker pays no import cost."""
+    if convert_markdown_to_docs.HAS_DOCX_CONVERSION:
+        import docx
+        import markdown  # noqa: F401
+        # Loading the default template is the slow part of the first Document()
+        docx.Document()
+    if convert_to_pdf.HAS_REPORTLAB:
+        import reportlab.platypus  # noqa: F401
+    if convert_markdown_to_docs.HAS_PYPANDOC:
+        import pypandoc  # noqa: F401
+    return os.getpid()
+
+
+def watch_roots(inputs):
+    """Directories to watch for the given files, directories and glob patterns."""
+    roots = set()
+    for pattern in inputs:
+        path = Path(pattern)
+        if path.is_dir():
+            roots.add(path.resolve())
+        elif path.is_file():
+            roots.add(path.resolve().parent)
+        else:
+            # Watch the fixed part of a glob, e.g. docs/ for docs/**/*_GUIDE.md
+            parts = []
+            for part in path.parts:
+                if glob.has_magic(part):
+                    break
+                parts.append(part)
+            base = Path(*parts) if parts else Path('.')
+            if base.is_dir():
+                roots.add(base.resolve())
+    return sorted(roots)
+
+
+def report_result(result):
+    """Print one finished (not skipped) conversion."""
+    tag = '[SUCCESS]' if result['success'] else '[FAILED]'
+    line = f"   {tag} {Path(result['output']).name}"
+    if result['error']:
+        line += f" - {result['error']}"
+    print(line)
+
+
+def watch(inputs, formats, workers, output_dir=None, toc=False, manifest=None, recursive=False,
+          per_file=False, streaming=False, debounce=0.3, poll=False, poll_interval=0.5,
+          timeout=pandoc_jobs.DEFAULT_TIMEOUT, retries=pandoc_jobs.DEFAULT_RETRIES, index=True):
+    """Reconvert Markdown files as they are saved, until interrupted.
+
+    Changes are collected until the tree has been quiet for debounce seconds,
+    so an editor's burst of writes triggers one rebuild. Only the changed
+    files are reconverted, by a worker pool that stays alive between rebuilds
+    with the backends already imported. Edits to the converters themselves
+    need a restart, since the workers keep the code they started with.
+    With index, the changed files are re-indexed for search as well.
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait
+
+    roots = watch_roots(inputs)
+    if not roots:
+        print("[ERROR] Nothing to watch: no existing directory matches the given inputs.")
+        return 1
+    watcher = file_watcher.make_watcher(roots, recursive=recursive, poll=poll, interval=poll_interval)
+    method = 'inotify' if isinstance(watcher, file_watcher.InotifyWatcher) else 'polling'
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers)
+    wait([pool.submit(warm_worker) for _ in range(workers)])
+    print(f"[WATCHING] {len(roots)} director{'y' if len(roots) == 1 else 'ies'} ({method}, "
+          f"{workers} warm worker{'s' if workers != 1 else ''}). Press Ctrl+C to stop.")
+
+    try:
+        while True:
+            changed = file_watcher.wait_for_changes(watcher, debounce=debounce)
+            if not changed:
+                continue
+            md_files = [md_path for md_path in collect_markdown_files(inputs, recursive=recursive)
+                        if file_watcher.RESCAN in changed or md_path in changed]
+            if not md_files:
+                continue
+            started = time.perf_counter()
+            results = []
+            try:
+                for result in run_batch(md_files, formats, workers, output_dir, toc, manifest=manifest,
+                                        per_file=per_file, streaming=streaming, pool=pool,
+                                        timeout=timeout, retries=retries):
+                    if not result.get('skipped'):
+                        report_result(result)
+                    results.append(result)
+            except OutputCollision as e:
+                print(f"[ERROR] {e}")
+                continue
+            if manifest:
+                manifest.save()
+            if index:
+                search_index.update_quietly(md_files)
+            write_html_indexes(results)
+            rebuilt = sum(1 for r in results if not r.get('skipped'))
+            if rebuilt:
+                failed = sum(1 for r in results if not r['success'])
+                print(f"[REBUILT] {rebuilt} outputs, {failed} failed, in {time.perf_counter() - started:.2f}s")
+                artifact_store.report()
+                conversion_profile.print_report([r['timings'] for r in results if r.get('timings')])
+    except KeyboardInterrupt:
+        print("\n[STOPPED] Watch mode ended.")
+    finally:
+        watcher.close()
+        pool.shutdown(cancel_futures=True)
+    return 0
+
+
+def write_html_indexes(results):
+    """Refresh the index page of every folder that holds HTML outputs from results."""
+    for directory in sorted({Path(r['output']).parent for r in results if r['format'] == 'html' and r['success']}):
+        html_output.write_index(directory)
+
+
+def print_summary(results, elapsed):
+    """Print a per-file result table followed by totals."""
+    by_source = {}
+    for result in results:
+        by_source.setdefault(result['source'], []).append(result)
+
+    print("\n" + "=" * 60)
+    print("[SUMMARY]")
+    for source in sorted(by_source):
+        statuses = []
+        for result in sorted(by_source[source], key=lambda r: r['format']):
+            status = ('CACHED' if result.get('skipped') else 'STORE' if result['backend'] == 'store'
+                      else 'OK' if result['success'] else 'FAILED')
+            statuses.append(f"{result['format']}={status} ({result['seconds']:.2f}s)")
+        print(f"   {Path(source).name}: {', '.join(statuses)}")
+
+    skipped = sum(1 for r in results if r.get('skipped'))
+    restored = sum(1 for r in results if r['backend'] == 'store')
+    succeeded = sum(1 for r in results if r['success']) - skipped - restored
+    failed = len(results) - succeeded - skipped - restored
+    print("=" * 60)
+    print(f"[DONE] {succeeded} converted, {restored} copied from the artifact store, {skipped} up to date, "
+          f"{failed} failed, {len(by_source)} files in {elapsed:.2f}s")
+    conversion_profile.print_report([r['timings'] for r in results if r.get('timings')])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Convert Markdown files to Word, PDF and HTML in parallel.')
+    parser.add_argument('inputs', nargs='*',
+                        help='Markdown files, directories or glob patterns (default: project root)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Number of worker processes (default: CPU count)')
+    parser.add_argument('-f', '--formats', default=','.join(SUPPORTED_FORMATS),
+                        help='Comma-separated output formats (default: docx,pdf,html)')
+    parser.add_argument('-o', '--output-dir', help='Write outputs here instead of next to each source')
+    parser.add_argument('-r', '--recursive', action='store_true', help='Search directories recursively')
+    parser.add_argument('--toc', action='store_true', help='Add a table of contents (pandoc only)')
+    parser.add_argument('--streaming', action='store_true',
+                        help='Write every DOCX with the constant-memory streaming writer')
+    parser.add_argument('--per-file', action='store_true',
+                        help='Start one pandoc per file and format instead of one per worker')
+    parser.add_argument('--timeout', type=float, default=pandoc_jobs.DEFAULT_TIMEOUT,
+                        help=f'Seconds before a pandoc/LaTeX job is killed (default: {pandoc_jobs.DEFAULT_TIMEOUT})')
+    parser.add_argument('--retries', type=int, default=pandoc_jobs.DEFAULT_RETRIES,
+                        help=f'Retries for pandoc jobs that time out or crash (default: {pandoc_jobs.DEFAULT_RETRIES})')
+    parser.add_argument('--manifest', help='Build manifest path (default: .conversion-manifest.json in the project root)')
+    parser.add_argument('--force', action='store_true',
+                        help='Reconvert everything, ignoring the build manifest and the artifact store')
+    parser.add_argument('--summary-json', help='Also write the per-file results to this JSON file')
+    parser.add_argument('--timings', action='store_true',
+                        help='Record per-stage timings and counters (read, lex, build, save, pandoc)')
+    parser.add_argument('--profile', choices=('cprofile', 'tracemalloc', 'both'),
+                        help='Write a cProfile (.prof) and/or tracemalloc report next to each output')
+    parser.add_argument('--template',
+                        help='Corporate Word template (.dotx or .docx) for the DOCX outputs')
+    parser.add_argument('--pdf-engine', choices=pdf_engines.ENGINES,
+                        help='Preferred PDF engine when it works (default: the fastest one found)')
+    parser.add_argument('--split-chapters', action='store_true',
+                        help='Render every reportlab PDF chapter by chapter on all cores, not just large ones')
+    parser.add_argument('--store', metavar='DIR',
+                        help='Artifact store directory, e.g. a shared or CI-cached one (default: '
+                             '.conversion-cache/store; see artifact_store.py)')
+    parser.add_argument('--store-max-mb', type=float,
+                        help=f'Size cap of the artifact store in MB (default: {artifact_store.DEFAULT_MAX_MB})')
+    parser.add_argument('--no-store', action='store_true',
+                        help='Neither copy outputs from the artifact store nor add them to it')
+    parser.add_argument('--no-index', action='store_true',
+                        help='Do not update the full-text search index (see search_index.py)')
+    parser.add_argument('--shard', metavar='I/N',
+                        help='Convert only shard I of N, e.g. 2/4, and write its partial manifest (see shards.py)')
+    parser.add_argument('--shard-manifest',
+                        help='Partial manifest path for --shard (default: .conversion-shard-I-of-N.json '
+                             'in the project root)')
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help='After the initial build, keep reconverting files as they change')
+    parser.add_argument('--debounce', type=float, default=0.3,
+                        help='Seconds of quiet to wait for before rebuilding in watch mode (default: 0.3)')
+    parser.add_argument('--poll', action='store_true',
+                        help='Watch by polling modification times instead of using inotify')
+    parser.add_argument('--poll-interval', type=float, default=0.5,
+                        help='Seconds between scans when polling (default: 0.5)')
+    args = parser.parse_args(argv)
+
+    args.formats = [f.strip().lower() for f in args.formats.split(',') if f.strip()]
+    unsupported = [f for f in args.formats if f not in SUPPORTED_FORMATS]
+    if unsupported:
+        parser.error(f"Unsupported format(s): {', '.join(unsupported)}")
+    if args.template and not Path(args.template).is_file():
+        parser.error(f'Template not found: {args.template}')
+    if args.timeout <= 0 or args.retries < 0:
+        parser.error('--timeout must be positive and --retries non-negative')
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    if args.store_max_mb is not None and args.store_max_mb <= 0:
+        parser.error('--store-max-mb must be positive')
+    if args.shard:
+        try:
+            args.shard = shards.parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(f'--shard: {e}')
+        if args.watch:
+            parser.error('--shard and --watch cannot be combined')
+    elif args.shard_manifest:
+        parser.error('--shard-manifest needs --shard')
+    return args
+
+
+def main(argv=None):
+    """Main batch conversion function."""
+    args = parse_args(argv)
+    inputs = args.inputs or [str(Path(__file__).parent)]
+    md_files = collect_markdown_files(inputs, recursive=args.recursive)
+
+    if not md_files and not args.watch:
+        print("[ERROR] No Markdown files matched the given inputs.")
+        return 1
+    try:
+        # Checked on the whole corpus, so a collision between two shards is caught as well
+        check_output_paths(md_files, args.formats, args.output_dir)
+    except OutputCollision as e:
+        print(f"[ERROR] {e}")
+        return 1
+    if args.shard:
+        index, count = args.shard
+        # Every runner plans the whole build, so each partial manifest can list all of its outputs
+        assignment = shards.assign(md_files, count)
+        planned = [(md_path, format_type, output_path_for(md_path, format_type, args.output_dir))
+                   for md_path in md_files for format_type in args.formats]
+        md_files = [md_path for md_path in md_files if assignment[md_path] == index]
+        print(f"[INFO] Shard {index}/{count}: {len(md_files)} of {len(assignment)} files")
+
+    print(f"[CONVERTING] {len(md_files)} files -> {', '.join(args.formats)} using {args.jobs} workers")
+    # Worker processes inherit the environment, which is how conversion_profile is switched on
+    if args.timings:
+        os.environ[conversion_profile.ENV_TIMINGS] = '1'
+    if args.profile:
+        os.environ[conversion_profile.ENV_PROFILE] = 'cprofile,tracemalloc' if args.profile == 'both' else args.profile
+    if args.template:
+        os.environ[doc_templates.ENV_TEMPLATE] = str(Path(args.template).resolve())
+    if args.pdf_engine:
+        os.environ[pdf_engines.ENV_PDF_ENGINE] = args.pdf_engine
+    if args.split_chapters:
+        os.environ[convert_to_pdf.ENV_CHAPTERS] = '1'
+    if convert_to_pdf.ENV_CHAPTER_WORKERS not in os.environ:
+        # Long PDFs in the -j workers share the cores instead of each starting cpu_count() processes
+        os.environ[convert_to_pdf.ENV_CHAPTER_WORKERS] = str(max(1, (os.cpu_count() or 1) // (args.jobs or 1)))
+    if args.store:
+        os.environ[artifact_store.ENV_STORE_DIR] = str(Path(args.store).resolve())
+    if args.store_max_mb is not None:
+        os.environ[artifact_store.ENV_STORE_MAX_MB] = str(args.store_max_mb)
+    if args.no_store:
+        os.environ[artifact_store.ENV_STORE] = '0'
+    if 'pdf' in args.formats:
+        # Probe once here, so the workers read the cached result instead of each probing
+        order = pdf_engines.engine_order()
+        if order:
+            print(f"[INFO] PDF engine: {order[0]}" + (f" (fallback: {', '.join(order[1:])})" if order[1:] else ''))
+        else:
+            print("[WARNING] No working PDF engine found; PDF outputs will fail. See: python pdf_engines.py")
+
+    manifest = BuildManifest(args.manifest)
+    started = time.perf_counter()
+    results = []
+    try:
+        for result in run_batch(md_files, args.formats, args.jobs, args.output_dir, args.toc,
+                                manifest=manifest, force=args.force, per_file=args.per_file,
+                                streaming=args.streaming, timeout=args.timeout, retries=args.retries):
+            if not result.get('skipped'):
+                report_result(result)
+            results.append(result)
+    finally:
+        manifest.save()
+    elapsed = time.perf_counter() - started
+    if args.shard:
+        partial = args.shard_manifest or shards.partial_path(*args.shard)
+        shards.write_partial(partial, *args.shard, planned, assignment, results, manifest)
+        print(f"[INFO] Partial manifest written to {partial}")
+    write_html_indexes(results)
+    if not args.no_index:
+        search_index.update_quietly(md_files)
+    artifact_store.report()
+
+    print_summary(results, elapsed)
+
+    if args.summary_json:
+        summary = {'elapsed': round(elapsed, 3), 'results': results}
+        timings = [r['timings'] for r in results if r.get('timings')]
+        if timings:
+            summary['timings'] = conversion_profile.aggregate(timings)
+        with open(args.summary_json, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+    if args.watch:
+        return watch(inputs, args.formats, args.jobs, args.output_dir, args.toc, manifest=manifest,
+                     recursive=args.recursive, per_file=args.per_file, streaming=args.streaming,
+                     debounce=args.debounce, poll=args.poll, poll_interval=args.poll_interval,
+                     timeout=args.timeout, retries=args.retries, index=not args.no_index)
+
+    return 0 if all(r['success'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,25 +7,26 @@ import os
 import sys
 from pathlib import Path
 
-# Check for available conversion libraries
-try:
-    import pypandoc
-    HAS_PYPANDOC = True
-except ImportError:
-    HAS_PYPANDOC = False
-    print("[INFO] pypandoc not found. Install with: pip install pypandoc")
+import backends
+import conversion_profile
+import doc_templates
+import pandoc_ast
+from docx_tables import (
+    add_bulk_table, add_diagram, add_highlighted_code, add_markdown_heading, add_markdown_paragraph
+)
+from markdown_blocks import BULLET, CHECKBOX, CODE, HEADING, NUMBERED, PARAGRAPH, RULE, TABLE, iter_blocks
 
-try:
-    from docx import Document
-    from docx.shared import Inches, Pt, RGBColor
-    from docx.enum.text import WD_ALIGN_PARAGRAPH
-    from docx.oxml.ns import qn
-    import markdown
-    HAS_DOCX_CONVERSION = True
-except ImportError:
-    HAS_DOCX_CONVERSION = False
+# Check for available conversion libraries (cached probe; backends are imported on first use)
+# pypandoc is only usable with a pandoc binary, which the same probe looks for
+HAS_PYPANDOC = backends.available('pypandoc') and backends.pandoc_version() is not None
+if not HAS_PYPANDOC:
+    print("[INFO] pypandoc or pandoc not found. Install with: pip install pypandoc (and pandoc, https://pandoc.org)")
+
+HAS_DOCX_CONVERSION = backends.available('docx') and backends.available('markdown')
+if not HAS_DOCX_CONVERSION:
     print("[INFO] python-docx not found. Install with: pip install python-docx markdown")
 
+@conversion_profile.profiled
 def convert_with_pypandoc(input_file, output_file, format_type='docx'):
     """Convert markdown to Word using pypandoc."""
     try:
@@ -34,150 +35,84 @@ def convert_with_pypandoc(input_file, output_file, format_type='docx'):
         else:
             raise ValueError(f"Unsupported format: {format_type}")
         
-        pypandoc.convert_file(
-            input_file,
+        # Parse once into the cached JSON AST; other formats of the same file reuse it
+        ast = pandoc_ast.load_ast(input_file)
+        pandoc_ast.render_ast(
+            ast,
+            output_file,
             output_format,
-            outputfile=output_file,
-            extra_args=['--standalone', '--toc']
+            extra_args=['--standalone', '--toc'],
+            resource_dir=Path(input_file).parent
         )
         return True
     except Exception as e:
         print(f"Error with pypandoc conversion: {e}")
         return False
 
+@conversion_profile.profiled
 def convert_markdown_to_word_enhanced(md_file, docx_file):
     """Enhanced markdown to Word converter with better formatting."""
     try:
-        # Read markdown file
-        with open(md_file, 'r', encoding='utf-8') as f:
-            md_content = f.read()
-        
-        # Create Word document
-        doc = Document()
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        from docx.oxml.ns import qn
+        from docx.shared import Pt, RGBColor
         
-        # Set default font
-        style = doc.styles['Normal']
-        font = style.font
-        font.name = 'Calibri'
-        font.size = Pt(11)
+        # Create Word document from the cached, pre-styled template
+        doc = doc_templates.new_document('Calibri', 11)
         
-        # Process markdown content
-        lines = md_content.split('\n')
-        in_code_block = False
-        code_block_lines = []
-        in_table = False
-        table_rows = []
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            stripped = line.strip()
-            
-            # Skip empty lines at start
-            if not stripped and i == 0:
-                i += 1
-                continue
-            
-            # Code blocks
-            if stripped.startswith('```'):
-                if in_code_block:
-                    # End code block
-                    if code_block_lines:
-                        code_para = doc.add_paragraph('\n'.join(code_block_lines))
-                        code_para.style = 'No Spacing'
-                        for run in code_para.runs:
-                            run.font.name = 'Consolas'
-                            run.font.size = Pt(9)
-                            run.font.color.rgb = RGBColor(0, 0, 0)
-                    code_block_lines = []
-                    in_code_block = False
+        # Stream the markdown file through the shared block lexer
+        with open(md_file, 'r', encoding='utf-8') as f:
+            lines = conversion_profile.timed_iter(f, 'read', 'lines')
+            for block in conversion_profile.timed_iter(iter_blocks(lines), 'lex', 'blocks'):
+                kind = block.kind
+                
+                # Code blocks
+                if kind == CODE:
+                    if add_diagram(doc, block) is not None or add_highlighted_code(doc, block) is not None:
+                        continue
+                    code_para = doc.add_paragraph(block.text)
+                    code_para.style = 'No Spacing'
+                    for run in code_para.runs:
+                        run.font.name = 'Consolas'
+                        run.font.size = Pt(9)
+                        run.font.color.rgb = RGBColor(0, 0, 0)
+                # Tables
+                elif kind == TABLE:
+                    # Header row bold
+                    add_bulk_table(doc, block.rows, style='Light Grid Accent 1', bold_header=True)
+                    conversion_profile.count('tables')
+                # Headers
+                elif kind == HEADING:
+                    heading = add_markdown_heading(doc, block.text, block.level)
+                    if block.level == 1:
+                        heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
+                # Horizontal rules
+                elif kind == RULE:
+                    para = doc.add_paragraph('_' * 50)
+                    para.runs[0].font.color.rgb = RGBColor(192, 192, 192)
+                # Lists
+                elif kind == BULLET:
+                    # Handle emojis and formatting
+                    add_markdown_paragraph(doc, block.text.strip(), style='List Bullet')
+                elif kind == NUMBERED:
+                    add_markdown_paragraph(doc, block.text, style='List Number')
+                # Checkboxes
+                elif kind == CHECKBOX:
+                    checkbox = '☑' if block.checked else '☐'
+                    add_markdown_paragraph(doc, f'{checkbox} {block.text}', style='List Bullet')
+                # Regular text: bold, italic, code and links become merged runs
+                elif kind == PARAGRAPH:
+                    add_markdown_paragraph(doc, block.text)
                 else:
-                    in_code_block = True
-                i += 1
-                continue
-            
-            if in_code_block:
-                code_block_lines.append(line)
-                i += 1
-                continue
-            
-            # Tables
-            if '|' in line and stripped.startswith('|'):
-                if not in_table:
-                    in_table = True
-                    table_rows = []
-                table_rows.append([cell.strip() for cell in line.split('|')[1:-1]])
-                i += 1
-                continue
-            else:
-                if in_table and table_rows:
-                    # Create table
-                    table = doc.add_table(rows=len(table_rows), cols=len(table_rows[0]))
-                    table.style = 'Light Grid Accent 1'
-                    for row_idx, row_data in enumerate(table_rows):
-                        for col_idx, cell_data in enumerate(row_data):
-                            cell = table.rows[row_idx].cells[col_idx]
-                            cell.text = cell_data
-                            # Make header row bold
-                            if row_idx == 0:
-                                for paragraph in cell.paragraphs:
-                                    for run in paragraph.runs:
-                                        run.bold = True
-                    table_rows = []
-                    in_table = False
-            
-            # Headers
-            if stripped.startswith('# '):
-                heading = doc.add_heading(stripped[2:], level=1)
-                heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            elif stripped.startswith('## '):
-                doc.add_heading(stripped[3:], level=2)
-            elif stripped.startswith('### '):
-                doc.add_heading(stripped[4:], level=3)
-            elif stripped.startswith('#### '):
-                doc.add_heading(stripped[5:], level=4)
-            elif stripped.startswith('##### '):
-                doc.add_heading(stripped[6:], level=5)
-            # Horizontal rules
-            elif stripped.startswith('---'):
-                para = doc.add_paragraph('_' * 50)
-                para.runs[0].font.color.rgb = RGBColor(192, 192, 192)
-            # Lists
-            elif stripped.startswith('- ') or stripped.startswith('* '):
-                list_text = stripped[2:].strip()
-                # Handle emojis and formatting
-                para = doc.add_paragraph(list_text, style='List Bullet')
-            elif stripped.startswith('1. ') or any(stripped.startswith(f'{n}. ') for n in range(2, 100)):
-                # Numbered list
-                num_text = stripped.split('. ', 1)
-                if len(num_text) > 1:
-                    para = doc.add_paragraph(num_text[1], style='List Number')
-            # Checkboxes
-            elif stripped.startswith('- [ ]') or stripped.startswith('- [x]') or stripped.startswith('- [X]'):
-                checkbox_text = stripped[5:].strip()
-                checkbox = '☐' if '[ ]' in stripped else '☑'
-                doc.add_paragraph(f'{checkbox} {checkbox_text}', style='List Bullet')
-            # Bold/italic text (simple detection)
-            elif '**' in stripped or '__' in stripped:
-                para = doc.add_paragraph()
-                # Simple bold handling
-                parts = stripped.replace('**', '|||').split('|||')
-                for idx, part in enumerate(parts):
-                    run = para.add_run(part)
-                    if idx % 2 == 1:  # Odd indices are bold
-                        run.bold = True
-            # Regular text
-            elif stripped:
-                # Handle emojis and special characters
-                para = doc.add_paragraph(stripped)
-            else:
-                # Empty line
-                doc.add_paragraph()
-            
-            i += 1
+                    # Empty line
+                    doc.add_paragraph()
+        
+        if conversion_profile.active():
+            conversion_profile.count('runs', sum(1 for _ in doc.element.body.iter(qn('w:r'))))
         
         # Save document
-        doc.save(docx_file)
+        with conversion_profile.stage('save'):
+            doc.save(docx_file)
         return True
     except Exception as e:
         print(f"Error with Word conversion: {e}")
@@ -237,6 +172,7 @@ def main():
         print(f"         Word document: {docx_file}")
         print(f"         File size: {docx_file.stat().st_size / 1024:.2f} KB")
     print("\n[NOTE] You can now open the .docx file in Microsoft Word")
+    conversion_profile.print_report()
 
 if __name__ == '__main__':
     main()
@@ -1,29 +1,34 @@
 #!/usr/bin/env python3
 """
-Convert Markdown files to Word (.docx) and PDF formats.
+Convert Markdown files to Word (.docx), PDF and HTML formats.
 """
 
 import os
 import sys
 from pathlib import Path
 
-try:
-    import pypandoc
-    HAS_PYPANDOC = True
-except ImportError:
-    HAS_PYPANDOC = False
+import artifact_store
+import backends
+import conversion_profile
+import diagrams
+import doc_templates
+import html_output
+from docx_tables import add_diagram, add_highlighted_code, add_markdown_heading, add_markdown_paragraph
+import pandoc_ast
+import pandoc_jobs
+import pdf_engines
+from conversion_manifest import MANIFEST_NAME, BuildManifest, build_fingerprint
+from markdown_blocks import (
+    BLANK, BULLET, CHECKBOX, CODE, CODE_LINE, FENCE_CLOSE, FENCE_OPEN, HEADING, NUMBERED, RULE, Block, tokenize
+)
 
-try:
-    from docx import Document
-    from docx.shared import Inches, Pt
-    from docx.enum.text import WD_ALIGN_PARAGRAPH
-    import markdown
-    from markdown.extensions import codehilite, tables, fenced_code
-    HAS_DOCX_CONVERSION = True
-except ImportError:
-    HAS_DOCX_CONVERSION = False
+# Cached availability probe; the backends are imported on first use
+# pypandoc is only usable with a pandoc binary, which the same probe looks for
+HAS_PYPANDOC = backends.available('pypandoc') and backends.pandoc_version() is not None
+HAS_DOCX_CONVERSION = backends.available('docx') and backends.available('markdown')
 
-def convert_with_pypandoc(input_file, output_file, format_type='docx'):
+@conversion_profile.profiled
+def convert_with_pypandoc(input_file, output_file, format_type='docx', extra_args=None):
     """Convert markdown to Word or PDF using pypandoc."""
     try:
         if format_type == 'docx':
@@ -33,69 +38,86 @@ def convert_with_pypandoc(input_file, output_file, format_type='docx'):
         else:
             raise ValueError(f"Unsupported format: {format_type}")
         
-        pypandoc.convert_file(
-            input_file,
+        # Parse once into the cached JSON AST; other formats of the same file reuse it
+        ast = pandoc_ast.load_ast(input_file)
+        pandoc_ast.render_ast(
+            ast,
+            output_file,
             output_format,
-            outputfile=output_file,
-            extra_args=['--standalone']
+            extra_args=extra_args or ['--standalone'],
+            resource_dir=Path(input_file).parent
         )
         return True
     except Exception as e:
         print(f"Error with pypandoc conversion: {e}")
         return False
 
+def _add_code_block(doc, fence):
+    """Add a collected fence as a diagram picture, highlighted code, or plain code lines."""
+    if fence is None:
+        return
+    block = fence._replace(text='\n'.join(fence.text))
+    if add_diagram(doc, block) is None and add_highlighted_code(doc, block) is None:
+        for line in fence.text:
+            doc.add_paragraph(line.strip())
+
+@conversion_profile.profiled
 def convert_markdown_to_word_simple(md_file, docx_file):
     """Simple markdown to Word converter using python-docx."""
     try:
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        
         # Read markdown file
-        with open(md_file, 'r', encoding='utf-8') as f:
+        with conversion_profile.stage('read'), open(md_file, 'r', encoding='utf-8') as f:
             md_content = f.read()
         
-        # Convert markdown to HTML
-        html = markdown.markdown(
-            md_content,
-            extensions=['codehilite', 'fenced_code', 'tables']
-        )
+        # Convert markdown to HTML; the render is cached for the HTML page of this file (see html_output)
+        html_output.render(md_content)
         
-        # Create Word document
-        doc = Document()
+        # Create Word document from the cached template
+        doc = doc_templates.new_document()
         
         # Add title
         title = doc.add_heading(Path(md_file).stem.replace('_', ' ').title(), 0)
         title.alignment = WD_ALIGN_PARAGRAPH.CENTER
         
-        # Parse HTML and add to document (simplified approach)
-        # Split by lines and process
-        lines = md_content.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
+        # Classify lines with the shared block tokenizer
+        conversion_profile.count('lines', md_content.count('\n') + 1)
+        fence = None
+        for token in conversion_profile.timed_iter(tokenize(md_content.split('\n')), 'lex', 'blocks'):
+            kind = token.kind
+            if kind == BLANK:
                 doc.add_paragraph()
-                continue
-            
             # Headers
-            if line.startswith('# '):
-                doc.add_heading(line[2:], level=1)
-            elif line.startswith('## '):
-                doc.add_heading(line[3:], level=2)
-            elif line.startswith('### '):
-                doc.add_heading(line[4:], level=3)
-            elif line.startswith('#### '):
-                doc.add_heading(line[5:], level=4)
+            elif kind == HEADING and token.level <= 4:
+                add_markdown_heading(doc, token.text, token.level)
             # Code blocks
-            elif line.startswith('```'):
-                continue  # Skip code block markers
+            elif kind == FENCE_OPEN:
+                # Code is collected and added when the fence closes: as a diagram or highlighted if possible
+                fence = Block(CODE, [], lang=token.lang)
+            elif kind == FENCE_CLOSE:
+                _add_code_block(doc, fence)
+                fence = None
+            elif kind == CODE_LINE:
+                fence.text.append(token.text)
             # Lists
-            elif line.startswith('- ') or line.startswith('* '):
-                doc.add_paragraph(line[2:], style='List Bullet')
-            elif line.startswith(tuple(f'{i}. ' for i in range(1, 100))):
-                doc.add_paragraph(line[line.index('.')+2:], style='List Number')
-            # Regular text
+            elif kind == BULLET:
+                add_markdown_paragraph(doc, token.text, style='List Bullet')
+            elif kind == CHECKBOX:
+                checkbox = '☑' if token.checked else '☐'
+                add_markdown_paragraph(doc, f'{checkbox} {token.text}', style='List Bullet')
+            elif kind == NUMBERED:
+                add_markdown_paragraph(doc, token.text, style='List Number')
+            elif kind == RULE:
+                doc.add_paragraph('_' * 50)
+            # Regular text (including table rows)
             else:
-                doc.add_paragraph(line)
+                add_markdown_paragraph(doc, token.text)
+        # A fence left open at the end of the file
+        _add_code_block(doc, fence)
         
-        doc.save(docx_file)
+        with conversion_profile.stage('save'):
+            doc.save(docx_file)
         return True
     except Exception as e:
         print(f"Error with simple conversion: {e}")
@@ -103,8 +125,46 @@ def convert_markdown_to_word_simple(md_file, docx_file):
         traceback.print_exc()
         return False
 
+def convert_docx(md_path, docx_file, use_pandoc=True):
+    """Convert one file to Word, returning the backend that succeeded or None."""
+    if use_pandoc and HAS_PYPANDOC:
+        if convert_with_pypandoc(str(md_path), str(docx_file), 'docx'):
+            print(f"   [SUCCESS] Word document created: {docx_file.name}")
+            return 'pypandoc'
+        print(f"   [WARNING] Pypandoc failed, trying simple converter...")
+    if HAS_DOCX_CONVERSION:
+        if convert_markdown_to_word_simple(str(md_path), str(docx_file)) and docx_file.exists():
+            print(f"   [SUCCESS] Word document created (simple method): {docx_file.name}")
+            return 'python-docx'
+    elif not (use_pandoc and HAS_PYPANDOC):
+        print(f"   [ERROR] No conversion method available. Install pypandoc or python-docx")
+    return None
+
+def convert_pdf(md_path, pdf_file, use_pandoc=True):
+    """Convert one file to PDF, returning the engine that succeeded or None."""
+    # Only engines the probe found working are tried, fastest first (see pdf_engines)
+    engines = pdf_engines.engine_order(include_pandoc=use_pandoc)
+    backend = pdf_engines.convert(md_path, pdf_file, engines=engines) if engines else None
+    if backend:
+        print(f"   [SUCCESS] PDF document created ({backend}): {pdf_file.name}")
+        return backend
+    print(f"   [WARNING] PDF conversion failed. You may need to:")
+    print(f"      - Install reportlab (pip install reportlab), LaTeX or wkhtmltopdf, or")
+    print(f"      - Convert Word to PDF manually using Microsoft Word")
+    return None
+
+def convert_html(md_path, html_file, use_pandoc=True):
+    """Convert one file to an HTML page, returning the backend that succeeded or None."""
+    if not backends.available('markdown'):
+        print(f"   [ERROR] No HTML renderer available. Install markdown (pip install markdown)")
+        return None
+    if html_output.convert_markdown_to_html(str(md_path), str(html_file)):
+        print(f"   [SUCCESS] HTML page created: {html_file.name}")
+        return 'python-markdown'
+    return None
+
 def main():
-    """Main conversion function."""
+    """Main conversion function. Pass --force to ignore the build manifest."""
     # Files to convert
     md_files = [
         'ESCROW_INTEGRATION_SUMMARY.md',
@@ -114,60 +174,87 @@ def main():
     ]
     
     base_dir = Path(__file__).parent
+    force = '--force' in sys.argv[1:]
+    manifest = BuildManifest(base_dir / MANIFEST_NAME)
     
-    for md_file in md_files:
-        md_path = base_dir / md_file
-        if not md_path.exists():
-            print(f"[WARNING] File not found: {md_file}")
-            continue
-        
-        print(f"\n[CONVERTING] {md_file}")
+    pandoc_path = pandoc_jobs.find_pandoc()
+    pdf_engine = pdf_engines.best_engine()
+    fingerprints = {format_type: build_fingerprint(format_type) for format_type in ('docx', 'pdf', 'html')}
+    
+    try:
+        pending = {}
+        store_keys = {}
+        for md_file in md_files:
+            md_path = base_dir / md_file
+            if not md_path.exists():
+                print(f"[WARNING] File not found: {md_file}")
+                continue
+            
+            for format_type, label, converter in (('docx', 'Word', convert_docx), ('pdf', 'PDF', convert_pdf),
+                                                  ('html', 'HTML', convert_html)):
+                output_file = md_path.with_suffix(f'.{format_type}')
+                if format_type == 'html':
+                    output_file = md_path.parent / html_output.HTML_DIR / output_file.name
+                key = fingerprints[format_type]
+                if not force and manifest.is_up_to_date(md_path, output_file, key):
+                    print(f"   [SKIPPED] {label} document is up to date: {output_file.name}")
+                    continue
+                if artifact_store.enabled():
+                    # Built before, here or on another machine: copy it instead of converting again
+                    store_keys[str(output_file)] = artifact_store.output_key(md_path, format_type, key)
+                    if not force and artifact_store.fetch('output', store_keys[str(output_file)], output_file):
+                        print(f"   [SKIPPED] {label} document copied from the artifact store: {output_file.name}")
+                        manifest.record(md_path, output_file, key, 'store')
+                        continue
+                pending[str(output_file)] = (md_path, output_file, format_type, label, converter, key)
         
-        # Convert to Word
-        docx_file = md_path.with_suffix('.docx')
-        print(f"   -> Converting to Word: {docx_file.name}")
+        # pandoc jobs run concurrently, each with a timeout, so one stuck LaTeX build
+        # cannot hold up the rest; whatever pandoc cannot produce falls back below
+        # PDFs only go to pandoc when the fastest working PDF engine is one pandoc drives
+        # HTML pages are always rendered by html_output
+        pandoc_formats = ('docx', 'pdf') if pdf_engine in pdf_engines.PANDOC_ENGINES else ('docx',)
+        via_pandoc = {output: job for output, job in pending.items()
+                      if job[2] in pandoc_formats} if pandoc_path else {}
+        fallback = [job for output, job in pending.items() if output not in via_pandoc]
+        if via_pandoc:
+            print(f"\n[CONVERTING] {len(via_pandoc)} outputs with pandoc")
+            # The pandoc filter only swaps in diagrams that are already rendered
+            diagrams.prerender(sorted({job[0] for job in via_pandoc.values()}))
+            jobs = [pandoc_jobs.pandoc_job(md_path, output_file, format_type, pandoc_path=pandoc_path,
+                                           pdf_engine=pdf_engine)
+                    for md_path, output_file, format_type, _, _, _ in via_pandoc.values()]
+            for result in pandoc_jobs.iter_results(jobs):
+                md_path, output_file, format_type, label, converter, key = pending[result['output']]
+                if result['success']:
+                    print(f"   [SUCCESS] {label} document created: {output_file.name} ({result['seconds']:.1f}s)")
+                    manifest.record(md_path, output_file, key, 'pandoc')
+                    if result['output'] in store_keys:
+                        artifact_store.put('output', store_keys[result['output']], output_file)
+                else:
+                    print(f"   [WARNING] pandoc failed for {output_file.name}: {(result['error'] or 'unknown error').splitlines()[-1]}")
+                    fallback.append(pending[result['output']])
         
-        if HAS_PYPANDOC:
-            success = convert_with_pypandoc(str(md_path), str(docx_file), 'docx')
-            if success:
-                print(f"   [SUCCESS] Word document created: {docx_file.name}")
+        for md_path, output_file, format_type, label, converter, key in fallback:
+            print(f"\n[CONVERTING] {md_path.name}")
+            print(f"   -> Converting to {label}: {output_file.name}")
+            backend = converter(md_path, output_file, use_pandoc=str(output_file) not in via_pandoc)
+            if backend:
+                manifest.record(md_path, output_file, key, backend)
+                if str(output_file) in store_keys:
+                    artifact_store.put('output', store_keys[str(output_file)], output_file)
             else:
-                print(f"   [WARNING] Pypandoc failed, trying simple converter...")
-                if HAS_DOCX_CONVERSION:
-                    convert_markdown_to_word_simple(str(md_path), str(docx_file))
-                    if docx_file.exists():
-                        print(f"   [SUCCESS] Word document created (simple method): {docx_file.name}")
-        elif HAS_DOCX_CONVERSION:
-            convert_markdown_to_word_simple(str(md_path), str(docx_file))
-            if docx_file.exists():
-                print(f"   [SUCCESS] Word document created (simple method): {docx_file.name}")
-        else:
-            print(f"   [ERROR] No conversion method available. Install pypandoc or python-docx")
-        
-        # Convert to PDF (requires pypandoc and LaTeX or wkhtmltopdf)
-        pdf_file = md_path.with_suffix('.pdf')
-        print(f"   -> Converting to PDF: {pdf_file.name}")
-        
-        if HAS_PYPANDOC:
-            try:
-                # Try PDF conversion
-                success = convert_with_pypandoc(str(md_path), str(pdf_file), 'pdf')
-                if success:
-                    print(f"   [SUCCESS] PDF document created: {pdf_file.name}")
-                else:
-                    print(f"   [WARNING] PDF conversion failed. You may need to:")
-                    print(f"      - Install wkhtmltopdf for PDF conversion, or")
-                    print(f"      - Convert Word to PDF manually using Microsoft Word")
-            except Exception as e:
-                print(f"   [WARNING] PDF conversion error: {e}")
-                print(f"      [TIP] Open the .docx file in Microsoft Word and save as PDF")
-        else:
-            print(f"   [WARNING] PDF conversion requires pypandoc")
-            print(f"      [TIP] Open the .docx file in Microsoft Word and save as PDF")
+                manifest.forget(output_file)
+    finally:
+        manifest.save()
+    if (base_dir / html_output.HTML_DIR).is_dir():
+        html_output.write_index(base_dir / html_output.HTML_DIR)
+    
+    artifact_store.report()
     
     print("\n[SUCCESS] Conversion complete!")
     print("\n[NOTE] For best PDF results, open the .docx files in Microsoft Word")
     print("       and use 'Save As' -> PDF format.")
+    conversion_profile.print_report()
 
 if __name__ == '__main__':
     main()
@@ -7,25 +7,37 @@ import os
 import sys
 from pathlib import Path
 
-# Check for available conversion libraries
-try:
-    import pypandoc
-    HAS_PYPANDOC = True
-except ImportError:
-    HAS_PYPANDOC = False
-    print("[INFO] pypandoc not found. Install with: pip install pypandoc")
+import backends
+import conversion_profile
+import diagrams
+import doc_templates
+import pdf_engines
+import section_cache
+from conversion_manifest import MANIFEST_NAME, BuildManifest, build_fingerprint
+from docx_tables import (
+    add_bulk_table, add_diagram, add_highlighted_code, add_markdown_heading, add_markdown_paragraph
+)
+from markdown_blocks import BLANK, BULLET, CHECKBOX, CODE, HEADING, NUMBERED, PARAGRAPH, RULE, TABLE, iter_blocks
+import pandoc_ast
+from pandoc_ast import ast_to_blocks
 
-try:
-    from docx import Document
-    from docx.shared import Inches, Pt, RGBColor
-    from docx.enum.text import WD_ALIGN_PARAGRAPH
-    from docx.oxml.ns import qn
-    import markdown
-    HAS_DOCX_CONVERSION = True
-except ImportError:
-    HAS_DOCX_CONVERSION = False
+# Check for available conversion libraries (cached probe; backends are imported on first use)
+# pypandoc is only usable with a pandoc binary, which the same probe looks for
+HAS_PYPANDOC = backends.available('pypandoc') and backends.pandoc_version() is not None
+if not HAS_PYPANDOC:
+    print("[INFO] pypandoc or pandoc not found. Install with: pip install pypandoc (and pandoc, https://pandoc.org)")
+
+HAS_DOCX_CONVERSION = backends.available('docx') and backends.available('markdown')
+if not HAS_DOCX_CONVERSION:
     print("[INFO] python-docx not found. Install with: pip install python-docx markdown")
 
+# Formatting used by the python-docx converter (also part of the build fingerprint)
+DEFAULT_FONT_NAME = 'Calibri'
+DEFAULT_FONT_SIZE = 11
+TABLE_STYLE = 'Light Grid Accent 1'
+PANDOC_EXTRA_ARGS = ['--standalone', '--toc']
+
+@conversion_profile.profiled
 def convert_with_pypandoc(input_file, output_file, format_type='docx'):
     """Convert markdown to Word or PDF using pypandoc."""
     try:
@@ -36,139 +48,114 @@ def convert_with_pypandoc(input_file, output_file, format_type='docx'):
         else:
             raise ValueError(f"Unsupported format: {format_type}")
         
-        pypandoc.convert_file(
-            input_file,
+        # Parse once into the cached JSON AST; other formats of the same file reuse it
+        ast = pandoc_ast.load_ast(input_file)
+        pandoc_ast.render_ast(
+            ast,
+            output_file,
             output_format,
-            outputfile=output_file,
-            extra_args=['--standalone', '--toc']
+            extra_args=PANDOC_EXTRA_ARGS,
+            resource_dir=Path(input_file).parent
         )
         return True
     except Exception as e:
         print(f"Error with pypandoc conversion: {e}")
         return False
 
+def _list_style(base, level):
+    """Word's built-in list styles go three levels deep ('List Bullet', 'List Bullet 2', ...)."""
+    return base if level <= 0 else f'{base} {min(level, 2) + 1}'
+
+def add_block(doc, block):
+    """Add one Block tuple to a Word document with the enhanced formatting."""
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Pt
+
+    kind = block.kind
+    if kind == HEADING:
+        heading = add_markdown_heading(doc, block.text, block.level)
+        if block.level == 1:
+            heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
+    elif kind == CODE:
+        if add_diagram(doc, block) is not None or add_highlighted_code(doc, block) is not None:
+            return
+        code_para = doc.add_paragraph(block.text)
+        code_para.style = 'No Spacing'
+        for run in code_para.runs:
+            run.font.name = 'Consolas'
+            run.font.size = Pt(9)
+    elif kind == TABLE:
+        add_bulk_table(doc, block.rows, style=TABLE_STYLE)
+        conversion_profile.count('tables')
+    elif kind == RULE:
+        doc.add_paragraph('_' * 50)
+    elif kind == BULLET:
+        add_markdown_paragraph(doc, block.text, style=_list_style('List Bullet', block.level))
+    elif kind == NUMBERED:
+        add_markdown_paragraph(doc, block.text, style=_list_style('List Number', block.level))
+    elif kind == CHECKBOX:
+        checkbox = '☑' if block.checked else '☐'
+        add_markdown_paragraph(doc, f'{checkbox} {block.text}', style=_list_style('List Bullet', block.level))
+    elif kind == PARAGRAPH:
+        # Bold, italic, code and links become merged runs
+        add_markdown_paragraph(doc, block.text)
+    elif kind == BLANK:
+        doc.add_paragraph()
+
+def _section_namespace():
+    """What the Word fragments of the section cache depend on besides the blocks."""
+    modules = ('convert_security_report', 'code_highlight', 'diagrams', 'doc_templates', 'docx_stream', 'docx_tables',
+               'markdown_inline')
+    options = {'font': DEFAULT_FONT_NAME, 'font_size': DEFAULT_FONT_SIZE, 'table_style': TABLE_STYLE,
+               'template': doc_templates.template_identity(), 'diagrams': diagrams.identities()}
+    return section_cache.namespace('docx', modules, options)
+
+def write_blocks_to_word(blocks, docx_file, cache_sections=False):
+    """Write a sequence of Block tuples to a Word document.
+
+    With cache_sections, unchanged sections are copied from the section
+    cache (see section_cache.py) instead of being rendered again.
+    """
+    from docx.oxml.ns import qn
+    
+    # Create Word document from the cached, pre-styled template
+    doc = doc_templates.new_document(DEFAULT_FONT_NAME, DEFAULT_FONT_SIZE)
+    
+    if cache_sections:
+        cache = section_cache.SectionCache(docx_file, _section_namespace())
+        for section in section_cache.split_sections(blocks):
+            key = section_cache.section_key(section)
+            fragment = cache.get(key)
+            if fragment is not None:
+                section_cache.insert_docx(doc, fragment)
+                continue
+            mark = section_cache.mark_docx(doc)
+            for block in section:
+                add_block(doc, block)
+            cache.put(key, section_cache.capture_docx(doc, mark))
+        section_cache.renumber_drawings(doc)
+    else:
+        for block in blocks:
+            add_block(doc, block)
+    if conversion_profile.active():
+        conversion_profile.count('runs', sum(1 for _ in doc.element.body.iter(qn('w:r'))))
+    
+    # Save document
+    with conversion_profile.stage('save'):
+        doc.save(docx_file)
+    if cache_sections:
+        # Only once the document is written, so a failed build never leaves fragments behind
+        cache.save()
+
+@conversion_profile.profiled
 def convert_markdown_to_word_enhanced(md_file, docx_file):
     """Enhanced markdown to Word converter with better formatting."""
     try:
-        # Read markdown file
+        # Stream the markdown file through the shared block lexer
         with open(md_file, 'r', encoding='utf-8') as f:
-            md_content = f.read()
-        
-        # Create Word document
-        doc = Document()
-        
-        # Set default font
-        style = doc.styles['Normal']
-        font = style.font
-        font.name = 'Calibri'
-        font.size = Pt(11)
-        
-        # Process markdown content
-        lines = md_content.split('\n')
-        in_code_block = False
-        code_block_lines = []
-        in_table = False
-        table_rows = []
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            stripped = line.strip()
-            
-            # Skip empty lines at start
-            if not stripped and i == 0:
-                i += 1
-                continue
-            
-            # Code blocks
-            if stripped.startswith('```'):
-                if in_code_block:
-                    # End code block
-                    if code_block_lines:
-                        code_para = doc.add_paragraph('\n'.join(code_block_lines))
-                        code_para.style = 'No Spacing'
-                        for run in code_para.runs:
-                            run.font.name = 'Consolas'
-                            run.font.size = Pt(9)
-                    code_block_lines = []
-                    in_code_block = False
-                else:
-                    in_code_block = True
-                i += 1
-                continue
-            
-            if in_code_block:
-                code_block_lines.append(line)
-                i += 1
-                continue
-            
-            # Tables
-            if '|' in line and stripped.startswith('|'):
-                if not in_table:
-                    in_table = True
-                    table_rows = []
-                table_rows.append([cell.strip() for cell in line.split('|')[1:-1]])
-                i += 1
-                continue
-            else:
-                if in_table and table_rows:
-                    # Create table
-                    table = doc.add_table(rows=len(table_rows), cols=len(table_rows[0]))
-                    table.style = 'Light Grid Accent 1'
-                    for row_idx, row_data in enumerate(table_rows):
-                        for col_idx, cell_data in enumerate(row_data):
-                            table.rows[row_idx].cells[col_idx].text = cell_data
-                    table_rows = []
-                    in_table = False
-            
-            # Headers
-            if stripped.startswith('# '):
-                heading = doc.add_heading(stripped[2:], level=1)
-                heading.alignment = WD_ALIGN_PARAGRAPH.LEFT
-            elif stripped.startswith('## '):
-                doc.add_heading(stripped[3:], level=2)
-            elif stripped.startswith('### '):
-                doc.add_heading(stripped[4:], level=3)
-            elif stripped.startswith('#### '):
-                doc.add_heading(stripped[5:], level=4)
-            elif stripped.startswith('##### '):
-                doc.add_heading(stripped[6:], level=5)
-            # Horizontal rules
-            elif stripped.startswith('---'):
-                doc.add_paragraph('_' * 50)
-            # Lists
-            elif stripped.startswith('- ') or stripped.startswith('* '):
-                para = doc.add_paragraph(stripped[2:], style='List Bullet')
-            elif stripped.startswith('1. ') or any(stripped.startswith(f'{n}. ') for n in range(2, 100)):
-                # Numbered list
-                num_text = stripped.split('. ', 1)
-                if len(num_text) > 1:
-                    para = doc.add_paragraph(num_text[1], style='List Number')
-            # Bold/italic text (simple detection)
-            elif '**' in stripped or '__' in stripped:
-                para = doc.add_paragraph()
-                # Simple bold handling
-                parts = stripped.replace('**', '|||').split('|||')
-                for idx, part in enumerate(parts):
-                    run = para.add_run(part)
-                    if idx % 2 == 1:  # Odd indices are bold
-                        run.bold = True
-            # Checkboxes
-            elif stripped.startswith('- [ ]') or stripped.startswith('- [x]'):
-                checkbox_text = stripped[5:].strip()
-                checkbox = '☐' if '[ ]' in stripped else '☑'
-                doc.add_paragraph(f'{checkbox} {checkbox_text}', style='List Bullet')
-            # Regular text
-            elif stripped:
-                doc.add_paragraph(stripped)
-            else:
-                # Empty line
-                doc.add_paragraph()
-            
-            i += 1
-        
-        # Save document
-        doc.save(docx_file)
+            lines = conversion_profile.timed_iter(f, 'read', 'lines')
+            write_blocks_to_word(conversion_profile.timed_iter(iter_blocks(lines), 'lex', 'blocks'), docx_file,
+                                 cache_sections=section_cache.enabled(md_file))
         return True
     except Exception as e:
         print(f"Error with Word conversion: {e}")
@@ -176,40 +163,46 @@ def convert_markdown_to_word_enhanced(md_file, docx_file):
         traceback.print_exc()
         return False
 
-def main():
-    """Main conversion function."""
-    base_dir = Path(__file__).parent
-    md_file = base_dir / 'SECURITY_VULNERABILITIES_FIX_REPORT.md'
-    
-    if not md_file.exists():
-        print(f"[ERROR] File not found: {md_file}")
-        print(f"       Please ensure SECURITY_VULNERABILITIES_FIX_REPORT.md exists in the project root.")
-        return
-    
-    print(f"\n[CONVERTING] {md_file.name}")
-    print("=" * 60)
-    
+def convert_ast_to_word_enhanced(ast, docx_file, cache_sections=False):
+    """Write a pandoc JSON AST (see pandoc_ast.py) to Word with the enhanced formatting."""
+    try:
+        write_blocks_to_word(ast_to_blocks(ast), docx_file, cache_sections)
+        return True
+    except Exception as e:
+        print(f"Error with Word conversion: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def convert_report(md_file, manifest, docx_key, pdf_key, force=False):
+    """Convert the report to Word and PDF, skipping outputs the manifest says are current."""
     # Convert to Word
     docx_file = md_file.with_suffix('.docx')
     print(f"\n[1/2] Converting to Word: {docx_file.name}")
     
     success = False
-    if HAS_PYPANDOC:
+    if not force and manifest.is_up_to_date(md_file, docx_file, docx_key):
+        print(f"   [SKIPPED] ✓ Word document is up to date: {docx_file.name}")
+        success = True
+    elif HAS_PYPANDOC:
         print("   -> Using pypandoc (best quality)...")
         success = convert_with_pypandoc(str(md_file), str(docx_file), 'docx')
         if success:
             print(f"   [SUCCESS] ✓ Word document created: {docx_file.name}")
+            manifest.record(md_file, docx_file, docx_key, 'pypandoc')
         else:
             print(f"   [WARNING] Pypandoc failed, trying alternative method...")
             if HAS_DOCX_CONVERSION:
                 success = convert_markdown_to_word_enhanced(str(md_file), str(docx_file))
                 if success and docx_file.exists():
                     print(f"   [SUCCESS] ✓ Word document created (alternative method): {docx_file.name}")
+                    manifest.record(md_file, docx_file, docx_key, 'python-docx')
     elif HAS_DOCX_CONVERSION:
         print("   -> Using python-docx...")
         success = convert_markdown_to_word_enhanced(str(md_file), str(docx_file))
         if success and docx_file.exists():
             print(f"   [SUCCESS] ✓ Word document created: {docx_file.name}")
+            manifest.record(md_file, docx_file, docx_key, 'python-docx')
     else:
         print(f"   [ERROR] No conversion method available.")
         print(f"   [INFO] Install dependencies:")
@@ -220,33 +213,33 @@ def main():
     
     if not success:
         print(f"   [ERROR] Word conversion failed")
+        manifest.forget(docx_file)
         return
     
     # Convert to PDF
     pdf_file = md_file.with_suffix('.pdf')
     print(f"\n[2/2] Converting to PDF: {pdf_file.name}")
     
-    if HAS_PYPANDOC:
-        try:
-            print("   -> Using pypandoc...")
-            pdf_success = convert_with_pypandoc(str(md_file), str(pdf_file), 'pdf')
-            if pdf_success and pdf_file.exists():
-                print(f"   [SUCCESS] ✓ PDF document created: {pdf_file.name}")
-            else:
-                print(f"   [WARNING] PDF conversion failed.")
-                print(f"   [TIP] You can convert the .docx file to PDF manually:")
-                print(f"         1. Open {docx_file.name} in Microsoft Word")
-                print(f"         2. Go to File -> Save As")
-                print(f"         3. Choose PDF format")
-        except Exception as e:
-            print(f"   [WARNING] PDF conversion error: {e}")
-            print(f"   [TIP] Convert the .docx file to PDF manually using Microsoft Word")
+    if not force and manifest.is_up_to_date(md_file, pdf_file, pdf_key):
+        print(f"   [SKIPPED] ✓ PDF document is up to date: {pdf_file.name}")
     else:
-        print(f"   [INFO] PDF conversion requires pypandoc.")
-        print(f"   [TIP] To create PDF:")
-        print(f"         1. Open {docx_file.name} in Microsoft Word")
-        print(f"         2. Go to File -> Save As -> PDF")
-        print(f"   [INFO] Or install pypandoc: pip install pypandoc")
+        # Straight to the fastest engine that works; missing ones are never attempted
+        pdf_backend = None
+        engine = pdf_engines.best_engine()
+        if engine:
+            print(f"   -> Using {engine}...")
+            pdf_backend = pdf_engines.convert(md_file, pdf_file, extra_args=PANDOC_EXTRA_ARGS)
+        
+        if pdf_backend:
+            print(f"   [SUCCESS] ✓ PDF document created ({pdf_backend}): {pdf_file.name}")
+            manifest.record(md_file, pdf_file, pdf_key, pdf_backend)
+        else:
+            manifest.forget(pdf_file)
+            print(f"   [WARNING] PDF conversion failed.")
+            print(f"   [TIP] Install reportlab (pip install reportlab), or convert the .docx file manually:")
+            print(f"         1. Open {docx_file.name} in Microsoft Word")
+            print(f"         2. Go to File -> Save As")
+            print(f"         3. Choose PDF format")
     
     print("\n" + "=" * 60)
     print("[SUCCESS] Conversion complete!")
@@ -256,6 +249,31 @@ def main():
         print(f"         PDF document: {pdf_file}")
     print("\n[NOTE] For best PDF quality, use Microsoft Word's 'Save As PDF' feature")
 
+def main():
+    """Main conversion function. Pass --force to ignore the build manifest."""
+    base_dir = Path(__file__).parent
+    md_file = base_dir / 'SECURITY_VULNERABILITIES_FIX_REPORT.md'
+    
+    if not md_file.exists():
+        print(f"[ERROR] File not found: {md_file}")
+        print(f"       Please ensure SECURITY_VULNERABILITIES_FIX_REPORT.md exists in the project root.")
+        return
+    
+    print(f"\n[CONVERTING] {md_file.name}")
+    print("=" * 60)
+    
+    force = '--force' in sys.argv[1:]
+    manifest = BuildManifest(base_dir / MANIFEST_NAME)
+    # PANDOC_EXTRA_ARGS is what convert_all_docs runs with --toc, so the two share manifest entries
+    docx_key = build_fingerprint('docx', toc=True)
+    pdf_key = build_fingerprint('pdf', toc=True)
+    
+    try:
+        convert_report(md_file, manifest, docx_key, pdf_key, force)
+    finally:
+        manifest.save()
+    conversion_profile.print_report()
+
 if __name__ == '__main__':
     main()
 
@@ -1,56 +1,514 @@
 #!/usr/bin/env python3
 """
-Alternative PDF conversion using python-docx and reportlab (if available).
-This is a fallback if pypandoc PDF conversion fails.
+PDF conversion with reportlab (if available), for when pypandoc PDF
+conversion fails or no LaTeX engine is installed.
+
+markdown_to_pdf_reportlab() renders the Markdown block stream directly to
+PDF flowables. docx_to_pdf_simple() converts an existing Word document
+(paragraph text only). docx_to_pdf_libreoffice() hands a Word document to
+headless LibreOffice, when it is installed (see pdf_engines): to this
+process's long-lived listener when UNO is available (see libreoffice_pool),
+otherwise to a fresh `soffice --convert-to pdf`.
+
+Long documents can be rendered chapter by chapter (write_chapters_to_pdf):
+the source is split before each top-level heading, the chapters are built
+in parallel processes, and pypdf merges them into one PDF with continuous
+page numbers and a single bookmark tree. Each chapter then starts on a new
+page. Diagram fences are drawn as images (see diagrams.py), and code in a
+language Pygments knows is colored (see code_highlight). With the section
+cache (see section_cache.py), unchanged chapters are taken from the
+previous build instead of being rendered again.
 """
 
+import atexit
+import functools
+import io
+import os
 from pathlib import Path
+import shutil
+import subprocess
 import sys
+import tempfile
+
+import backends
+import code_highlight
+import conversion_profile
+import diagrams
+import section_cache
+from markdown_blocks import (
+    BLANK, BULLET, CHECKBOX, CODE, HEADING, NUMBERED, PARAGRAPH, RULE, TABLE, iter_blocks, normalize_table
+)
+from markdown_inline import has_markup, parse_inline, plain_text
+
+# Cached availability probe; reportlab (slow to import) is loaded on first use
+HAS_REPORTLAB = backends.available('reportlab')
+if not HAS_REPORTLAB:
+    print("[INFO] reportlab not available. Install with: pip install reportlab")
+
+HAS_DOCX = backends.available('docx')
+# pypdf merges the chapters rendered in parallel
+HAS_PYPDF = backends.available('pypdf')
+
+# Code lines longer than this wrap instead of running off the page
+CODE_LINE_LENGTH = 95
+# Long tables are emitted in slices (header repeated) so reportlab splits them in linear time
+TABLE_CHUNK_ROWS = 200
+# Sources at least this large are rendered chapter by chapter on all cores
+CHAPTER_SPLIT_BYTES = 256 * 1024
+# '1' renders every document chapter by chapter, '0' never does
+ENV_CHAPTERS = 'CONVERT_PDF_CHAPTERS'
+# Processes one document's chapters may use; convert_all_docs splits the cores between its -j workers
+ENV_CHAPTER_WORKERS = 'CONVERT_PDF_WORKERS'
+
+
+@functools.lru_cache(maxsize=None)
+def _doc_template_class():
+    from reportlab.platypus import SimpleDocTemplate
+
+    class OutlinedDocTemplate(SimpleDocTemplate):
+        """Records every flowable with an `outline` (title, level) attribute as a heading.
+
+        The headings become PDF bookmarks, unless bookmarks is off (a chapter,
+        whose bookmarks are added when it is merged).
+        """
+
+        bookmarks = True
+
+        def afterFlowable(self, flowable):
+            outline = getattr(flowable, 'outline', None)
+            if outline is None:
+                return
+            title, level = outline
+            top = self.frame._y + flowable.height
+            self.headings.append((title, level, self.canv.getPageNumber() - 1, top))
+            if self.bookmarks:
+                self._outline_level = _outline_level(level, self._outline_level)
+                key = f'h{len(self.headings)}'
+                self.canv.bookmarkHorizontal(key, 0, top)
+                self.canv.addOutlineEntry(title, key, level=self._outline_level)
+                self.canv.showOutline()
+
+    return OutlinedDocTemplate
+
+
+def _outline_level(level, previous):
+    """Bookmark depth for a heading level; PDF outlines cannot skip a level (# then ###)."""
+    return min(level - 1, previous + 1)
+
+
+def _page_template(pdf_file):
+    from reportlab.lib.pagesizes import A4
+
+    pdf = _doc_template_class()(
+        str(pdf_file),
+        pagesize=A4,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=18
+    )
+    pdf.headings = []
+    pdf._outline_level = -1
+    return pdf
+
+
+def _draw_page_number(canvas, number):
+    canvas.saveState()
+    canvas.setFont('Helvetica', 8)
+    canvas.setFillGray(0.4)
+    canvas.drawCentredString(canvas._pagesize[0] / 2, 6, str(number))
+    canvas.restoreState()
+
+
+def _number_page(canvas, doc):
+    _draw_page_number(canvas, canvas.getPageNumber())
+
+
+def _title_style(styles):
+    from reportlab.lib import colors
+    from reportlab.lib.styles import ParagraphStyle
+
+    return ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        textColor=colors.HexColor('#1a1a1a'),
+        spaceAfter=12,
+        alignment=1  # Center
+    )
+
 
-try:
-    from docx import Document
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+def _escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def inline_markup(text):
+    """Turn Markdown inline text (see markdown_inline) into reportlab paragraph markup."""
+    if not has_markup(text):
+        return _escape(text)
+    parts = []
+    for run in parse_inline(text):
+        markup = _escape(run.text)
+        if run.code:
+            markup = f'<font face="Courier">{markup}</font>'
+        if run.strike:
+            markup = f'<strike>{markup}</strike>'
+        if run.italic:
+            markup = f'<i>{markup}</i>'
+        if run.bold:
+            markup = f'<b>{markup}</b>'
+        if run.link and not run.link.startswith('#'):
+            # In-page anchors (#section) have no reportlab destination: they stay plain text
+            href = _escape(run.link).replace('"', '&quot;')
+            markup = f'<a href="{href}" color="blue">{markup}</a>'
+        parts.append(markup)
+    return ''.join(parts)
+
+
+@functools.lru_cache(maxsize=None)
+def _pdf_styles():
+    """Stylesheet for the Markdown renderer, built once per process (flowables never modify it)."""
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER, TA_RIGHT
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+    styles = getSampleStyleSheet()
+    cell = ParagraphStyle('TableCell', parent=styles['Normal'], fontSize=9, leading=11)
+    return {
+        'sample': styles,
+        'title': _title_style(styles),
+        'normal': styles['Normal'],
+        'code': ParagraphStyle('CodeBlock', parent=styles['Code'], fontSize=8, leading=10,
+                               backColor=colors.HexColor('#f4f4f4'), borderPadding=4),
+        'cell': {
+            None: cell,
+            'left': cell,
+            'center': ParagraphStyle('TableCellCenter', parent=cell, alignment=TA_CENTER),
+            'right': ParagraphStyle('TableCellRight', parent=cell, alignment=TA_RIGHT),
+        },
+        'list': [ParagraphStyle(f'ListLevel{level}', parent=styles['Normal'],
+                                leftIndent=18 * (level + 1), bulletIndent=18 * level + 6)
+                 for level in range(3)],
+    }
+
+
+def _table_flowables(rows, styles, width):
+    """Render table rows as one or more reportlab Tables with a repeated header."""
+    from reportlab.lib import colors
     from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+
+    rows, alignments = normalize_table(rows)
+    if not rows or not rows[0]:
+        return []
+    cell_styles = styles['cell']
+    data = [[Paragraph(inline_markup(cell), cell_styles[alignments[col]]) for col, cell in enumerate(row)]
+            for row in rows]
+    header, body = data[0], data[1:] or [[''] * len(data[0])]
+    col_widths = [width / len(header)] * len(header)
+    table_style = TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#4f81bd')),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#dbe5f1')),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ])
+    flowables = []
+    for start in range(0, len(body), TABLE_CHUNK_ROWS):
+        table = Table([header] + body[start:start + TABLE_CHUNK_ROWS], colWidths=col_widths, repeatRows=1)
+        table.setStyle(table_style)
+        flowables.append(table)
+    flowables.append(Spacer(1, 0.1*inch))
+    return flowables
+
+
+def write_blocks_to_pdf(blocks, pdf_file, chapter=False):
+    """Render a sequence of markdown_blocks.Block tuples to a PDF in one pass.
+
+    Returns the headings as (title, level, page index, top) tuples. A chapter
+    gets neither page numbers nor bookmarks: merge_chapters adds both.
+    """
     from reportlab.lib import colors
-    HAS_REPORTLAB = True
-except ImportError:
-    HAS_REPORTLAB = False
-    print("[INFO] reportlab not available. Install with: pip install reportlab")
+    from reportlab.lib.units import inch
+    from reportlab.platypus import HRFlowable, Image, Paragraph, Preformatted, Spacer, XPreformatted
+
+    pdf = _page_template(pdf_file)
+    pdf.bookmarks = not chapter
+    styles = _pdf_styles()
+    sample = styles['sample']
+    elements = []
+    numbers = []
+
+    for block in blocks:
+        kind = block.kind
+        if kind not in (NUMBERED, BULLET, CHECKBOX, BLANK):
+            numbers = []
+
+        if kind == HEADING:
+            if block.level == 1:
+                heading = Paragraph(inline_markup(block.text), styles['title'])
+            else:
+                heading = Paragraph(inline_markup(block.text), sample[f'Heading{min(block.level, 6)}'])
+            heading.outline = (plain_text(block.text), block.level)
+            elements.append(heading)
+            elements.append(Spacer(1, 0.2*inch if block.level == 1 else 0.1*inch))
+        elif kind == CODE:
+            image = diagrams.render_block(block)
+            if image is not None:
+                # Shrunk to fit the frame, leaving room below for the spacer
+                width, height = diagrams.display_size(image, pdf.width / inch, pdf.height / inch - 0.2)
+                elements.append(Image(str(image), width=width * inch, height=height * inch))
+            else:
+                markup = code_highlight.reportlab_markup(block.lang, block.text, CODE_LINE_LENGTH)
+                if markup is not None:
+                    elements.append(XPreformatted(markup, styles['code']))
+                else:
+                    elements.append(Preformatted(block.text, styles['code'], maxLineLength=CODE_LINE_LENGTH))
+            elements.append(Spacer(1, 0.1*inch))
+        elif kind == TABLE:
+            elements.extend(_table_flowables(block.rows, styles, pdf.width))
+            conversion_profile.count('tables')
+        elif kind == RULE:
+            elements.append(HRFlowable(width='100%', color=colors.HexColor('#c0c0c0')))
+        elif kind in (BULLET, NUMBERED, CHECKBOX):
+            level = min(block.level, 2)
+            if kind == NUMBERED:
+                # One counter per nesting level, reset when a list ends
+                del numbers[level + 1:]
+                numbers.extend([0] * (level + 1 - len(numbers)))
+                numbers[level] += 1
+                bullet = f'{numbers[level]}.'
+            elif kind == CHECKBOX:
+                bullet = '[x]' if block.checked else '[ ]'
+            else:
+                bullet = '\u2022'
+            elements.append(Paragraph(inline_markup(block.text), styles['list'][level], bulletText=bullet))
+        elif kind == PARAGRAPH:
+            elements.append(Paragraph(inline_markup(block.text), styles['normal']))
+            elements.append(Spacer(1, 0.1*inch))
+        elif kind == BLANK:
+            elements.append(Spacer(1, 0.1*inch))
+
+    conversion_profile.count('flowables', len(elements))
+    with conversion_profile.stage('render'):
+        if chapter:
+            pdf.build(elements)
+        else:
+            pdf.build(elements, onFirstPage=_number_page, onLaterPages=_number_page)
+    return pdf.headings
+
+
+def _chapter_level(blocks):
+    """The highest heading level that occurs more than once: # usually, ## under a single # title."""
+    counts = {}
+    for block in blocks:
+        if block.kind == HEADING:
+            counts[block.level] = counts.get(block.level, 0) + 1
+    return min((level for level, count in counts.items() if count > 1), default=None)
+
+
+def split_chapters(blocks):
+    """Split a list of blocks before each top-level heading; anything before the first stays in chapter one."""
+    level = _chapter_level(blocks)
+    chapters = [[]]
+    content = False
+    for block in blocks:
+        if level and block.kind == HEADING and block.level <= level and content:
+            chapters.append([])
+            content = False
+        chapters[-1].append(block)
+        content = content or block.kind != BLANK
+    return chapters
+
 
+def _render_chapter(blocks, pdf_file):
+    """Render one chapter; returns (headings, page count). Runs in a worker process."""
+    from pypdf import PdfReader
+    from reportlab import rl_config
+
+    # _number_pages decodes every page, and undoing ASCII85 in pure Python is the slow part of that
+    rl_config.useA85 = 0
+    headings = write_blocks_to_pdf(blocks, pdf_file, chapter=True)
+    return headings, len(PdfReader(pdf_file).pages)
+
+
+def _number_pages(pdf_file, first):
+    """Stamp page numbers first, first + 1, ... onto a chapter PDF. Runs in a worker process."""
+    from pypdf import PdfReader, PdfWriter
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen.canvas import Canvas
+
+    writer = PdfWriter(clone_from=str(pdf_file))
+    numbers = io.BytesIO()
+    canvas = Canvas(numbers, pagesize=A4)
+    for number in range(first, first + len(writer.pages)):
+        _draw_page_number(canvas, number)
+        canvas.showPage()
+    canvas.save()
+    for page, stamp in zip(writer.pages, PdfReader(numbers).pages):
+        page.merge_page(stamp)
+        page.compress_content_streams()
+    with open(pdf_file, 'wb') as f:
+        writer.write(f)
+
+
+def merge_chapters(parts, pdf_file):
+    """Merge chapter PDFs, given as (pdf file, headings) in order, into pdf_file.
+
+    The chapters' headings become one bookmark tree, pointing at the right
+    page of the merged document.
+    """
+    from pypdf import PdfWriter
+    from pypdf.generic import Fit
+
+    writer = PdfWriter()
+    parents = []
+    previous = -1
+    for part_file, headings in parts:
+        offset = len(writer.pages)
+        writer.append(str(part_file), import_outline=False)
+        for title, level, page, top in headings:
+            previous = level = _outline_level(level, previous)
+            item = writer.add_outline_item(title, offset + page, parent=parents[level - 1] if level else None,
+                                           fit=Fit.xyz(0, top), is_open=level == 0)
+            del parents[level:]
+            parents.append(item)
+    if parents:
+        writer.page_mode = '/UseOutlines'
+
+    pdf_file = Path(pdf_file)
+    tmp_path = pdf_file.with_name(f'.{pdf_file.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        writer.write(f)
+    os.replace(tmp_path, pdf_file)
+    conversion_profile.count('pages', len(writer.pages))
+
+
+def _section_namespace():
+    """What the chapter PDFs of the section cache depend on besides the blocks."""
+    modules = ('convert_to_pdf', 'code_highlight', 'diagrams', 'markdown_inline')
+    return section_cache.namespace('pdf', modules, {'diagrams': diagrams.identities()})
+
+
+def chapter_workers():
+    """How many processes may render one document's chapters (see CONVERT_PDF_WORKERS).
+
+    Without a setting, a document converted inside a worker process of a
+    pool renders its chapters in that process, so a batch does not start
+    a pool of cpu_count() processes in each of its cpu_count() workers.
+    """
+    try:
+        workers = int(os.environ.get(ENV_CHAPTER_WORKERS, '') or 0)
+    except ValueError:
+        workers = 0
+    if workers >= 1:
+        return workers
+    import multiprocessing
+
+    if multiprocessing.parent_process() is not None:
+        return 1
+    return os.cpu_count() or 1
+
+
+def write_chapters_to_pdf(blocks, pdf_file, workers=None, cache_sections=False):
+    """Render blocks chapter by chapter in parallel processes, then merge them into pdf_file.
+
+    Once every chapter's page count is known, the workers stamp the page
+    numbers too, so only appending the chapters is left to this process.
+    workers defaults to chapter_workers(); with one, the chapters are
+    rendered in this process. With cache_sections, chapters rendered by an earlier build are reused
+    (unnumbered), and only the changed ones are rendered.
+    Falls back to write_blocks_to_pdf for a single chapter, or without pypdf.
+    """
+    blocks = list(blocks)
+    chapters = split_chapters(blocks)
+    if len(chapters) < 2 or not HAS_PYPDF:
+        write_blocks_to_pdf(blocks, pdf_file)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    from contextlib import nullcontext
+    from itertools import accumulate
+
+    cache = section_cache.SectionCache(pdf_file, _section_namespace()) if cache_sections else None
+    keys = [section_cache.section_key(chapter) for chapter in chapters]
+    rendered = [cache.get(key) if cache else None for key in keys]
+    missing = [index for index, fragment in enumerate(rendered) if fragment is None]
+    workers = min(workers or chapter_workers(), len(chapters))
+    conversion_profile.count('chapters', len(chapters))
+    with tempfile.TemporaryDirectory(prefix='pdf-chapters-') as tmp:
+        part_files = [Path(tmp) / f'chapter-{index:04d}.pdf' for index in range(len(chapters))]
+        for part_file, fragment in zip(part_files, rendered):
+            if fragment is not None:
+                part_file.write_bytes(fragment[2])
+        with ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as pool:
+            run = pool.map if pool else map
+            with conversion_profile.stage('chapters'):
+                results = run(_render_chapter, [chapters[index] for index in missing],
+                                   [part_files[index] for index in missing])
+                for index, (headings, pages) in zip(missing, results):
+                    rendered[index] = (headings, pages, part_files[index].read_bytes() if cache else None)
+                    if cache:
+                        cache.put(keys[index], rendered[index])
+            with conversion_profile.stage('numbering'):
+                firsts = accumulate((pages for _, pages, _ in rendered[:-1]), initial=1)
+                list(run(_number_pages, part_files, firsts))
+        with conversion_profile.stage('merge'):
+            merge_chapters(zip(part_files, (headings for headings, _, _ in rendered)), pdf_file)
+    if cache:
+        cache.save()
+
+
+def use_chapters(md_file):
+    """True if md_file should be rendered chapter by chapter (see CHAPTER_SPLIT_BYTES, CONVERT_PDF_CHAPTERS)."""
+    setting = os.environ.get(ENV_CHAPTERS, '').strip()
+    if setting == '0' or not HAS_PYPDF:
+        return False
+    if setting == '1':
+        return True
+    return chapter_workers() > 1 and Path(md_file).stat().st_size >= CHAPTER_SPLIT_BYTES
+
+
+@conversion_profile.profiled
+def markdown_to_pdf_reportlab(md_file, pdf_file):
+    """Convert Markdown straight to PDF with reportlab, without a Word or LaTeX step."""
+    if not HAS_REPORTLAB:
+        return False
+    
+    try:
+        with open(md_file, 'r', encoding='utf-8') as f:
+            lines = conversion_profile.timed_iter(f, 'read', 'lines')
+            blocks = conversion_profile.timed_iter(iter_blocks(lines), 'lex', 'blocks')
+            if use_chapters(md_file):
+                write_chapters_to_pdf(blocks, pdf_file, cache_sections=section_cache.enabled(md_file))
+            else:
+                write_blocks_to_pdf(blocks, pdf_file)
+        return True
+    except Exception as e:
+        print(f"Error converting to PDF: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+@conversion_profile.profiled
 def docx_to_pdf_simple(docx_file, pdf_file):
     """Convert Word document to PDF using reportlab."""
-    if not HAS_REPORTLAB:
+    if not HAS_REPORTLAB or not HAS_DOCX:
         return False
     
     try:
+        from docx import Document
+        from reportlab.lib.units import inch
+        from reportlab.platypus import Paragraph, Spacer
+        
         # Read Word document
-        doc = Document(docx_file)
+        with conversion_profile.stage('read'):
+            doc = Document(docx_file)
         
         # Create PDF
-        pdf = SimpleDocTemplate(
-            str(pdf_file),
-            pagesize=A4,
-            rightMargin=72,
-            leftMargin=72,
-            topMargin=72,
-            bottomMargin=18
-        )
+        pdf = _page_template(pdf_file)
         
         # Container for PDF elements
         elements = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            textColor=colors.HexColor('#1a1a1a'),
-            spaceAfter=12,
-            alignment=1  # Center
-        )
+        styles = _pdf_styles()['sample']
+        title_style = _pdf_styles()['title']
         
         # Process Word document paragraphs
         for para in doc.paragraphs:
@@ -76,7 +534,8 @@ def docx_to_pdf_simple(docx_file, pdf_file):
                 elements.append(Spacer(1, 0.1*inch))
         
         # Build PDF
-        pdf.build(elements)
+        with conversion_profile.stage('render'):
+            pdf.build(elements)
         return True
     except Exception as e:
         print(f"Error converting to PDF: {e}")
@@ -84,17 +543,83 @@ def docx_to_pdf_simple(docx_file, pdf_file):
         traceback.print_exc()
         return False
 
+@functools.lru_cache(maxsize=None)
+def _libreoffice_profile():
+    # A private profile, so a LibreOffice already open on the desktop does not swallow the job
+    profile = tempfile.mkdtemp(prefix='lo-profile-')
+    atexit.register(shutil.rmtree, profile, True)
+    return Path(profile).as_uri()
+
+
+@conversion_profile.profiled
+def docx_to_pdf_libreoffice(docx_file, pdf_file, soffice=None, timeout=None):
+    """Convert a Word document to PDF with headless LibreOffice (soffice)."""
+    import libreoffice_pool
+    import pdf_engines
+
+    pool = None if soffice else libreoffice_pool.shared_pool()
+    if pool is not None:
+        result = pool.convert(docx_file, pdf_file, timeout)
+        if not result['success']:
+            print(f"Error converting to PDF: {result['error']}")
+        return result['success']
+
+    soffice = soffice or pdf_engines.find_soffice()
+    if not soffice:
+        return False
+
+    docx_file, pdf_file = Path(docx_file), Path(pdf_file)
+    out_dir = tempfile.mkdtemp(prefix='lo-out-', dir=pdf_file.parent)
+    command = [soffice, f'-env:UserInstallation={_libreoffice_profile()}', '--headless', '--norestore',
+               '--convert-to', 'pdf', '--outdir', out_dir, str(docx_file)]
+    group = {'start_new_session': True} if os.name == 'posix' else {}
+    try:
+        proc = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, **group)
+        try:
+            _, stderr = proc.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            # soffice runs the real work in a child process (soffice.bin)
+            if os.name == 'posix':
+                os.killpg(proc.pid, 9)
+            else:
+                proc.kill()
+            proc.communicate()
+            print(f"Error converting to PDF: LibreOffice timed out after {timeout}s")
+            return False
+        converted = Path(out_dir) / f'{docx_file.stem}.pdf'
+        if proc.returncode != 0 or not converted.exists():
+            message = stderr.decode('utf-8', 'replace').strip() or f'exit code {proc.returncode}'
+            print(f"Error converting to PDF: LibreOffice failed: {message}")
+            return False
+        os.replace(converted, pdf_file)
+        return True
+    except OSError as e:
+        print(f"Error converting to PDF: {e}")
+        return False
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
 if __name__ == '__main__':
+    md_file = Path('SECURITY_VULNERABILITIES_FIX_REPORT.md')
     docx_file = Path('SECURITY_VULNERABILITIES_FIX_REPORT.docx')
     pdf_file = Path('SECURITY_VULNERABILITIES_FIX_REPORT.pdf')
     
+    if md_file.exists():
+        print(f"[CONVERTING] {md_file.name} -> {pdf_file.name}")
+        if markdown_to_pdf_reportlab(md_file, pdf_file):
+            print(f"[SUCCESS] PDF created: {pdf_file}")
+            sys.exit(0)
+        print(f"[WARNING] Direct conversion failed, trying the Word document...")
+    
     if not docx_file.exists():
         print(f"[ERROR] Word document not found: {docx_file}")
         sys.exit(1)
     
     print(f"[CONVERTING] {docx_file.name} -> {pdf_file.name}")
     
-    if docx_to_pdf_simple(docx_file, pdf_file):
+    # LibreOffice keeps the Word layout; the reportlab fallback only keeps the text
+    if docx_to_pdf_libreoffice(docx_file, pdf_file) or docx_to_pdf_simple(docx_file, pdf_file):
         print(f"[SUCCESS] PDF created: {pdf_file}")
     else:
         print(f"[INFO] For best results, use Microsoft Word:")
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Render diagram fences (```mermaid) to images, with a content-addressed cache.
+
+Every converter used to print diagram sources as Consolas code text. Now a
+fence whose language has a renderer becomes a PNG, embedded in the DOCX
+and PDF outputs; when no renderer is installed, or rendering fails, the
+block stays code text as before.
+
+Renderers are local commands with {input} and {output} placeholders:
+
+    mermaid   mmdc (npm install -g @mermaid-js/mermaid-cli)
+
+Register more with register_renderer(), or override one per language with
+an environment variable, e.g.
+CONVERT_MERMAID_RENDERER="docker run --rm -v /tmp:/tmp minlag/mermaid-cli -i {input} -o {output}".
+
+Rendering is by far the most expensive step per block, so images are
+cached in .conversion-cache/diagrams under a hash of the renderer, the
+language and the diagram source: an unchanged diagram is rendered once,
+whichever converter or output format asks for it. A renderer that
+rejects a diagram is remembered the same way, so a broken diagram is not
+retried until it changes; a timeout or a renderer that cannot be started
+is not cached, and is tried again on the next build. Images
+are also shared through the artifact store, under the same key.
+
+pandoc outputs get the same images through a Lua filter (pandoc_args())
+that looks diagrams up in the cache; prerender() fills the cache for a set
+of sources first, running the renderers in parallel.
+"""
+
+import hashlib
+import os
+import shlex
+import shutil
+import struct
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import artifact_store
+import conversion_profile
+
+CACHE_DIR = Path(__file__).parent / '.conversion-cache' / 'diagrams'
+RENDER_TIMEOUT = 120
+# Renderers draw at this multiple of 96 dpi, so the images stay sharp when printed
+SCALE = 2
+# Widest a diagram is drawn, in inches (the text width of a Letter/A4 page)
+MAX_WIDTH_INCHES = 6.0
+
+# language -> [(name, command)], in order of preference
+_RENDERERS = {}
+_identities = {}
+
+_LUA_FILTER = '''-- Generated by diagrams.py: replaces diagram code blocks with their cached images
+local cache_dir = @CACHE_DIR@
+local renderers = {@RENDERERS@}
+
+local function normalize(text)
+  text = text:gsub('[ \\t]+\\n', '\\n'):gsub('[ \\t]+$', '')
+  return (text:gsub('^\\n+', ''):gsub('\\n+$', ''))
+end
+
+local function CodeBlock(el)
+  for _, class in ipairs(el.classes) do
+    local identity = renderers[class]
+    if identity then
+      local key = pandoc.utils.sha1(identity .. '\\n' .. class .. '\\n' .. normalize(el.text))
+      local path = cache_dir .. '/' .. key .. '.png'
+      local f = io.open(path, 'rb')
+      if f then
+        f:close()
+        return pandoc.Para({pandoc.Image({}, path)})
+      end
+    end
+  end
+end
+
+return {{CodeBlock = CodeBlock}}
+'''
+
+
+def register_renderer(lang, name, command):
+    """Add a renderer for a fence language; command is a list with {input} and {output} placeholders."""
+    _RENDERERS.setdefault(lang, []).append((name, list(command)))
+    _identities.pop(lang, None)
+
+
+register_renderer('mermaid', 'mmdc', ['mmdc', '--quiet', '--input', '{input}', '--output', '{output}',
+                                      '--backgroundColor', 'white', '--scale', str(SCALE)])
+
+
+def _env_var(lang):
+    return f'CONVERT_{lang.upper()}_RENDERER'
+
+
+def renderer(lang):
+    """The (name, command) that renders a language here, or None."""
+    override = os.environ.get(_env_var(lang), '').strip()
+    if override:
+        return _env_var(lang), shlex.split(override)
+    for name, command in _RENDERERS.get(lang, ()):
+        if shutil.which(command[0]):
+            return name, command
+    return None
+
+
+def renderer_identity(lang):
+    """What the cached images of a language depend on: the command and its executable's mtime."""
+    if lang not in _identities:
+        found = renderer(lang)
+        if found is None:
+            _identities[lang] = None
+        else:
+            _, command = found
+            executable = shutil.which(command[0])
+            try:
+                mtime = os.stat(executable).st_mtime_ns if executable else 0
+            except OSError:
+                mtime = 0
+            _identities[lang] = f'{shlex.join(command)}@{mtime}'
+    return _identities[lang]
+
+
+def identities():
+    """{language: renderer identity} for the build fingerprint."""
+    return {lang: renderer_identity(lang) for lang in sorted(_RENDERERS)}
+
+
+def is_diagram(lang):
+    return bool(lang) and lang in _RENDERERS
+
+
+def normalize(source):
+    """Drop the whitespace differences between Markdown readers (pandoc expands tabs, for one)."""
+    lines = [line.expandtabs(4).rstrip(' ') for line in source.split('\n')]
+    return '\n'.join(lines).strip('\n')
+
+
+def cache_key(lang, source):
+    # sha1 rather than the repo's usual sha256: the pandoc Lua filter has to compute the same key
+    identity = renderer_identity(lang)
+    return hashlib.sha1(f'{identity}\n{lang}\n{normalize(source)}'.encode('utf-8')).hexdigest()
+
+
+def render(lang, source):
+    """Path of the PNG for a diagram, rendering it on a cache miss; None if it cannot be rendered."""
+    if not is_diagram(lang) or renderer_identity(lang) is None:
+        return None
+    key = cache_key(lang, source)
+    image = CACHE_DIR / f'{key}.png'
+    if image.exists() or artifact_store.fetch('diagram', key, image):
+        conversion_profile.count('diagram_hits')
+        return image
+    if (CACHE_DIR / f'{key}.failed').exists():
+        return None
+
+    _, command = renderer(lang)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with conversion_profile.stage('diagrams'), tempfile.TemporaryDirectory(prefix='diagram-') as tmp:
+        input_file = Path(tmp) / f'diagram.{lang}'
+        output_file = Path(tmp) / 'diagram.png'
+        input_file.write_text(normalize(source) + '\n', encoding='utf-8')
+        args = [part.replace('{input}', str(input_file)).replace('{output}', str(output_file)) for part in command]
+        try:
+            proc = subprocess.run(args, stdin=subprocess.DEVNULL, capture_output=True, text=True,
+                                  timeout=RENDER_TIMEOUT)
+        # A slow machine or a missing renderer says nothing about the diagram: not cached, tried again next build
+        except subprocess.TimeoutExpired:
+            conversion_profile.count('diagrams_rendered')
+            print(f"   [WARNING] Could not render a {lang} diagram: {command[0]} timed out after {RENDER_TIMEOUT}s")
+            return None
+        except OSError as e:
+            print(f"   [WARNING] Could not render a {lang} diagram: {e}")
+            return None
+        conversion_profile.count('diagrams_rendered')
+        if proc.returncode != 0 or not output_file.exists():
+            error = proc.stderr.strip() or f'{command[0]} exited with code {proc.returncode}'
+            print(f"   [WARNING] Could not render a {lang} diagram: {error.splitlines()[-1]}")
+            (CACHE_DIR / f'{key}.failed').write_text(error, encoding='utf-8')
+            return None
+        # Rename into place, so a concurrent reader never sees half an image
+        os.replace(output_file, image)
+    artifact_store.put('diagram', key, image)
+    return image
+
+
+def render_block(block):
+    """render() for a markdown_blocks CODE Block."""
+    return render(block.lang, block.text) if is_diagram(block.lang) else None
+
+
+def diagram_sources(md_file):
+    """(lang, source) for every diagram fence in a Markdown file."""
+    from markdown_blocks import CODE, iter_blocks
+
+    with open(md_file, 'r', encoding='utf-8') as f:
+        return [(block.lang, block.text) for block in iter_blocks(f) if block.kind == CODE and is_diagram(block.lang)]
+
+
+def prerender(md_files, workers=None):
+    """Render the diagrams of many files in parallel threads (each render is a subprocess)."""
+    if not any(renderer_identity(lang) for lang in _RENDERERS):
+        return
+    diagrams = {}
+    for md_file in md_files:
+        for lang, source in diagram_sources(md_file):
+            diagrams.setdefault(cache_key(lang, source), (lang, source))
+    if diagrams:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            list(pool.map(lambda item: render(*item), diagrams.values()))
+
+
+def image_size(image):
+    """(width, height) in pixels of a PNG, read from its header."""
+    with open(image, 'rb') as f:
+        header = f.read(24)
+    return struct.unpack('>II', header[16:24])
+
+
+def display_size(image, max_width, max_height=None):
+    """Size in inches to draw an image at: its natural size at SCALE * 96 dpi, shrunk to fit."""
+    width, height = image_size(image)
+    width, height = width / (96 * SCALE), height / (96 * SCALE)
+    factor = min(1.0, max_width / width, (max_height / height) if max_height else 1.0)
+    return width * factor, height * factor
+
+
+def pandoc_args():
+    """--lua-filter arguments that swap cached diagram images into pandoc outputs."""
+    renderers = {lang: renderer_identity(lang) for lang in _RENDERERS}
+    renderers = {lang: identity for lang, identity in renderers.items() if identity}
+    if not renderers:
+        return []
+    text = (_LUA_FILTER
+            .replace('@CACHE_DIR@', _lua_string(CACHE_DIR.resolve().as_posix()))
+            .replace('@RENDERERS@', ', '.join(f'[{_lua_string(lang)}] = {_lua_string(identity)}'
+                                               for lang, identity in sorted(renderers.items()))))
+    filter_path = CACHE_DIR / f'filter-{hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]}.lua'
+    if not filter_path.exists():
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = filter_path.with_name(f'{filter_path.name}.{os.getpid()}.tmp')
+        tmp_path.write_text(text, encoding='utf-8')
+        os.replace(tmp_path, filter_path)
+    return ['--lua-filter', str(filter_path)]
+
+
+def _lua_string(value):
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+if __name__ == '__main__':
+    for lang in sorted(_RENDERERS):
+        found = renderer(lang)
+        if found:
+            print(f"[SUCCESS] {lang}: {found[0]} ({shlex.join(found[1])})")
+        else:
+            names = ', '.join(name for name, _ in _RENDERERS[lang])
+            print(f"[SKIPPED] {lang}: no renderer found (tried {names}; or set {_env_var(lang)})")
+    images = list(CACHE_DIR.glob('*.png')) if CACHE_DIR.exists() else []
+    print(f"[INFO] {len(images)} cached diagrams in {CACHE_DIR}")
@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+"""
+Constant-memory Markdown -> Word (.docx) writer.
+
+python-docx keeps the whole document tree in memory until doc.save(), and
+the enhanced converters used to read the whole source first as well. This
+writer writes word/document.xml straight into the zip package as tokens
+arrive from markdown_blocks.tokenize(). Styles and numbering are written
+once, up front, and the relationships (including hyperlink targets) at the
+end. Tables and code blocks are streamed row by row and line by line, so
+peak memory stays flat however large the source is. Alignment rows become
+column alignment and short table rows are padded. Inline formatting is
+rendered by markdown_inline as merged runs. Diagram fences (diagrams.py)
+are held back until they close and written as pictures, with the images
+added to word/media when the package is closed. Fences in a language
+Pygments knows are held back too, and written as colored runs
+(code_highlight), unless they run past MAX_HELD_CODE_LINES.
+
+The output uses the same fonts, styles and table style as
+convert_security_report.convert_markdown_to_word_enhanced.
+"""
+
+import itertools
+import re
+import zipfile
+
+import code_highlight
+import conversion_profile
+import diagrams
+from markdown_blocks import (
+    BLANK, BULLET, CHECKBOX, CODE_LINE, FENCE_CLOSE, FENCE_OPEN, HEADING, NUMBERED, PARAGRAPH, RULE, TABLE_ROW,
+    cell_alignment, is_alignment_row, tokenize,
+)
+from markdown_inline import has_markup, parse_inline
+
+DEFAULT_FONT_NAME = 'Calibri'
+DEFAULT_FONT_SIZE = 11
+CODE_FONT_NAME = 'Consolas'
+CODE_FONT_SIZE = 9
+TABLE_STYLE_ID = 'LightGridAccent1'
+LINK_COLOR = '0563C1'
+# Longer code blocks are streamed as plain text rather than held in memory to highlight
+MAX_HELD_CODE_LINES = 2000
+
+_W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+_R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_WP_NS = 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing'
+_A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+_PIC_NS = 'http://schemas.openxmlformats.org/drawingml/2006/picture'
+EMU_PER_INCH = 914400
+
+# Characters that are not allowed in XML 1.0 documents
+_INVALID_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+_CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Default Extension="png" ContentType="image/png"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>
+<Override PartName="/word/numbering.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.numbering+xml"/>
+<Override PartName="/docProps/core.xml" ContentType="application/vnd.openxmlformats-package.core-properties+xml"/>
+</Types>'''
+
+_PACKAGE_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/package/2006/relationships/metadata/core-properties" Target="docProps/core.xml"/>
+</Relationships>'''
+
+_DOCUMENT_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/numbering" Target="numbering.xml"/>
+{links}</Relationships>'''
+
+_HYPERLINK_REL = (
+    '<Relationship Id="{rid}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink" '
+    'Target="{target}" TargetMode="External"/>\n'
+)
+
+_IMAGE_REL = (
+    '<Relationship Id="{rid}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/image" '
+    'Target="media/{name}"/>\n'
+)
+
+_PICTURE = (
+    '<w:p><w:r><w:drawing><wp:inline distT="0" distB="0" distL="0" distR="0">'
+    '<wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="{id}" name="Diagram {id}"/>'
+    '<wp:cNvGraphicFramePr><a:graphicFrameLocks noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+    '<a:graphic><a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture"><pic:pic>'
+    '<pic:nvPicPr><pic:cNvPr id="{id}" name="{name}"/><pic:cNvPicPr/></pic:nvPicPr>'
+    '<pic:blipFill><a:blip r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+    '<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+    '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></pic:spPr>'
+    '</pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p>'
+)
+
+_CORE_PROPS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" xmlns:dc="http://purl.org/dc/elements/1.1/">
+<dc:title>{title}</dc:title>
+</cp:coreProperties>'''
+
+
+def _heading_style(level, size_half_points):
+    return (
+        f'<w:style w:type="paragraph" w:styleId="Heading{level}">'
+        f'<w:name w:val="heading {level}"/><w:basedOn w:val="Normal"/><w:next w:val="Normal"/><w:qFormat/>'
+        f'<w:pPr><w:keepNext/><w:spacing w:before="{360 if level == 1 else 200}" w:after="0"/>'
+        f'<w:outlineLvl w:val="{level - 1}"/></w:pPr>'
+        f'<w:rPr><w:b/><w:color w:val="{"365F91" if level == 1 else "4F81BD"}"/>'
+        f'<w:sz w:val="{size_half_points}"/></w:rPr></w:style>'
+    )
+
+
+def _list_style(style_id, name, num_id, ilvl):
+    return (
+        f'<w:style w:type="paragraph" w:styleId="{style_id}"><w:name w:val="{name}"/>'
+        f'<w:basedOn w:val="Normal"/><w:pPr><w:numPr><w:ilvl w:val="{ilvl}"/><w:numId w:val="{num_id}"/></w:numPr>'
+        f'<w:ind w:left="{360 * (ilvl + 1)}" w:hanging="360"/><w:contextualSpacing/></w:pPr></w:style>'
+    )
+
+
+def _styles_xml(font_name, font_size):
+    styles = [
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>',
+        f'<w:styles xmlns:w="{_W_NS}">',
+        f'<w:docDefaults><w:rPrDefault><w:rPr><w:rFonts w:ascii="{font_name}" w:hAnsi="{font_name}" '
+        f'w:eastAsia="{font_name}" w:cs="{font_name}"/><w:sz w:val="{font_size * 2}"/>'
+        f'<w:szCs w:val="{font_size * 2}"/></w:rPr></w:rPrDefault>'
+        '<w:pPrDefault><w:pPr><w:spacing w:after="200" w:line="276" w:lineRule="auto"/></w:pPr></w:pPrDefault>'
+        '</w:docDefaults>',
+        '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/><w:qFormat/></w:style>',
+        '<w:style w:type="paragraph" w:styleId="NoSpacing"><w:name w:val="No Spacing"/><w:basedOn w:val="Normal"/>'
+        '<w:pPr><w:spacing w:after="0" w:line="240" w:lineRule="auto"/></w:pPr></w:style>',
+        '<w:style w:type="paragraph" w:styleId="Title"><w:name w:val="Title"/><w:basedOn w:val="Normal"/>'
+        '<w:next w:val="Normal"/><w:qFormat/><w:rPr><w:color w:val="17365D"/><w:sz w:val="52"/></w:rPr></w:style>',
+    ]
+    for level, size in zip(range(1, 7), (28, 26, 24, 22, 22, 22)):
+        styles.append(_heading_style(level, size))
+    for ilvl in range(3):
+        suffix = f' {ilvl + 1}' if ilvl else ''
+        styles.append(_list_style(f'ListBullet{suffix.strip()}', f'List Bullet{suffix}', 1, ilvl))
+        styles.append(_list_style(f'ListNumber{suffix.strip()}', f'List Number{suffix}', 2, ilvl))
+    border = 'w:val="single" w:sz="8" w:space="0" w:color="4F81BD"'
+    styles.append(
+        '<w:style w:type="table" w:default="1" w:styleId="TableNormal"><w:name w:val="Normal Table"/>'
+        '<w:tblPr><w:tblInd w:w="0" w:type="dxa"/><w:tblCellMar><w:top w:w="0" w:type="dxa"/>'
+        '<w:left w:w="108" w:type="dxa"/><w:bottom w:w="0" w:type="dxa"/><w:right w:w="108" w:type="dxa"/>'
+        '</w:tblCellMar></w:tblPr></w:style>'
+        f'<w:style w:type="table" w:styleId="{TABLE_STYLE_ID}"><w:name w:val="Light Grid Accent 1"/>'
+        '<w:basedOn w:val="TableNormal"/><w:pPr><w:spacing w:after="0" w:line="240" w:lineRule="auto"/></w:pPr>'
+        f'<w:tblPr><w:tblBorders><w:top {border}/><w:left {border}/><w:bottom {border}/><w:right {border}/>'
+        f'<w:insideH {border}/><w:insideV {border}/></w:tblBorders></w:tblPr>'
+        '<w:tblStylePr w:type="firstRow"><w:rPr><w:b/></w:rPr></w:tblStylePr></w:style>'
+    )
+    styles.append('</w:styles>')
+    return ''.join(styles)
+
+
+def _numbering_xml():
+    def levels(fmt):
+        out = []
+        for ilvl in range(3):
+            text = ('•', '◦', '▪')[ilvl] if fmt == 'bullet' else f'%{ilvl + 1}.'
+            out.append(
+                f'<w:lvl w:ilvl="{ilvl}"><w:start w:val="1"/><w:numFmt w:val="{fmt}"/>'
+                f'<w:lvlText w:val="{text}"/><w:lvlJc w:val="left"/>'
+                f'<w:pPr><w:ind w:left="{360 * (ilvl + 1)}" w:hanging="360"/></w:pPr></w:lvl>'
+            )
+        return ''.join(out)
+
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<w:numbering xmlns:w="{_W_NS}">'
+        f'<w:abstractNum w:abstractNumId="0"><w:multiLevelType w:val="hybridMultilevel"/>{levels("bullet")}</w:abstractNum>'
+        f'<w:abstractNum w:abstractNumId="1"><w:multiLevelType w:val="hybridMultilevel"/>{levels("decimal")}</w:abstractNum>'
+        '<w:num w:numId="1"><w:abstractNumId w:val="0"/></w:num>'
+        '<w:num w:numId="2"><w:abstractNumId w:val="1"/></w:num>'
+        '</w:numbering>'
+    )
+
+
+def xml_text(text):
+    """Escape text for a <w:t> element, dropping characters XML cannot carry."""
+    # Same as xml.sax.saxutils.escape, which would import urllib/http/ssl at startup
+    text = _INVALID_XML_RE.sub('', text)
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def xml_attr(text):
+    """Escape text for a double-quoted XML attribute."""
+    return xml_text(text).replace('"', '&quot;')
+
+
+def run_xml(text, bold=False, font=None, size=None, color=None, italic=False, strike=False, underline=False):
+    """Return one <w:r> element."""
+    props = []
+    if font:
+        props.append(f'<w:rFonts w:ascii="{font}" w:hAnsi="{font}" w:cs="{font}"/>')
+    if bold:
+        props.append('<w:b/>')
+    if italic:
+        props.append('<w:i/>')
+    if strike:
+        props.append('<w:strike/>')
+    if color:
+        props.append(f'<w:color w:val="{color}"/>')
+    if size:
+        props.append(f'<w:sz w:val="{size * 2}"/><w:szCs w:val="{size * 2}"/>')
+    if underline:
+        props.append('<w:u w:val="single"/>')
+    rpr = f'<w:rPr>{"".join(props)}</w:rPr>' if props else ''
+    return f'<w:r>{rpr}<w:t xml:space="preserve">{xml_text(text)}</w:t></w:r>'
+
+
+def text_runs_xml(text, bold=False, relate=None):
+    """Runs for a line of Markdown inline text (see markdown_inline).
+
+    bold bolds the whole line. relate(url) returns the relationship id of an
+    external hyperlink; without it, links are styled text.
+    """
+    if not has_markup(text):
+        return run_xml(text, bold=bold) if text else ''
+    parts = []
+    for link, runs in itertools.groupby(parse_inline(text), key=lambda run: run.link):
+        runs = ''.join(
+            run_xml(run.text, bold=bold or run.bold, italic=run.italic, strike=run.strike,
+                    font=CODE_FONT_NAME if run.code else None, color=LINK_COLOR if link else None,
+                    underline=link is not None)
+            for run in runs
+        )
+        rid = relate(link) if link and relate else None
+        parts.append(f'<w:hyperlink r:id="{rid}">{runs}</w:hyperlink>' if rid else runs)
+    return ''.join(parts)
+
+
+def paragraph_xml(runs, style=None):
+    """Return one <w:p> element around pre-rendered runs."""
+    ppr = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ''
+    return f'<w:p>{ppr}{runs}</w:p>'
+
+
+def _list_style_id(base, level):
+    return base if level <= 0 else f'{base}{min(level, 2) + 1}'
+
+
+def table_row_xml(cells, header=False, bold=False, alignments=None, width=None, markdown=True, relate=None):
+    """Return one <w:tr> element.
+
+    header marks the row as a repeating header row, and bold bolds its
+    text explicitly. alignments holds per-column 'left'/'center'/'right'/None.
+    width is the cell width in twips (auto when None). markdown=False writes
+    cell text verbatim instead of applying inline formatting; relate is
+    passed on to text_runs_xml.
+    """
+    row = ['<w:tr>']
+    if header:
+        row.append('<w:trPr><w:tblHeader/></w:trPr>')
+    tc_width = f'<w:tcW w:w="{width}" w:type="dxa"/>' if width else '<w:tcW w:w="0" w:type="auto"/>'
+    for index, cell in enumerate(cells):
+        align = alignments[index] if alignments and index < len(alignments) else None
+        ppr = f'<w:pPr><w:jc w:val="{align}"/></w:pPr>' if align else ''
+        if not cell:
+            runs = ''
+        elif markdown:
+            runs = text_runs_xml(cell, bold=bold, relate=relate)
+        else:
+            runs = run_xml(cell, bold=bold)
+        row.append(f'<w:tc><w:tcPr>{tc_width}</w:tcPr><w:p>{ppr}{runs}</w:p></w:tc>')
+    row.append('</w:tr>')
+    return ''.join(row)
+
+
+def fit_row(cells, column_count):
+    """Pad a row to the table grid, folding any cells past the grid into the last column.
+
+    The grid is fixed by the header before later rows are seen, and Word
+    rejects rows with more cells than grid columns.
+    """
+    if len(cells) > column_count > 0:
+        return cells[:column_count - 1] + [' | '.join(cells[column_count - 1:])]
+    return cells + [''] * (column_count - len(cells))
+
+
+def table_start_xml(column_count):
+    """Open a <w:tbl> with the report table style and an even column grid."""
+    width = 9000 // max(column_count, 1)
+    grid = ''.join(f'<w:gridCol w:w="{width}"/>' for _ in range(column_count))
+    return (
+        f'<w:tbl><w:tblPr><w:tblStyle w:val="{TABLE_STYLE_ID}"/><w:tblW w:w="5000" w:type="pct"/>'
+        f'<w:tblLook w:val="04A0" w:firstRow="1" w:lastRow="0" w:firstColumn="1" w:lastColumn="0" '
+        f'w:noHBand="0" w:noVBand="1"/></w:tblPr><w:tblGrid>{grid}</w:tblGrid>'
+    )
+
+
+class StreamingDocxWriter:
+    """Write a .docx package incrementally.
+
+    Usage:
+        with StreamingDocxWriter('out.docx') as writer:
+            writer.write_tokens(tokenize(lines))
+    """
+
+    def __init__(self, docx_file, title='', font_name=DEFAULT_FONT_NAME, font_size=DEFAULT_FONT_SIZE):
+        self._zip = zipfile.ZipFile(docx_file, 'w', zipfile.ZIP_DEFLATED)
+        self._zip.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        self._zip.writestr('_rels/.rels', _PACKAGE_RELS)
+        self._zip.writestr('word/styles.xml', _styles_xml(font_name, font_size))
+        self._zip.writestr('word/numbering.xml', _numbering_xml())
+        self._zip.writestr('docProps/core.xml', _CORE_PROPS.format(title=xml_text(title)))
+        # force_zip64 lets document.xml grow past 2 GiB without knowing its size up front
+        self._document = self._zip.open('word/document.xml', 'w', force_zip64=True)
+        self._write(
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            f'<w:document xmlns:w="{_W_NS}" xmlns:r="{_R_NS}" xmlns:wp="{_WP_NS}" xmlns:a="{_A_NS}" '
+            f'xmlns:pic="{_PIC_NS}"><w:body>'
+        )
+        self._in_table = False
+        self._table_header = None
+        self._table_columns = 0
+        self._table_alignments = None
+        self._code_started = False
+        self._closed = False
+        # Hyperlink targets -> relationship ids, written to document.xml.rels on close
+        self._links = {}
+        # Diagram or highlighted fence being collected: (lang, lines)
+        self._fence = None
+        # Image paths -> relationship ids, added to word/media on close
+        self._images = {}
+        self._pictures = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write(self, xml):
+        self._document.write(xml.encode('utf-8'))
+
+    def _relate(self, url):
+        rid = self._links.get(url)
+        if rid is None:
+            rid = self._links[url] = f'rId{len(self._links) + 3}'
+        return rid
+
+    def _runs(self, text):
+        return text_runs_xml(text, relate=self._relate)
+
+    def _code_line(self, text):
+        # One paragraph per code block, lines separated by breaks, streamed as they arrive
+        if not self._code_started:
+            self._write('<w:p><w:pPr><w:pStyle w:val="NoSpacing"/></w:pPr>')
+            self._code_started = True
+        else:
+            self._write('<w:r><w:br/></w:r>')
+        self._write(run_xml(text, font=CODE_FONT_NAME, size=CODE_FONT_SIZE))
+
+    def _end_fence(self):
+        """Write the collected fence as a picture, highlighted code, or plain code."""
+        lang, lines = self._fence
+        self._fence = None
+        code = '\n'.join(lines)
+        image = diagrams.render(lang, code)
+        if image is None:
+            runs = code_highlight.docx_runs_xml(lang, code, CODE_FONT_NAME, CODE_FONT_SIZE)
+            if runs:
+                self._write(f'<w:p><w:pPr><w:pStyle w:val="NoSpacing"/></w:pPr>{runs}</w:p>')
+                return
+            for line in lines:
+                self._code_line(line)
+            return
+        rid = self._images.get(image)
+        if rid is None:
+            rid = self._images[image] = f'rIdImage{len(self._images) + 1}'
+        width, height = diagrams.display_size(image, diagrams.MAX_WIDTH_INCHES)
+        self._pictures += 1
+        self._write(_PICTURE.format(cx=round(width * EMU_PER_INCH), cy=round(height * EMU_PER_INCH),
+                                    id=self._pictures, name=xml_attr(image.name), rid=rid))
+
+    def _start_table(self):
+        # The header is held back until the next row shows whether an alignment row follows it
+        header, self._table_header = self._table_header, None
+        self._table_columns = len(header)
+        self._write(table_start_xml(self._table_columns))
+        self._write(table_row_xml(header, header=True, alignments=self._table_alignments, relate=self._relate))
+
+    def _end_table(self):
+        if self._in_table:
+            if self._table_header is not None:
+                self._start_table()
+            self._write('</w:tbl>')
+            self._in_table = False
+            self._table_alignments = None
+
+    def write_xml(self, xml):
+        """Append pre-rendered body XML (paragraphs or tables)."""
+        self._end_table()
+        self._write(xml)
+
+    def write_token(self, token):
+        """Append one markdown_blocks.tokenize() event."""
+        kind = token.kind
+
+        if kind == TABLE_ROW:
+            cells = token.rows
+            if not self._in_table:
+                conversion_profile.count('tables')
+                self._table_header = cells
+                self._in_table = True
+                return
+            if self._table_header is not None:
+                if is_alignment_row(cells):
+                    self._table_alignments = [cell_alignment(cell) for cell in cells]
+                    self._start_table()
+                    return
+                self._start_table()
+            self._write(table_row_xml(fit_row(cells, self._table_columns), alignments=self._table_alignments,
+                                      relate=self._relate))
+            return
+        self._end_table()
+
+        if kind == FENCE_OPEN:
+            self._code_started = False
+            if diagrams.is_diagram(token.lang) or code_highlight.can_highlight(token.lang):
+                self._fence = (token.lang, [])
+        elif kind == CODE_LINE:
+            if self._fence is None:
+                self._code_line(token.text)
+            elif len(self._fence[1]) < MAX_HELD_CODE_LINES:
+                self._fence[1].append(token.text)
+            else:
+                # Too long to hold back: the rest streams as plain code, keeping memory flat
+                lines = self._fence[1]
+                self._fence = None
+                for line in lines + [token.text]:
+                    self._code_line(line)
+        elif kind == FENCE_CLOSE:
+            if self._fence is not None:
+                self._end_fence()
+            if self._code_started:
+                self._write('</w:p>')
+            self._code_started = False
+        elif kind == HEADING:
+            self._write(paragraph_xml(self._runs(token.text), f'Heading{min(token.level, 6)}'))
+        elif kind == RULE:
+            self._write(paragraph_xml(run_xml('_' * 50)))
+        elif kind == BULLET:
+            self._write(paragraph_xml(self._runs(token.text), _list_style_id('ListBullet', token.level)))
+        elif kind == NUMBERED:
+            self._write(paragraph_xml(self._runs(token.text), _list_style_id('ListNumber', token.level)))
+        elif kind == CHECKBOX:
+            checkbox = '☑' if token.checked else '☐'
+            self._write(paragraph_xml(self._runs(f'{checkbox} {token.text}'),
+                                      _list_style_id('ListBullet', token.level)))
+        elif kind == PARAGRAPH:
+            self._write(paragraph_xml(self._runs(token.text)))
+        elif kind == BLANK:
+            self._write('<w:p/>')
+
+    def write_tokens(self, tokens):
+        for token in tokens:
+            self.write_token(token)
+
+    def close(self):
+        """Finish document.xml and the zip package."""
+        if self._closed:
+            return
+        self._end_table()
+        if self._fence is not None:
+            self._end_fence()
+        if self._code_started:
+            self._write('</w:p>')
+        self._write(
+            '<w:sectPr><w:pgSz w:w="12240" w:h="15840"/>'
+            '<w:pgMar w:top="1440" w:right="1440" w:bottom="1440" w:left="1440" '
+            'w:header="720" w:footer="720" w:gutter="0"/></w:sectPr></w:body></w:document>'
+        )
+        self._document.close()
+        links = ''.join(_HYPERLINK_REL.format(rid=rid, target=xml_attr(url)) for url, rid in self._links.items())
+        for image, rid in self._images.items():
+            # PNGs are compressed already
+            self._zip.write(image, f'word/media/{image.name}', compress_type=zipfile.ZIP_STORED)
+            links += _IMAGE_REL.format(rid=rid, name=xml_attr(image.name))
+        self._zip.writestr('word/_rels/document.xml.rels', _DOCUMENT_RELS.format(links=links))
+        self._zip.close()
+        self._closed = True
+
+
+@conversion_profile.profiled
+def convert_markdown_to_word_streaming(md_file, docx_file):
+    """Convert markdown to Word without holding the document in memory."""
+    try:
+        with open(md_file, 'r', encoding='utf-8') as f:
+            lines = conversion_profile.timed_iter(f, 'read', 'lines')
+            with StreamingDocxWriter(docx_file) as writer:
+                writer.write_tokens(conversion_profile.timed_iter(tokenize(lines), 'lex', 'blocks'))
+                with conversion_profile.stage('save'):
+                    writer.close()
+        return True
+    except Exception as e:
+        print(f"Error with streaming Word conversion: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Bulk table and paragraph builders for the python-docx converters.
+
+doc.add_table() followed by table.rows[i].cells[j] for every cell walks the
+table XML again on each access, so large tables cost quadratic time. This
+module builds all row and cell XML in one pass, using the same markup as the
+streaming writer (docx_stream), and appends it to the table in a single parse.
+Alignment rows become column alignment, ragged rows are padded to the widest
+row, and the header row can be bolded.
+
+Paragraphs and headings with inline Markdown (bold, italic, code, links) get
+their runs the same way: one merged run per format change, and real
+hyperlinks, instead of a python-docx add_run() call per fragment.
+
+Diagram fences (see diagrams.py) become pictures, falling back to code text
+when the diagram cannot be rendered. Other code blocks get colored runs
+from code_highlight when their language is known.
+"""
+
+import code_highlight
+import diagrams
+from docx_stream import CODE_FONT_NAME, CODE_FONT_SIZE, table_row_xml, text_runs_xml
+from markdown_blocks import normalize_table
+from markdown_inline import has_markup
+
+_W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+_R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+
+def _relate(doc):
+    """Return a function mapping a URL to the rId of an external hyperlink relationship."""
+    from docx.opc.constants import RELATIONSHIP_TYPE as RT
+
+    part = doc.part
+    return lambda url: part.relate_to(url, RT.HYPERLINK, is_external=True)
+
+
+def add_bulk_table(doc, rows, style=None, bold_header=False):
+    """Append a table with the given rows (lists of cell text) to a python-docx Document.
+
+    Returns the new table, or None when there are no rows to write.
+    """
+    from docx.oxml import parse_xml
+
+    rows, alignments = normalize_table(rows)
+    if not rows or not rows[0]:
+        return None
+
+    table = doc.add_table(rows=0, cols=len(rows[0]))
+    if style:
+        table.style = style
+    width = table._tbl.tblGrid.gridCol_lst[0].w.twips
+    relate = _relate(doc)
+
+    rows_xml = ''.join(
+        table_row_xml(row, header=index == 0, bold=bold_header and index == 0,
+                      alignments=alignments, width=width, relate=relate)
+        for index, row in enumerate(rows)
+    )
+    fragment = parse_xml(f'<w:tbl xmlns:w="{_W_NS}" xmlns:r="{_R_NS}">{rows_xml}</w:tbl>')
+    table._tbl.extend(list(fragment))
+    return table
+
+
+def add_inline_runs(doc, paragraph, text):
+    """Append Markdown inline text to a paragraph as merged runs; returns the paragraph."""
+    from docx.oxml import parse_xml
+
+    runs = text_runs_xml(text, relate=_relate(doc))
+    paragraph._p.extend(list(parse_xml(f'<w:p xmlns:w="{_W_NS}" xmlns:r="{_R_NS}">{runs}</w:p>')))
+    return paragraph
+
+
+def add_markdown_paragraph(doc, text, style=None):
+    """doc.add_paragraph() for Markdown inline text."""
+    if not has_markup(text):
+        return doc.add_paragraph(text, style=style)
+    return add_inline_runs(doc, doc.add_paragraph(style=style), text)
+
+
+def add_markdown_heading(doc, text, level):
+    """doc.add_heading() for Markdown inline text."""
+    if not has_markup(text):
+        return doc.add_heading(text, level=level)
+    return add_inline_runs(doc, doc.add_heading('', level=level), text)
+
+
+def add_diagram(doc, block):
+    """Add a diagram fence as a picture; returns None (add code text instead) if it cannot be rendered."""
+    from docx.shared import Inches
+
+    image = diagrams.render_block(block)
+    if image is None:
+        return None
+    width, _ = diagrams.display_size(image, diagrams.MAX_WIDTH_INCHES)
+    return doc.add_picture(str(image), width=Inches(width))
+
+
+def add_highlighted_code(doc, block, style='No Spacing'):
+    """Add a code block as syntax-colored runs; returns None (add plain code instead) if it cannot be highlighted."""
+    from docx.oxml import parse_xml
+
+    runs = code_highlight.docx_runs_xml(block.lang, block.text, CODE_FONT_NAME, CODE_FONT_SIZE)
+    if not runs:
+        return None
+    paragraph = doc.add_paragraph(style=style)
+    paragraph._p.extend(list(parse_xml(f'<w:p xmlns:w="{_W_NS}" xmlns:r="{_R_NS}">{runs}</w:p>')))
+    return paragraph
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Watch directories for changed Markdown files.
+
+On Linux, InotifyWatcher uses the kernel's inotify interface through ctypes
+(no extra package needed). Everywhere else, or if inotify cannot be set up,
+PollingWatcher compares file modification times. Both expose the same
+wait(timeout) method, which returns the set of .md paths that changed.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+
+# inotify event flags (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Directories never worth watching
+SKIP_DIRS = {'.git', 'node_modules', '.conversion-cache', '__pycache__', 'build', 'dist'}
+
+# Returned in a change set when events were lost and every file must be rechecked
+RESCAN = Path('*')
+
+
+def _is_markdown(path):
+    return path.suffix.lower() == '.md'
+
+
+def _walk_dirs(root, recursive):
+    yield root
+    if not recursive:
+        return
+    for current, dirs, _ in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith('.')]
+        for d in dirs:
+            yield Path(current) / d
+
+
+class PollingWatcher:
+    """Detect changes by comparing modification times and sizes."""
+
+    def __init__(self, directories, recursive=False, interval=0.5):
+        self.directories = [Path(d) for d in directories]
+        self.recursive = recursive
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for root in self.directories:
+            for directory in _walk_dirs(root, self.recursive):
+                try:
+                    entries = list(os.scandir(directory))
+                except OSError:
+                    continue
+                for entry in entries:
+                    if entry.is_file() and entry.name.lower().endswith('.md'):
+                        stat = entry.stat()
+                        snapshot[Path(entry.path).resolve()] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout):
+        """Return the .md files created or modified within timeout seconds (empty set if none)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = {path for path, state in snapshot.items() if self._snapshot.get(path) != state}
+            self._snapshot = snapshot
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify watcher; new subdirectories are watched as they appear."""
+
+    def __init__(self, directories, recursive=False):
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.recursive = recursive
+        self._watches = {}
+        for root in directories:
+            for directory in _walk_dirs(Path(root), recursive):
+                self._add_watch(directory)
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(directory)), _WATCH_MASK)
+        if wd >= 0:
+            self._watches[wd] = Path(directory)
+
+    def _read_events(self):
+        changed = set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                changed.add(RESCAN)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = directory / os.fsdecode(name)
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO) and path.name not in SKIP_DIRS:
+                    for sub in _walk_dirs(path, True):
+                        self._add_watch(sub)
+                    # Files may have landed in the new directory before its watch existed
+                    changed.update(p.resolve() for p in path.rglob('*.md'))
+            elif _is_markdown(path) and mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                changed.add(path.resolve())
+        return changed
+
+    def wait(self, timeout):
+        """Return the .md files written or moved into place within timeout seconds."""
+        deadline = time.monotonic() + timeout
+        changed = set()
+        while not changed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if readable:
+                changed |= self._read_events()
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def make_watcher(directories, recursive=False, poll=False, interval=0.5):
+    """Return an InotifyWatcher where possible, else a PollingWatcher."""
+    if not poll:
+        try:
+            return InotifyWatcher(directories, recursive)
+        except (OSError, AttributeError):
+            # No inotify (non-Linux, or the watch limit is exhausted)
+            pass
+    return PollingWatcher(directories, recursive, interval)
+
+
+def wait_for_changes(watcher, debounce=0.3, timeout=1.0):
+    """Wait up to timeout for a change, then keep collecting until debounce seconds pass quietly."""
+    changed = watcher.wait(timeout)
+    if not changed:
+        return changed
+    while True:
+        more = watcher.wait(debounce)
+        if not more:
+            return changed
+        changed |= more
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+HTML output: one static page per report, with a shared stylesheet and an index.
+
+The pages are written to an html/ folder next to the sources (or to the
+output directory), which makes a bundle that opens in any browser:
+
+    html/index.html    every page in the folder, by title
+    html/style.css     shared by all the pages, including the Pygments colors
+    html/<NAME>.html   one per report
+
+The Markdown is rendered by python-markdown with the same extensions the
+simple Word converter has always run. Headings get the ids pandoc would
+give them (markdown_inline.heading_id), so the anchors from search_index
+work here too, and links to other .md files point to their pages.
+
+Rendered bodies are cached in .conversion-cache/html under a hash of the
+source and the renderer, so a page is re-rendered only when its source
+changes, and the simple Word converter's own render fills the cache.
+"""
+
+import hashlib
+import html
+import json
+import os
+import re
+from pathlib import Path
+
+import backends
+import conversion_profile
+from conversion_manifest import converter_identity
+from markdown_inline import heading_id
+
+CACHE_DIR = Path(__file__).parent / '.conversion-cache' / 'html'
+# Folder the pages go to, next to their sources, when no output directory is given
+HTML_DIR = 'html'
+STYLESHEET = 'style.css'
+INDEX_PAGE = 'index.html'
+EXTENSIONS = ['codehilite', 'fenced_code', 'tables']
+
+_HEADING_TAGS = frozenset(('h1', 'h2', 'h3', 'h4', 'h5', 'h6'))
+_H1_RE = re.compile(r'<h1[^>]*>(.*?)</h1>', re.S)
+_TAG_RE = re.compile(r'<[^>]+>')
+_TITLE_RE = re.compile(r'<title>(.*?)</title>', re.S)
+_LOCAL_MD_LINK_RE = re.compile(r'([^/:#?]+)\.md(#.*)?$', re.I)
+
+_STYLE = '''body {
+  margin: 0;
+  font-family: Calibri, "Segoe UI", Helvetica, Arial, sans-serif;
+  font-size: 11pt;
+  line-height: 1.5;
+  color: #222;
+  background: #fff;
+}
+nav {
+  padding: 0.6em 1.5em;
+  border-bottom: 1px solid #ddd;
+  background: #f7f7f7;
+}
+main {
+  max-width: 52em;
+  margin: 0 auto;
+  padding: 1em 1.5em 3em;
+}
+h1, h2, h3, h4, h5, h6 { line-height: 1.25; }
+a { color: #0563c1; }
+code, pre { font-family: Consolas, "Courier New", monospace; font-size: 10pt; }
+pre { padding: 0.6em 0.8em; overflow-x: auto; background: #f5f5f5; border: 1px solid #e3e3e3; }
+table { border-collapse: collapse; margin: 1em 0; }
+th, td { border: 1px solid #bfbfbf; padding: 0.3em 0.6em; text-align: left; vertical-align: top; }
+th { background: #d9e2f3; }
+ul.pages { list-style: none; padding: 0; }
+ul.pages li { padding: 0.25em 0; }
+ul.pages .file { color: #777; font-size: 9pt; margin-left: 0.5em; }
+'''
+
+_PAGE = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<link rel="stylesheet" href="{stylesheet}">
+</head>
+<body>
+<nav><a href="{index}">All reports</a></nav>
+<main>
+{body}
+</main>
+</body>
+</html>
+'''
+
+
+def _extension():
+    """python-markdown extension that gives headings pandoc's ids and points .md links to their pages."""
+    from markdown.extensions import Extension
+    from markdown.extensions.toc import stashedHTML2text, unescape
+    from markdown.treeprocessors import Treeprocessor
+
+    class Anchors(Treeprocessor):
+        def run(self, root):
+            used = set()
+            for element in root.iter():
+                if element.tag in _HEADING_TAGS and 'id' not in element.attrib:
+                    text = unescape(stashedHTML2text(''.join(element.itertext()), self.md, strip_entities=False))
+                    element.set('id', heading_id(text, used))
+                elif element.tag == 'a':
+                    match = _LOCAL_MD_LINK_RE.match(element.get('href', ''))
+                    if match:
+                        element.set('href', f'{match.group(1)}.html{match.group(2) or ""}')
+
+    class AnchorsExtension(Extension):
+        def extendMarkdown(self, md):
+            # After the inline patterns (20), like the toc extension
+            md.treeprocessors.register(Anchors(md), 'heading_anchors', 5)
+
+    return AnchorsExtension()
+
+
+def _renderer_key():
+    """Everything besides the source that shapes a rendered body: this code and the library versions."""
+    identity = converter_identity(__file__, Path(__file__).with_name('markdown_inline.py'))
+    return json.dumps(identity, sort_keys=True)
+
+
+def render(md_content):
+    """The HTML body for Markdown text, from the cache when this source was rendered before."""
+    key = hashlib.sha256(f'{_renderer_key()}\n{md_content}'.encode('utf-8')).hexdigest()
+    cached = CACHE_DIR / f'{key}.html'
+    try:
+        body = cached.read_text(encoding='utf-8')
+        conversion_profile.count('html_hits')
+        return body
+    except OSError:
+        pass
+
+    import markdown
+
+    with conversion_profile.stage('html'):
+        body = markdown.markdown(md_content, extensions=EXTENSIONS + [_extension()])
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cached.with_name(f'{cached.name}.{os.getpid()}.tmp')
+        tmp_path.write_text(body, encoding='utf-8')
+        os.replace(tmp_path, cached)
+    except OSError:
+        pass
+    return body
+
+
+def stylesheet():
+    """The shared CSS: the page layout, plus the code colors when Pygments is installed."""
+    css = _STYLE
+    if backends.available('pygments'):
+        from pygments.formatters import HtmlFormatter
+
+        import code_highlight
+
+        css += HtmlFormatter(style=code_highlight.STYLE_NAME).get_style_defs('.codehilite') + '\n'
+    return css
+
+
+def _write_if_changed(path, text):
+    """Write text to path atomically, unless it already holds exactly that."""
+    path = Path(path)
+    try:
+        if path.read_text(encoding='utf-8') == text:
+            return
+    except OSError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    tmp_path.write_text(text, encoding='utf-8')
+    os.replace(tmp_path, path)
+
+
+def page_title(body, md_file):
+    """The text of the first level-1 heading, or a title made from the file name."""
+    match = _H1_RE.search(body)
+    if match:
+        title = html.unescape(_TAG_RE.sub('', match.group(1))).strip()
+        if title:
+            return title
+    return Path(md_file).stem.replace('_', ' ').title()
+
+
+@conversion_profile.profiled
+def convert_markdown_to_html(md_file, html_file):
+    """Write md_file as a page of the bundle in html_file's folder, with the shared stylesheet."""
+    try:
+        with conversion_profile.stage('read'), open(md_file, 'r', encoding='utf-8') as f:
+            md_content = f.read()
+        body = render(md_content)
+        with conversion_profile.stage('save'):
+            page = _PAGE.format(title=html.escape(page_title(body, md_file)), stylesheet=STYLESHEET,
+                                index=INDEX_PAGE, body=body)
+            _write_if_changed(html_file, page)
+            _write_if_changed(Path(html_file).parent / STYLESHEET, stylesheet())
+        return True
+    except Exception as e:
+        print(f"Error with HTML conversion: {e}")
+        return False
+
+
+def write_index(directory):
+    """(Re)write index.html, listing every page in directory by title; returns the number of pages."""
+    directory = Path(directory)
+    pages = []
+    for page in directory.glob('*.html'):
+        if page.name == INDEX_PAGE:
+            continue
+        try:
+            with open(page, 'r', encoding='utf-8') as f:
+                match = _TITLE_RE.search(f.read(2048))
+        except (OSError, UnicodeDecodeError):
+            continue
+        title = html.unescape(match.group(1)) if match else page.stem
+        pages.append((title.lower(), title, page.name))
+    items = '\n'.join(
+        f'<li><a href="{html.escape(name)}">{html.escape(title)}</a><span class="file">{html.escape(name)}</span></li>'
+        for _, title, name in sorted(pages)
+    )
+    body = f'<h1>Reports</h1>\n<p>{len(pages)} documents.</p>\n<ul class="pages">\n{items}\n</ul>'
+    _write_if_changed(directory / INDEX_PAGE, _PAGE.format(title='Reports', stylesheet=STYLESHEET,
+                                                           index=INDEX_PAGE, body=body))
+    _write_if_changed(directory / STYLESHEET, stylesheet())
+    return len(pages)
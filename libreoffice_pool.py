@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Pool of long-lived headless LibreOffice processes for DOCX -> PDF.
+
+`soffice --convert-to pdf` starts a whole office suite for every file,
+which costs seconds before any work is done. Here a few soffice processes
+are started once, each listening on its own local socket with its own
+profile, and every conversion is dispatched over the socket (via UNO,
+LibreOffice's Python bridge) to an idle one:
+
+    - at most `size` listeners run; they are started on first use;
+    - a conversion that runs past the timeout kills its listener;
+    - a listener that crashed or was killed is restarted, and the document
+      is retried; a document LibreOffice merely fails to convert is not;
+    - every PDF is written to a temporary name and then renamed, so a
+      crash never leaves a truncated PDF behind.
+
+UNO comes with LibreOffice (python3-uno on Debian/Ubuntu) and must be
+importable by the interpreter running the scripts. Without it,
+convert_to_pdf.docx_to_pdf_libreoffice starts soffice once per file instead.
+
+Usage:
+    python libreoffice_pool.py                    # every *.docx in the project root
+    python libreoffice_pool.py docs report.docx -j 4
+"""
+
+import argparse
+import atexit
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import backends
+
+HAS_UNO = backends.available('uno')
+
+DEFAULT_SIZE = min(4, os.cpu_count() or 1)
+DEFAULT_TIMEOUT = 120
+DEFAULT_RETRIES = 1
+STARTUP_TIMEOUT = 60
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+
+class ListenerCrashed(Exception):
+    """The soffice process died (or was killed) while converting."""
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _property(name, value):
+    from com.sun.star.beans import PropertyValue
+
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+class Listener:
+    """One headless soffice process and the UNO connection to it."""
+
+    def __init__(self, soffice):
+        self.soffice = soffice
+        self.proc = None
+        self.desktop = None
+        self.profile = None
+        self.broken = False
+        self.conversions = 0
+
+    def start(self):
+        """Start soffice and connect to it; on any failure it is stopped and its profile removed."""
+        import uno
+
+        self.profile = tempfile.mkdtemp(prefix='lo-listener-')
+        try:
+            port = _free_port()
+            connection = f'socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext'
+            command = [self.soffice, f'-env:UserInstallation={Path(self.profile).as_uri()}', '--headless',
+                       '--invisible', '--nologo', '--nodefault', '--norestore', '--nolockcheck',
+                       f'--accept={connection}']
+            group = {'start_new_session': True} if os.name == 'posix' else {}
+            self.proc = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                         stderr=subprocess.DEVNULL, **group)
+
+            local = uno.getComponentContext()
+            resolver = local.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver', local)
+            deadline = time.monotonic() + STARTUP_TIMEOUT
+            while True:
+                if self.proc.poll() is not None:
+                    raise ListenerCrashed(f'soffice exited during startup (code {self.proc.returncode})')
+                try:
+                    context = resolver.resolve(f'uno:{connection}')
+                    break
+                except Exception:
+                    # NoConnectException until soffice is listening
+                    if time.monotonic() > deadline:
+                        raise ListenerCrashed(f'soffice did not start listening within {STARTUP_TIMEOUT}s')
+                    time.sleep(0.25)
+            self.desktop = context.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', context)
+        except BaseException:
+            self.stop()
+            raise
+        return self
+
+    def alive(self):
+        return not self.broken and self.proc is not None and self.proc.poll() is None
+
+    def convert(self, docx_file, pdf_file):
+        """Convert one document; raises ListenerCrashed if soffice died meanwhile."""
+        docx_file, pdf_file = Path(docx_file).resolve(), Path(pdf_file).resolve()
+        tmp_file = pdf_file.with_name(f'.{pdf_file.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            document = self.desktop.loadComponentFromURL(
+                docx_file.as_uri(), '_blank', 0, (_property('Hidden', True), _property('ReadOnly', True))
+            )
+            if document is None:
+                raise RuntimeError(f'LibreOffice could not open {docx_file.name}')
+            try:
+                document.storeToURL(tmp_file.as_uri(), (_property('FilterName', 'writer_pdf_Export'),))
+            finally:
+                document.close(True)
+            os.replace(tmp_file, pdf_file)
+        except Exception as e:
+            tmp_file.unlink(missing_ok=True)
+            # A lost connection surfaces as DisposedException, possibly before soffice has fully exited
+            if not self.alive() or 'disposed' in f'{type(e).__name__} {e}'.lower():
+                self.kill()
+                raise ListenerCrashed(f'soffice stopped while converting {docx_file.name}') from e
+            raise
+        self.conversions += 1
+
+    def kill(self):
+        """Kill soffice and its children; any conversion in progress fails with ListenerCrashed."""
+        self.broken = True
+        if self.proc is None or self.proc.poll() is not None:
+            return
+        try:
+            if os.name == 'posix':
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            else:
+                subprocess.run(['taskkill', '/F', '/T', '/PID', str(self.proc.pid)], capture_output=True)
+        except OSError:
+            self.proc.kill()
+
+    def stop(self):
+        self.desktop = None
+        self.kill()
+        if self.proc is not None:
+            self.proc.wait()
+        if self.profile:
+            shutil.rmtree(self.profile, ignore_errors=True)
+            self.profile = None
+
+
+class LibreOfficePool:
+    """Up to `size` listeners shared by any number of threads.
+
+    convert() blocks until a listener is free; convert_many() converts a set
+    of documents on all listeners at once and yields results as they finish.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, soffice=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES):
+        import pdf_engines
+
+        self.size = max(1, size)
+        self.soffice = soffice or pdf_engines.find_soffice()
+        self.timeout = timeout
+        self.retries = retries
+        self.crashes = 0
+        self._idle = []
+        self._started = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def _acquire(self):
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError('LibreOffice pool is closed')
+                if self._idle:
+                    return self._idle.pop()
+                if self._started < self.size:
+                    self._started += 1
+                    break
+                self._condition.wait()
+        try:
+            return Listener(self.soffice).start()
+        except BaseException:
+            with self._condition:
+                self._started -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, listener):
+        with self._condition:
+            if listener.alive() and not self._closed:
+                self._idle.append(listener)
+                listener = None
+            else:
+                self._started -= 1
+            self._condition.notify()
+        if listener is not None:
+            listener.stop()
+
+    def convert(self, docx_file, pdf_file, timeout=None):
+        """Convert one .docx to PDF; returns a result dict like pandoc_jobs.run_job."""
+        timeout = timeout or self.timeout
+        error = None
+        attempts = 0
+        started = time.perf_counter()
+        while attempts <= self.retries:
+            attempts += 1
+            try:
+                listener = self._acquire()
+            except ListenerCrashed as e:
+                error = str(e)
+                continue
+            except Exception as e:
+                # soffice or the UNO bindings could not be started at all: retrying would fail the same way
+                error = f'Could not start LibreOffice: {e or type(e).__name__}'
+                break
+            # A hung conversion cannot be interrupted through UNO: kill the listener instead
+            watchdog = threading.Timer(timeout, listener.kill) if timeout else None
+            if watchdog:
+                watchdog.daemon = True
+                watchdog.start()
+            try:
+                listener.convert(docx_file, pdf_file)
+                error = None
+                break
+            except ListenerCrashed as e:
+                timed_out = watchdog is not None and watchdog.finished.is_set()
+                error = f'LibreOffice timed out after {timeout}s' if timed_out else str(e)
+                self.crashes += 1
+            except Exception as e:
+                # LibreOffice itself rejected the document: retrying would fail the same way
+                error = str(e) or type(e).__name__
+                break
+            finally:
+                if watchdog:
+                    watchdog.cancel()
+                self._release(listener)
+        return {
+            'source': str(docx_file),
+            'format': 'pdf',
+            'output': str(pdf_file),
+            'backend': 'libreoffice',
+            'success': error is None,
+            'seconds': round(time.perf_counter() - started, 3),
+            'attempts': attempts,
+            'error': error,
+        }
+
+    def convert_many(self, pairs):
+        """Convert (docx_file, pdf_file) pairs on every listener, yielding results as they finish."""
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            futures = [executor.submit(self.convert, docx_file, pdf_file) for docx_file, pdf_file in pairs]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+        for listener in idle:
+            listener.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def shared_pool():
+    """This process's pool (one listener), started on first use and closed at exit; None without UNO."""
+    global _shared_pool
+    import pdf_engines
+
+    if not HAS_UNO or not pdf_engines.find_soffice():
+        return None
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = LibreOfficePool(size=1)
+            atexit.register(_shared_pool.close)
+        return _shared_pool
+
+
+def collect_docx_files(inputs):
+    """Expand files and directories into a sorted list of .docx paths (Word lock files excluded)."""
+    found = set()
+    for pattern in inputs:
+        path = Path(pattern)
+        matches = path.glob('*.docx') if path.is_dir() else [path]
+        found.update(match.resolve() for match in matches
+                     if match.is_file() and match.suffix.lower() == '.docx' and not match.name.startswith('~$'))
+    return sorted(found)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert Word documents to PDF with a pool of LibreOffice processes.')
+    parser.add_argument('inputs', nargs='*', help='.docx files or directories (default: the project root)')
+    parser.add_argument('-j', '--jobs', type=int, default=DEFAULT_SIZE, help='LibreOffice processes to run')
+    parser.add_argument('-o', '--output-dir', help='Write the PDFs here instead of next to each document')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help='Seconds before a stuck conversion is killed (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if not HAS_UNO:
+        print("[ERROR] LibreOffice's Python bridge (uno) is not importable. Install python3-uno,")
+        print("        or use: python pdf_engines.py  (falls back to one soffice run per file)")
+        return 1
+    import pdf_engines
+
+    if not pdf_engines.find_soffice():
+        print("[ERROR] LibreOffice (soffice) not found")
+        return 1
+    docx_files = collect_docx_files(args.inputs or [str(Path(__file__).parent)])
+    if not docx_files:
+        print("[ERROR] No Word documents matched the given inputs.")
+        return 1
+    if args.output_dir:
+        Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+
+    pairs = [(docx_file, Path(args.output_dir or docx_file.parent) / f'{docx_file.stem}.pdf')
+             for docx_file in docx_files]
+    print(f"[CONVERTING] {len(pairs)} documents -> pdf using {args.jobs} LibreOffice processes")
+    started = time.perf_counter()
+    failed = 0
+    with LibreOfficePool(size=args.jobs, timeout=args.timeout) as pool:
+        for result in pool.convert_many(pairs):
+            if result['success']:
+                print(f"   [SUCCESS] {Path(result['output']).name} ({result['seconds']:.1f}s)")
+            else:
+                failed += 1
+                print(f"   [FAILED] {Path(result['output']).name} - {result['error']}")
+        crashes = pool.crashes
+    print(f"[DONE] {len(pairs) - failed} converted, {failed} failed, {crashes} listeners replaced "
+          f"in {time.perf_counter() - started:.2f}s")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Block model shared by the Markdown converters.
+
+Both the python-docx writers and the pandoc AST adapter (pandoc_ast.py)
+describe a document as a flat sequence of Block tuples. That way a writer
+does not care whether the structure came from lexing raw Markdown or from a
+cached pandoc parse. Inline formatting stays in Markdown syntax inside
+`text` (for example **bold** or `code`).
+
+tokenize() and iter_blocks() are the streaming Markdown lexer used by every
+python-docx converter.
+"""
+
+import re
+from collections import namedtuple
+
+HEADING = 'heading'          # text, level 1-6
+PARAGRAPH = 'paragraph'      # text
+BULLET = 'bullet'            # text, level (nesting depth, 0 = top)
+NUMBERED = 'numbered'        # text, level
+CHECKBOX = 'checkbox'        # text, checked, level
+CODE = 'code'                # text (lines joined with \n), lang
+TABLE = 'table'              # rows: list of lists of cell text
+RULE = 'rule'
+BLANK = 'blank'
+
+Block = namedtuple('Block', 'kind text level lang rows checked')
+Block.__new__.__defaults__ = ('', 0, None, None, False)
+
+# Line-level events produced by tokenize(); iter_blocks() folds them into the kinds above
+FENCE_OPEN = 'fence_open'    # lang
+FENCE_CLOSE = 'fence_close'
+CODE_LINE = 'code_line'      # text (raw line inside a fence)
+TABLE_ROW = 'table_row'      # text (stripped line), rows=[cells]
+
+_HEADING_RE = re.compile(r'(#{1,6})[ \t]+(.*?)(?:[ \t]+#+)?[ \t]*$')
+_FENCE_RE = re.compile(r'(`{3,}|~{3,})[ \t]*([^`\s]*)')
+_RULE_RE = re.compile(r'(?:(?:-[ \t]*){3,}|(?:\*[ \t]*){3,}|(?:_[ \t]*){3,})$')
+_CHECKBOX_RE = re.compile(r'[-*+][ \t]+\[([ xX])\][ \t]*(.*)')
+_BULLET_RE = re.compile(r'[-*+][ \t]+(.*)')
+_NUMBERED_RE = re.compile(r'\d{1,9}[.)][ \t]+(.*)')
+_ALIGNMENT_CELL_RE = re.compile(r':?-+:?$')
+
+
+def split_table_row(stripped):
+    """Split a '| a | b |' line into stripped cell texts."""
+    inner = stripped[1:] if stripped.startswith('|') else stripped
+    if inner.endswith('|') and not inner.endswith('\\|'):
+        inner = inner[:-1]
+    return [cell.strip() for cell in inner.split('|')]
+
+
+def is_alignment_row(cells):
+    """True for the '|---|:---:|' separator row under a table header."""
+    return bool(cells) and all(_ALIGNMENT_CELL_RE.match(cell.replace(' ', '')) for cell in cells)
+
+
+def cell_alignment(cell):
+    """Return 'left', 'center', 'right' or None for one alignment-row cell."""
+    cell = cell.replace(' ', '')
+    if cell.startswith(':') and cell.endswith(':'):
+        return 'center'
+    if cell.endswith(':'):
+        return 'right'
+    if cell.startswith(':'):
+        return 'left'
+    return None
+
+
+def normalize_table(rows):
+    """Drop the alignment row and pad ragged rows to the widest row.
+
+    Returns (rows, alignments), where alignments has one entry per column
+    (see cell_alignment) and is all None when the table has no alignment row.
+    """
+    alignments = []
+    body = []
+    for index, row in enumerate(rows):
+        if index == 1 and is_alignment_row(row):
+            alignments = [cell_alignment(cell) for cell in row]
+        else:
+            body.append(row)
+    columns = max((len(row) for row in body), default=0)
+    alignments = (alignments + [None] * columns)[:columns]
+    return [row + [''] * (columns - len(row)) for row in body], alignments
+
+
+def tokenize(lines):
+    """Classify Markdown lines into Block events, one per line.
+
+    Accepts any iterable of lines (a file object streams). Each line is
+    dispatched on its first non-blank character to at most a few
+    precompiled patterns, so classification cost does not grow with the
+    size of the document or the list numbers used.
+    """
+    fence = None
+    list_indents = []
+
+    for line in lines:
+        line = line.rstrip('\r\n')
+
+        if fence:
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                fence = None
+                yield Block(FENCE_CLOSE)
+            else:
+                yield Block(CODE_LINE, line)
+            continue
+
+        stripped = line.strip()
+        if not stripped:
+            yield Block(BLANK)
+            continue
+
+        first = stripped[0]
+        expanded = line.expandtabs(4)
+        indent = len(expanded) - len(expanded.lstrip())
+
+        if first in '-*+_' or first.isdigit():
+            if first != '+' and not first.isdigit() and _RULE_RE.match(stripped):
+                list_indents.clear()
+                yield Block(RULE)
+                continue
+
+            match = None
+            if first.isdigit():
+                match = _NUMBERED_RE.match(stripped)
+                kind = NUMBERED
+            elif first != '_':
+                match = _CHECKBOX_RE.match(stripped)
+                kind = CHECKBOX
+                if not match:
+                    match = _BULLET_RE.match(stripped)
+                    kind = BULLET
+
+            if match:
+                # Nesting depth follows the indentation of enclosing list items
+                while list_indents and list_indents[-1] > indent:
+                    list_indents.pop()
+                if not list_indents or list_indents[-1] < indent:
+                    list_indents.append(indent)
+                level = len(list_indents) - 1
+                if kind == CHECKBOX:
+                    yield Block(CHECKBOX, match.group(2).strip(), level=level, checked=match.group(1) != ' ')
+                else:
+                    yield Block(kind, match.group(1), level=level)
+                continue
+
+        if indent == 0:
+            list_indents.clear()
+
+        if first == '#':
+            match = _HEADING_RE.match(stripped)
+            if match:
+                yield Block(HEADING, match.group(2), level=len(match.group(1)))
+                continue
+        elif first in '`~':
+            match = _FENCE_RE.match(stripped)
+            if match:
+                fence = match.group(1)
+                yield Block(FENCE_OPEN, lang=match.group(2) or None)
+                continue
+        elif first == '|':
+            yield Block(TABLE_ROW, stripped, rows=split_table_row(stripped))
+            continue
+
+        yield Block(PARAGRAPH, stripped)
+
+
+def iter_blocks(lines):
+    """Group tokenize() events into whole blocks: fenced code and tables become single Blocks.
+
+    Like tokenize(), this streams: only the current code block or table is
+    held in memory.
+    """
+    code_lines = None
+    code_lang = None
+    table_rows = None
+
+    for index, token in enumerate(tokenize(lines)):
+        kind = token.kind
+
+        if table_rows is not None and kind != TABLE_ROW:
+            yield Block(TABLE, rows=table_rows)
+            table_rows = None
+
+        if kind == CODE_LINE:
+            code_lines.append(token.text)
+        elif kind == FENCE_OPEN:
+            code_lines = []
+            code_lang = token.lang
+        elif kind == FENCE_CLOSE:
+            if code_lines:
+                yield Block(CODE, '\n'.join(code_lines), lang=code_lang)
+            code_lines = None
+        elif kind == TABLE_ROW:
+            if table_rows is None:
+                table_rows = []
+            table_rows.append(token.rows)
+        elif kind == BLANK and index == 0:
+            # Skip an empty first line
+            continue
+        else:
+            yield token
+
+    # Flush blocks still open at the end of the file
+    if table_rows:
+        yield Block(TABLE, rows=table_rows)
+    if code_lines:
+        yield Block(CODE, '\n'.join(code_lines), lang=code_lang)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Single-pass tokenizer for Markdown inline formatting.
+
+parse_inline() turns a line of block text (a heading, paragraph, list item
+or table cell from markdown_blocks) into a list of Run tuples. It handles
+**bold**/__bold__, *italic*/_italic_, ~~strikethrough~~, `code` spans,
+[links](url), <autolinks> and backslash escapes. Adjacent pieces with the
+same formatting are merged, so every writer emits as few runs as possible,
+e.g. `a \\*b\\* c` is one run, not five. Delimiters without a matching
+closer, and intraword underscores (snake_case), stay literal text.
+"""
+
+import re
+from collections import namedtuple
+
+# link is the target URL, or None
+Run = namedtuple('Run', 'text bold italic strike code link')
+
+_ESCAPABLE = frozenset('\\`*_{}[]()#+-.!<>~|')
+_MARKUP_RE = re.compile(r'[*_`\[<~\\]')
+_LINK_RE = re.compile(r'\[((?:[^\[\]\\]|\\.)*)\]\(\s*<?([^\s()<>]*)>?(?:\s+"[^"]*")?\s*\)')
+_AUTOLINK_RE = re.compile(r'<((?:https?|ftp|mailto):[^\s<>]+)>')
+
+
+def has_markup(text):
+    """False when text certainly renders as a single plain run (the common fast path)."""
+    return _MARKUP_RE.search(text) is not None
+
+
+def _append(runs, text, bold, italic, strike, code, link):
+    if not text:
+        return
+    if runs:
+        last = runs[-1]
+        if (last.bold, last.italic, last.strike, last.code, last.link) == (bold, italic, strike, code, link):
+            runs[-1] = last._replace(text=last.text + text)
+            return
+    runs.append(Run(text, bold, italic, strike, code, link))
+
+
+def _parse(text, runs, link=None, bold=False, italic=False, strike=False):
+    # Each open format remembers its delimiter: ** only closes **, __ only closes __
+    open_bold = '**' if bold else None
+    open_italic = '*' if italic else None
+    open_strike = '~~' if strike else None
+    buffer = []
+    i = 0
+    n = len(text)
+
+    def flush():
+        _append(runs, ''.join(buffer), open_bold is not None, open_italic is not None,
+                open_strike is not None, False, link)
+        buffer.clear()
+
+    while i < n:
+        ch = text[i]
+        if ch == '\\' and i + 1 < n and text[i + 1] in _ESCAPABLE:
+            buffer.append(text[i + 1])
+            i += 2
+        elif ch == '`':
+            j = i
+            while j < n and text[j] == '`':
+                j += 1
+            ticks = text[i:j]
+            end = text.find(ticks, j)
+            if end == -1:
+                buffer.append(ticks)
+                i = j
+                continue
+            code = text[j:end]
+            if len(code) > 2 and code[0] == code[-1] == ' ' and code.strip():
+                code = code[1:-1]
+            flush()
+            _append(runs, code, open_bold is not None, open_italic is not None, open_strike is not None,
+                    True, link)
+            i = end + len(ticks)
+        elif ch == '[' and link is None and (match := _LINK_RE.match(text, i)):
+            flush()
+            _parse(match.group(1), runs, match.group(2), open_bold is not None, open_italic is not None,
+                   open_strike is not None)
+            i = match.end()
+        elif ch == '<' and link is None and (match := _AUTOLINK_RE.match(text, i)):
+            flush()
+            _append(runs, match.group(1), open_bold is not None, open_italic is not None,
+                    open_strike is not None, False, match.group(1))
+            i = match.end()
+        elif ch in '*_~':
+            j = i
+            while j < n and text[j] == ch:
+                j += 1
+            count = j - i
+            before = text[i - 1] if i else ' '
+            after = text[j] if j < n else ' '
+            if ch == '_' and before.isalnum() and after.isalnum():
+                buffer.append(text[i:j])
+                i = j
+                continue
+            can_open = not after.isspace()
+            remaining = count
+            if ch == '~':
+                if count == 2 and (open_strike == '~~' or (open_strike is None and can_open
+                                                           and text.find('~~', j) != -1)):
+                    flush()
+                    open_strike = None if open_strike else '~~'
+                    remaining = 0
+            else:
+                double, single = ch * 2, ch
+                if remaining >= 2 and (open_bold == double or (open_bold is None and can_open
+                                                               and text.find(double, j) != -1)):
+                    flush()
+                    open_bold = None if open_bold else double
+                    remaining -= 2
+                if remaining >= 1 and (open_italic == single or (open_italic is None and can_open
+                                                                 and text.find(single, j) != -1)):
+                    flush()
+                    open_italic = None if open_italic else single
+                    remaining -= 1
+            buffer.append(ch * remaining)
+            i = j
+        else:
+            # Copy plain text up to the next character that could start markup
+            match = _MARKUP_RE.search(text, i + 1)
+            end = match.start() if match else n
+            buffer.append(text[i:end])
+            i = end
+    flush()
+
+
+def parse_inline(text):
+    """Split Markdown inline text into a minimal list of Run tuples."""
+    if not has_markup(text):
+        return [Run(text, False, False, False, False, None)] if text else []
+    runs = []
+    _parse(text, runs)
+    return runs
+
+
+def plain_text(text):
+    """The text of a line with all inline markup removed."""
+    if not has_markup(text):
+        return text
+    return ''.join(run.text for run in parse_inline(text))
+
+
+def heading_id(text, used=None):
+    """The anchor pandoc's auto_identifiers give a heading; pass the same `used` set for every heading of a document.
+
+    Formatting is dropped, only letters, digits, '_', '-' and '.' are kept,
+    words are joined with '-', and the id starts at the first letter
+    ('section' if none is left). Repeated ids get -1, -2, ... appended.
+    """
+    kept = ''.join(c for c in plain_text(text) if c.isalnum() or c in '_-. \t')
+    ident = '-'.join(kept.split()).lower()
+    ident = ident[next((i for i, c in enumerate(ident) if c.isalpha()), len(ident)):] or 'section'
+    if used is not None:
+        unique, number = ident, 0
+        while unique in used:
+            number += 1
+            unique = f'{ident}-{number}'
+        used.add(unique)
+        ident = unique
+    return ident
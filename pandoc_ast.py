@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Cached pandoc JSON AST as the shared intermediate for every output format.
+
+pandoc parses each Markdown source once into its JSON AST, which is cached
+on disk under .conversion-cache/ast/ keyed by the source hash and the pandoc
+version. Every output format is rendered from the cached AST, so .docx and
+.pdf no longer parse the source twice. ast_to_blocks() turns the AST into
+markdown_blocks.Block tuples for the pure-Python (python-docx) writers.
+Parsed ASTs are shared through the artifact store as well, so another
+checkout with the same source and pandoc version does not parse it again.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+
+import artifact_store
+import backends
+import conversion_profile
+import diagrams
+import doc_templates
+from markdown_blocks import BLANK, BULLET, CHECKBOX, CODE, HEADING, NUMBERED, PARAGRAPH, RULE, TABLE, Block
+
+AST_CACHE_DIR = Path(__file__).parent / '.conversion-cache' / 'ast'
+
+# Task-list markers pandoc puts at the start of list items
+_UNCHECKED = '☐'
+_CHECKED = '☒'
+
+# Literal characters that markdown_inline would otherwise read as formatting
+_INLINE_SPECIAL_RE = re.compile(r'([\\`*_\[\]<~])')
+
+
+def _pypandoc():
+    import pypandoc
+    return pypandoc
+
+
+def ast_cache_path(md_file, pandoc_version=None, cache_dir=None):
+    """Return the cache file for a source's AST under the given pandoc version."""
+    digest = hashlib.sha256()
+    with open(md_file, 'rb') as f:
+        digest.update(f.read())
+    digest.update(str(pandoc_version or backends.pandoc_version()).encode('utf-8'))
+    return Path(cache_dir or AST_CACHE_DIR) / f'{digest.hexdigest()}.json'
+
+
+def _write_atomic(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def restore_ast(cache_path):
+    """True if an AST cache file exists, copying it from the artifact store when only the store has it."""
+    cache_path = Path(cache_path)
+    # The cache file name is already a hash of the source and the pandoc version
+    return cache_path.exists() or artifact_store.fetch('ast', cache_path.stem, cache_path)
+
+
+def store_ast(cache_path):
+    """Add a freshly parsed AST to the artifact store."""
+    artifact_store.put('ast', Path(cache_path).stem, cache_path)
+
+
+def load_ast(md_file, cache_dir=None):
+    """Return the pandoc AST for a Markdown file, parsing it only on a cache miss."""
+    with conversion_profile.stage('read'):
+        cache_path = ast_cache_path(md_file, cache_dir=cache_dir)
+        if restore_ast(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+    with conversion_profile.stage('pandoc'):
+        ast_json = _pypandoc().convert_file(str(md_file), 'json', format='markdown')
+    _write_atomic(cache_path, ast_json)
+    store_ast(cache_path)
+    return json.loads(ast_json)
+
+
+def cached_ast(md_file, cache_dir=None):
+    """Return the cached AST for a file if one exists, without ever running pandoc."""
+    try:
+        cache_path = ast_cache_path(md_file, cache_dir=cache_dir)
+    except Exception:
+        return None
+    if not restore_ast(cache_path):
+        return None
+    with open(cache_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def render_ast(ast, output_file, format_type, extra_args=None, resource_dir=None):
+    """Render a parsed AST to one output format with pandoc."""
+    extra_args = list(extra_args or ['--standalone']) + doc_templates.pandoc_args(format_type)
+    diagram_args = diagrams.pandoc_args()
+    if diagram_args:
+        # The filter only swaps in diagrams that are already in the cache
+        for lang, source in _diagram_sources(ast['blocks']):
+            diagrams.render(lang, source)
+        extra_args += diagram_args
+    if resource_dir:
+        # Relative image paths resolve against the original source directory
+        extra_args.append(f'--resource-path={resource_dir}')
+    with conversion_profile.stage('pandoc'):
+        _pypandoc().convert_text(
+            json.dumps(ast),
+            format_type,
+            format='json',
+            outputfile=str(output_file),
+            extra_args=extra_args,
+        )
+
+
+def _diagram_sources(value):
+    """(lang, source) for every diagram CodeBlock anywhere in a piece of the AST."""
+    if isinstance(value, list):
+        for item in value:
+            yield from _diagram_sources(item)
+    elif isinstance(value, dict):
+        if value.get('t') == 'CodeBlock':
+            lang = next((name for name in value['c'][0][1] if diagrams.is_diagram(name)), None)
+            if lang:
+                yield lang, value['c'][1]
+        elif isinstance(value.get('c'), list):
+            yield from _diagram_sources(value['c'])
+
+
+def convert_with_ast(md_file, outputs, extra_args=None, cache_dir=None):
+    """Parse md_file once (or reuse the cache) and render every (output_file, format_type) pair.
+
+    Returns a dict mapping output paths to True/False.
+    """
+    ast = load_ast(md_file, cache_dir=cache_dir)
+    results = {}
+    for output_file, format_type in outputs:
+        try:
+            render_ast(ast, output_file, format_type, extra_args, resource_dir=Path(md_file).parent)
+            results[str(output_file)] = True
+        except Exception as e:
+            print(f"Error rendering {Path(output_file).name} from pandoc AST: {e}")
+            results[str(output_file)] = False
+    return results
+
+
+def inlines_to_text(inlines):
+    """Flatten pandoc inlines back to Markdown-style inline text."""
+    parts = []
+    for inline in inlines:
+        kind = inline['t']
+        content = inline.get('c')
+        if kind == 'Str':
+            parts.append(_INLINE_SPECIAL_RE.sub(r'\\\1', content))
+        elif kind in ('Space', 'SoftBreak', 'LineBreak'):
+            parts.append(' ')
+        elif kind == 'Strong':
+            parts.append(f'**{inlines_to_text(content)}**')
+        elif kind == 'Emph':
+            parts.append(f'*{inlines_to_text(content)}*')
+        elif kind == 'Strikeout':
+            parts.append(f'~~{inlines_to_text(content)}~~')
+        elif kind == 'Code':
+            ticks = '`' * (max(map(len, re.findall('`+', content[1])), default=0) + 1)
+            code = f' {content[1]} ' if content[1].startswith('`') or content[1].endswith('`') else content[1]
+            parts.append(f'{ticks}{code}{ticks}')
+        elif kind == 'Link':
+            parts.append(f'[{inlines_to_text(content[1])}]({content[2][0]})')
+        elif kind == 'Image':
+            parts.append(inlines_to_text(content[1]))
+        elif kind == 'Quoted':
+            quote = '"' if content[0]['t'] == 'DoubleQuote' else "'"
+            parts.append(f'{quote}{inlines_to_text(content[1])}{quote}')
+        elif kind in ('Math', 'RawInline'):
+            parts.append(_INLINE_SPECIAL_RE.sub(r'\\\1', content[1]))
+        elif kind in ('Span', 'Cite'):
+            parts.append(inlines_to_text(content[1]))
+        elif kind in ('Underline', 'SmallCaps', 'Superscript', 'Subscript'):
+            parts.append(inlines_to_text(content))
+        # Notes have no inline representation in the block model
+    return ''.join(parts)
+
+
+def _first_text(blocks):
+    for block in blocks:
+        if block['t'] in ('Plain', 'Para'):
+            return inlines_to_text(block['c'])
+    return ''
+
+
+def _list_item_blocks(item, kind, level):
+    """Yield the Block for one list item followed by any nested content."""
+    text = _first_text(item)
+    if kind == BULLET and text[:1] in (_UNCHECKED, _CHECKED):
+        yield Block(CHECKBOX, text[1:].strip(), level=level, checked=text[0] == _CHECKED)
+    else:
+        yield Block(kind, text, level=level)
+
+    seen_first = False
+    for block in item:
+        if not seen_first and block['t'] in ('Plain', 'Para'):
+            seen_first = True
+            continue
+        yield from _blocks(block, level + 1)
+
+
+def _table_rows(content):
+    """Extract header and body rows as lists of cell text (pandoc >= 2.10 table layout)."""
+    _, _, _, head, bodies, foot = content
+    rows = []
+
+    def add_rows(raw_rows):
+        for row in raw_rows:
+            rows.append([_first_text(cell[4]) for cell in row[1]])
+
+    add_rows(head[1])
+    for body in bodies:
+        add_rows(body[2])
+        add_rows(body[3])
+    add_rows(foot[1])
+    return rows
+
+
+def _blocks(block, level=0):
+    kind = block['t']
+    content = block.get('c')
+    if kind == 'Header':
+        yield Block(HEADING, inlines_to_text(content[2]), level=content[0])
+    elif kind in ('Para', 'Plain'):
+        yield Block(PARAGRAPH, inlines_to_text(content))
+    elif kind == 'LineBlock':
+        for line in content:
+            yield Block(PARAGRAPH, inlines_to_text(line))
+    elif kind == 'CodeBlock':
+        classes = content[0][1]
+        yield Block(CODE, content[1], lang=classes[0] if classes else None)
+    elif kind == 'BulletList':
+        for item in content:
+            yield from _list_item_blocks(item, BULLET, level)
+    elif kind == 'OrderedList':
+        for item in content[1]:
+            yield from _list_item_blocks(item, NUMBERED, level)
+    elif kind == 'Table':
+        rows = _table_rows(content)
+        if rows:
+            yield Block(TABLE, rows=rows)
+    elif kind == 'HorizontalRule':
+        yield Block(RULE)
+    elif kind == 'BlockQuote':
+        for child in content:
+            yield from _blocks(child, level)
+    elif kind == 'Div':
+        for child in content[1]:
+            yield from _blocks(child, level)
+    elif kind == 'DefinitionList':
+        for term, definitions in content:
+            yield Block(PARAGRAPH, f'**{inlines_to_text(term)}**')
+            for definition in definitions:
+                for child in definition:
+                    yield from _blocks(child, level)
+    elif kind == 'Figure':
+        for child in content[2]:
+            yield from _blocks(child, level)
+    # RawBlock and Null have no portable representation
+
+
+def ast_to_blocks(ast):
+    """Turn a pandoc JSON AST into a sequence of markdown_blocks.Block tuples."""
+    for index, block in enumerate(ast.get('blocks', [])):
+        if index:
+            # Keep the blank line the Markdown lexer sees between top-level blocks
+            yield Block(BLANK)
+        yield from _blocks(block)
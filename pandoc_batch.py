@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Convert many Markdown files with a single pandoc process.
+
+pypandoc starts a fresh pandoc for every file and every output format. This
+module instead starts pandoc once per batch and drives it from a Lua filter.
+The filter reads each source once with pandoc.read, or loads its cached JSON
+AST from pandoc_ast, and writes every requested format from that one parsed
+document with pandoc.write. PDF jobs get
+standalone LaTeX, which the filter passes to the PDF engine with pandoc.pipe.
+Every file gets its own success or error status. Diagram fences already in
+the diagrams.py cache are swapped for their images.
+
+The timeout applies to each job on its own, as with pandoc_jobs: pandoc is
+watched while it runs, and when one job takes too long pandoc and its PDF
+engine are killed, that file is reported as timed out, and a fresh pandoc
+carries on with the jobs that were not reached.
+
+Requires pandoc 2.17 or newer (pandoc.write in Lua filters).
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import backends
+import diagrams
+import pandoc_ast
+from pandoc_jobs import kill_tree
+
+MIN_PANDOC_VERSION = (2, 17)
+# How often a running batch is checked for new results and for a job that ran out of time
+POLL_INTERVAL = 0.05
+
+_BATCH_FILTER = r'''
+-- Batch converter: jobs are "source<TAB>format<TAB>output<TAB>ast_cache" lines,
+-- results are "OK|ERR<TAB>output<TAB>message" lines, timed by the caller as they arrive.
+local jobs_path = @JOBS_PATH@
+local results_path = @RESULTS_PATH@
+local toc = @TOC@
+local pdf_engine = @PDF_ENGINE@
+local reference_doc = @REFERENCE_DOC@
+local diagrams_filter = @DIAGRAMS_FILTER@
+
+local function fail_message(err)
+  return (tostring(err):gsub('[\t\r\n]+', ' '))
+end
+
+local function read_file(path)
+  local f = assert(io.open(path, 'rb'))
+  local text = f:read('a')
+  f:close()
+  return text
+end
+
+local function write_file(path, data)
+  local f = assert(io.open(path, 'wb'))
+  f:write(data)
+  f:close()
+end
+
+local templates = {}
+
+local function writer_options(format)
+  -- A template makes the output standalone; binary formats have none and are always complete
+  if templates[format] == nil then
+    local ok, template = pcall(function()
+      return pandoc.template.compile(pandoc.template.default(format))
+    end)
+    templates[format] = ok and template or false
+  end
+  local options = {table_of_contents = toc, template = templates[format] or nil}
+  if format == 'docx' and reference_doc ~= '' then
+    options.reference_doc = reference_doc
+  end
+  return options
+end
+
+local function write_pdf(doc, output)
+  local tex = output:gsub('%.pdf$', '') .. '.tex'
+  local dir = pandoc.path.directory(output)
+  write_file(tex, pandoc.write(doc, 'latex', writer_options('latex')))
+  local args = {'-interaction=nonstopmode', '-halt-on-error', '-output-directory', dir, tex}
+  local ok, err = pcall(function()
+    pandoc.pipe(pdf_engine, args, '')
+    if toc then
+      pandoc.pipe(pdf_engine, args, '')
+    end
+  end)
+  local stem = tex:gsub('%.tex$', '')
+  for _, ext in ipairs({'.tex', '.aux', '.log', '.out', '.toc'}) do
+    os.remove(stem .. ext)
+  end
+  if not ok then error(err) end
+end
+
+local function load_doc(source, ast_path)
+  -- Reuse the cached JSON AST (see pandoc_ast.py) and populate it on a miss
+  if ast_path ~= '' then
+    local f = io.open(ast_path, 'rb')
+    if f then
+      local text = f:read('a')
+      f:close()
+      return pandoc.read(text, 'json')
+    end
+  end
+  local doc = pandoc.read(read_file(source), 'markdown')
+  if ast_path ~= '' then
+    local tmp = ast_path .. '.tmp'
+    pcall(function()
+      write_file(tmp, pandoc.write(doc, 'json'))
+      assert(os.rename(tmp, ast_path))
+    end)
+    os.remove(tmp)
+  end
+  return doc
+end
+
+local function prepare(doc, source)
+  -- Applied after load_doc, so the AST cache keeps the diagram sources and relative paths
+  -- Images are found next to their source, like --resource-path=<source dir> in pandoc_jobs
+  local dir = pandoc.path.directory(source)
+  doc = doc:walk({
+    Image = function(img)
+      if not pandoc.path.is_absolute(img.src) and not img.src:match('^%a[%w+.-]+:') then
+        img.src = pandoc.path.join({dir, img.src})
+        return img
+      end
+    end,
+  })
+  if diagrams_filter ~= '' then
+    doc = doc:walk(dofile(diagrams_filter)[1])
+  end
+  return doc
+end
+
+local function convert(doc, format, output)
+  if format == 'pdf' then
+    write_pdf(doc, output)
+  else
+    write_file(output, pandoc.write(doc, format, writer_options(format)))
+  end
+end
+
+function Pandoc(_)
+  -- Pandoc() runs once, on the empty document passed on stdin
+  local jobs, order = {}, {}
+  for line in io.lines(jobs_path) do
+    local source, format, output, ast_path = line:match('^(.-)\t(.-)\t(.-)\t(.-)$')
+    if source then
+      if not jobs[source] then
+        jobs[source] = {ast_path = ast_path}
+        table.insert(order, source)
+      end
+      table.insert(jobs[source], {format = format, output = output})
+    end
+  end
+
+  local results = assert(io.open(results_path, 'w'))
+  for _, source in ipairs(order) do
+    local ok, doc = pcall(function() return prepare(load_doc(source, jobs[source].ast_path), source) end)
+    for _, job in ipairs(jobs[source]) do
+      local status, err = ok, doc
+      if ok then
+        status, err = pcall(convert, doc, job.format, job.output)
+      end
+      if status then
+        results:write('OK\t', job.output, '\t\n')
+      else
+        results:write('ERR\t', job.output, '\t', fail_message(err), '\n')
+      end
+      results:flush()
+    end
+  end
+  results:close()
+  return pandoc.Pandoc({})
+end
+'''
+
+_version_cache = {}
+
+
+def find_pandoc():
+    """Return the pandoc executable path, or None if pandoc is not installed."""
+    path = shutil.which('pandoc')
+    if path:
+        return path
+    try:
+        import pypandoc
+        return pypandoc.get_pandoc_path()
+    except Exception:
+        return None
+
+
+def pandoc_version(pandoc_path):
+    """Return pandoc's version as a tuple of ints, cached per executable."""
+    if pandoc_path not in _version_cache:
+        version = None
+        probed = backends.probe()['pandoc']
+        try:
+            if probed['path'] and pandoc_path == probed['path']:
+                # The pandoc on PATH was already probed (and cached across runs) by backends
+                output = f"pandoc {probed['version']}"
+            else:
+                output = subprocess.run([pandoc_path, '--version'], capture_output=True, text=True, timeout=30).stdout
+            match = re.search(r'pandoc(?:\.exe)?\s+(\d+(?:\.\d+)*)', output)
+            if match:
+                version = tuple(int(part) for part in match.group(1).split('.'))
+        except (OSError, subprocess.SubprocessError):
+            version = None
+        _version_cache[pandoc_path] = version
+    return _version_cache[pandoc_path]
+
+
+def is_available(pandoc_path=None):
+    """True if a pandoc new enough for batch conversion is installed."""
+    pandoc_path = pandoc_path or find_pandoc()
+    if not pandoc_path:
+        return False
+    version = pandoc_version(pandoc_path)
+    return bool(version) and version >= MIN_PANDOC_VERSION
+
+
+def convert_batch(jobs, toc=False, pdf_engine='pdflatex', pandoc_path=None, timeout=None,
+                  ast_cache_dir=None, reference_doc=None):
+    """Convert (source, output, format) jobs in one pandoc run.
+
+    Returns a dict mapping each output path (as str) to a dict with
+    'success', 'seconds' and 'error'. Jobs for the same source share a
+    single parse, whatever order they are given in. With ast_cache_dir,
+    sources are read from (and parsed into) the pandoc_ast JSON cache.
+    reference_doc styles the .docx outputs like pandoc's --reference-doc.
+    """
+    jobs = [(str(Path(source).resolve()), str(Path(output).resolve()), format_type)
+            for source, output, format_type in jobs]
+    results = {}
+    if not jobs:
+        return results
+
+    pandoc_path = pandoc_path or find_pandoc()
+    if not is_available(pandoc_path):
+        for _, output, _ in jobs:
+            results[output] = {'success': False, 'seconds': 0.0,
+                               'error': f'pandoc >= {".".join(map(str, MIN_PANDOC_VERSION))} not found'}
+        return results
+
+    with tempfile.TemporaryDirectory(prefix='pandoc-batch-') as tmp:
+        tmp = Path(tmp)
+        lua_file = tmp / 'batch.lua'
+        diagrams_args = diagrams.pandoc_args()
+        jobs_file = tmp / 'jobs.tsv'
+        results_file = tmp / 'results.tsv'
+
+        # Settings are baked into the filter to avoid quoting issues with -M on Windows
+        lua_file.write_text(
+            _BATCH_FILTER
+            .replace('@JOBS_PATH@', _lua_string(jobs_file))
+            .replace('@RESULTS_PATH@', _lua_string(results_file))
+            .replace('@TOC@', 'true' if toc else 'false')
+            .replace('@PDF_ENGINE@', _lua_string(pdf_engine))
+            .replace('@REFERENCE_DOC@', _lua_string(reference_doc or ''))
+            .replace('@DIAGRAMS_FILTER@', _lua_string(diagrams_args[-1] if diagrams_args else '')),
+            encoding='utf-8',
+        )
+        ast_paths = {}
+        if ast_cache_dir:
+            Path(ast_cache_dir).mkdir(parents=True, exist_ok=True)
+            version = '.'.join(map(str, pandoc_version(pandoc_path)))
+            for source, _, _ in jobs:
+                if source not in ast_paths:
+                    ast_paths[source] = pandoc_ast.ast_cache_path(source, version, ast_cache_dir)
+        # ASTs the filter will have to parse, to add to the artifact store afterwards
+        new_asts = [path for path in ast_paths.values() if not pandoc_ast.restore_ast(path)]
+        command = [pandoc_path, '--from', 'markdown', '--to', 'plain',
+                   '--lua-filter', str(lua_file), '--output', str(tmp / 'empty.txt')]
+
+        # The filter converts in file order; grouping by source keeps that the order jobs are given in
+        order = {}
+        for job in jobs:
+            order.setdefault(job[0], []).append(job)
+        remaining = [job for group in order.values() for job in group]
+        error = None
+        while remaining:
+            # Bytes, so Windows does not end the rows (and the last column) with \r
+            jobs_file.write_bytes(
+                ''.join(f'{source}\t{format_type}\t{output}\t{ast_paths.get(source, "")}\n'
+                        for source, output, format_type in remaining).encode('utf-8')
+            )
+            lines, error, timed_out = _run_filter(command, results_file, tmp / 'stderr.txt', timeout)
+            for line, seconds in lines:
+                status, output, message = (line.split('\t', 2) + [''] * 3)[:3]
+                success = status == 'OK' and Path(output).exists()
+                results[output] = {
+                    'success': success,
+                    'seconds': seconds,
+                    'error': None if success else message or 'pandoc conversion failed',
+                }
+            remaining = [job for job in remaining if job[1] not in results]
+            if not timed_out or not remaining:
+                break
+            # pandoc was killed working on the first job it had not reported: that file
+            # times out, and a fresh pandoc takes the jobs after it
+            stuck = remaining[0][0]
+            for source, output, _ in remaining:
+                if source == stuck:
+                    results[output] = {'success': False, 'seconds': float(timeout), 'error': error}
+            remaining = [job for job in remaining if job[0] != stuck]
+            error = None
+
+    for path in new_asts:
+        if path.exists():
+            pandoc_ast.store_ast(path)
+
+    # Jobs that never reported back were cut off by a pandoc crash or timeout
+    for _, output, _ in jobs:
+        results.setdefault(output, {'success': False, 'seconds': 0.0,
+                                    'error': error or 'pandoc did not report a result'})
+    return results
+
+
+def _run_filter(command, results_file, stderr_file, timeout):
+    """Run the batch filter until it finishes, or until one job goes timeout seconds without a result.
+
+    Returns ([(result line, seconds)], error, timed out). On a timeout pandoc
+    is killed together with the PDF engine it started. A job's seconds are the
+    wall-clock time since the previous result (or the start), which includes
+    the PDF engine's run; os.clock() in the filter would count pandoc's CPU
+    time only.
+    """
+    if os.name == 'posix':
+        group = {'start_new_session': True}
+    else:
+        group = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    results_file.unlink(missing_ok=True)
+    lines = []
+    offset = 0
+    with open(stderr_file, 'w+b') as stderr:
+        try:
+            proc = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=stderr,
+                                    **group)
+        except OSError as e:
+            return lines, f'Could not start pandoc: {e}', False
+        last_result = time.monotonic()
+        deadline = last_result + timeout if timeout else None
+        try:
+            while True:
+                finished = proc.poll() is not None
+                new_lines, offset = _read_new_lines(results_file, offset)
+                if new_lines:
+                    now = time.monotonic()
+                    # Results that arrive within one poll share its time
+                    share = (now - last_result) / len(new_lines)
+                    lines += [(line, share) for line in new_lines]
+                    last_result = now
+                    if timeout:
+                        deadline = now + timeout
+                if finished:
+                    break
+                if deadline is not None and time.monotonic() > deadline:
+                    kill_tree(proc)
+                    proc.wait()
+                    return lines, f'pandoc timed out after {timeout}s', True
+                time.sleep(POLL_INTERVAL)
+        except BaseException:
+            kill_tree(proc)
+            proc.wait()
+            raise
+        if proc.returncode != 0:
+            stderr.seek(0)
+            message = stderr.read().decode('utf-8', 'replace').strip()
+            return lines, message or f'pandoc exited with code {proc.returncode}', False
+    return lines, None, False
+
+
+def _read_new_lines(path, offset):
+    """Complete lines written to path after offset, and the offset after them."""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except OSError:
+        return [], offset
+    end = data.rfind(b'\n') + 1
+    return data[:end].decode('utf-8').splitlines(), offset + end
+
+
+def _lua_string(value):
+    """Quote a value as a Lua long string literal.
+
+    The level is raised until the closing bracket appears nowhere in the
+    value, including where a trailing ']' would run into it. Lua drops a
+    newline right after the opening bracket, so one is added in front of
+    values that start with a line break.
+    """
+    value = str(value)
+    level = 0
+    while f']{"=" * level}]' in f'{value}]':
+        level += 1
+    if value.startswith(('\n', '\r')):
+        value = '\n' + value
+    return f'[{"=" * level}[{value}]{"=" * level}]'
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+asyncio runner for pandoc (and LaTeX) subprocesses.
+
+pypandoc blocks until pandoc exits, and a LaTeX build that hangs stalls
+the whole conversion loop with it. Here every (source, format) job runs
+pandoc as its own subprocess:
+
+    - at most `concurrency` jobs run at once;
+    - each job has a timeout, after which pandoc and its PDF engine are
+      killed (the whole process group);
+    - jobs that time out or crash are retried; ordinary conversion errors
+      are not, since they would only fail again;
+    - results are yielded as jobs finish, so one pathological document
+      cannot hold up the rest;
+    - cancelling the run (Ctrl+C) kills every running subprocess.
+
+stream_jobs() is the async interface. iter_results() runs it on a
+background event loop for synchronous callers.
+"""
+
+import asyncio
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import backends
+import diagrams
+import doc_templates
+import pandoc_ast
+
+DEFAULT_TIMEOUT = 300
+DEFAULT_RETRIES = 1
+RETRY_DELAY = 1.0
+STDERR_LIMIT = 2000
+
+PandocJob = namedtuple('PandocJob', 'source output format_type command')
+
+
+def find_pandoc():
+    """Path of the pandoc executable on PATH (or the one pypandoc manages), or None."""
+    path = backends.probe()['pandoc']['path']
+    if path or not backends.available('pypandoc'):
+        return path
+    try:
+        import pypandoc
+        return pypandoc.get_pandoc_path()
+    except Exception:
+        return None
+
+
+def pandoc_job(source, output, format_type, extra_args=None, pandoc_path=None, pdf_engine=None):
+    """Build the pandoc command for one conversion, reading the cached AST when there is one."""
+    pandoc_path = pandoc_path or find_pandoc()
+    source = Path(source)
+    ast_path = pandoc_ast.ast_cache_path(source)
+    if pandoc_ast.restore_ast(ast_path):
+        command = [pandoc_path, str(ast_path), '--from', 'json']
+    else:
+        command = [pandoc_path, str(source), '--from', 'markdown']
+    command += ['--output', str(output), f'--resource-path={source.parent}']
+    command += list(extra_args or ['--standalone']) + doc_templates.pandoc_args(format_type) + diagrams.pandoc_args()
+    if pdf_engine and format_type == 'pdf':
+        command.append(f'--pdf-engine={pdf_engine}')
+    return PandocJob(str(source), str(output), format_type, command)
+
+
+def kill_tree(proc):
+    """Kill pandoc together with the PDF engine it started."""
+    if proc.returncode is not None:
+        return
+    try:
+        if os.name == 'posix':
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)], capture_output=True)
+    except (OSError, subprocess.SubprocessError):
+        proc.kill()
+
+
+async def _run_process(command, timeout):
+    """Run a command, returning (returncode, stderr); kills it on timeout or cancellation."""
+    if os.name == 'posix':
+        group = {'start_new_session': True}
+    else:
+        group = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    proc = await asyncio.create_subprocess_exec(
+        *command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, **group
+    )
+    try:
+        _, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except BaseException:
+        kill_tree(proc)
+        await proc.wait()
+        raise
+    return proc.returncode, stderr.decode('utf-8', 'replace')
+
+
+async def run_job(job, semaphore, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES):
+    """Run one PandocJob under the semaphore and return its result dict."""
+    error = None
+    attempts = 0
+    async with semaphore:
+        started = time.perf_counter()
+        while attempts <= retries:
+            if attempts:
+                await asyncio.sleep(RETRY_DELAY * attempts)
+            attempts += 1
+            try:
+                returncode, stderr = await _run_process(job.command, timeout)
+            except asyncio.TimeoutError:
+                error = f'pandoc timed out after {timeout}s'
+                # Do not leave a half-written output behind
+                Path(job.output).unlink(missing_ok=True)
+                continue
+            except OSError as e:
+                error = f'Could not start pandoc: {e}'
+                break
+            if returncode == 0 and Path(job.output).exists():
+                error = None
+                break
+            error = stderr.strip()[-STDERR_LIMIT:] or f'pandoc exited with code {returncode}'
+            if returncode > 0:
+                # A conversion error, not a crash: retrying would fail the same way
+                break
+    return {
+        'source': job.source,
+        'format': job.format_type,
+        'output': job.output,
+        'backend': 'pandoc',
+        'success': error is None,
+        'seconds': round(time.perf_counter() - started, 3),
+        'attempts': attempts,
+        'error': error,
+    }
+
+
+async def stream_jobs(jobs, concurrency=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES):
+    """Run PandocJobs concurrently, yielding each result dict as soon as its job finishes."""
+    semaphore = asyncio.Semaphore(concurrency or os.cpu_count() or 1)
+    tasks = [asyncio.ensure_future(run_job(job, semaphore, timeout, retries)) for job in jobs]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Reached on cancellation too: stop whatever is still running
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def iter_results(jobs, concurrency=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES):
+    """Synchronous stream_jobs(): the event loop runs in a background thread.
+
+    Closing the generator early (or Ctrl+C in the caller) cancels the
+    remaining jobs and kills their subprocesses.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return
+    results = queue.Queue()
+    done = object()
+    loop = asyncio.new_event_loop()
+
+    async def produce():
+        async for result in stream_jobs(jobs, concurrency, timeout, retries):
+            results.put(result)
+
+    task = loop.create_task(produce())
+    failure = []
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        except BaseException as e:
+            # Raised again in the caller's thread, instead of ending the results early
+            failure.append(e)
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+            results.put(done)
+
+    thread = threading.Thread(target=run, name='pandoc-jobs', daemon=True)
+    thread.start()
+    try:
+        while True:
+            result = results.get()
+            if result is done:
+                if failure:
+                    raise failure[0]
+                break
+            yield result
+    finally:
+        if thread.is_alive():
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                # The loop closed in the meantime: nothing left to cancel
+                pass
+            thread.join()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Cached probe of the PDF engines, and routing of PDF jobs to the fastest one.
+
+Without LaTeX, every pandoc PDF attempt used to fail slowly, one file at a
+time, before the converters fell back to reportlab. This module checks once
+which engines are installed, and renders a small sample document with each
+one to confirm it works and to time it:
+
+    pdflatex, xelatex, lualatex   pandoc --pdf-engine (LaTeX)
+    wkhtmltopdf, weasyprint       pandoc --pdf-engine (HTML)
+    reportlab                     convert_to_pdf, in-process
+    libreoffice                   DOCX written by docx_stream, then soffice --convert-to pdf
+
+The results are cached in .conversion-cache/pdf_engines.json. They are
+keyed by the path and modification time of every executable, so installing
+or upgrading an engine triggers a fresh probe. convert() renders with the
+fastest working engine and tries the next one if it fails. Engines that
+are missing or broken are never attempted. Set CONVERT_PDF_ENGINE (or pass
+--pdf-engine) to prefer a particular engine when it works.
+
+Run `python pdf_engines.py` to re-probe and print the ranking.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import backends
+
+PROBE_CACHE = Path(__file__).parent / '.conversion-cache' / 'pdf_engines.json'
+PROBE_VERSION = 1
+TRIAL_TIMEOUT = 120
+ENV_PDF_ENGINE = 'CONVERT_PDF_ENGINE'
+
+LATEX_ENGINES = ('pdflatex', 'xelatex', 'lualatex')
+HTML_ENGINES = ('wkhtmltopdf', 'weasyprint')
+PANDOC_ENGINES = LATEX_ENGINES + HTML_ENGINES
+ENGINES = ('reportlab',) + PANDOC_ENGINES + ('libreoffice',)
+
+_LIBREOFFICE_NAMES = ('soffice', 'libreoffice')
+_LIBREOFFICE_WINDOWS = (r'C:\Program Files\LibreOffice\program\soffice.exe',
+                        r'C:\Program Files (x86)\LibreOffice\program\soffice.exe')
+
+_SAMPLE = '''# Engine Probe
+
+Some **bold**, *italic* and `code` text.
+
+- First item
+- Second item
+
+| Column | Value |
+|--------|-------|
+| a      | 1     |
+
+```
+print("hello")
+```
+'''
+
+_probe = None
+
+
+def find_soffice():
+    """Path of the LibreOffice executable, or None."""
+    for name in _LIBREOFFICE_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    if os.name == 'nt':
+        for path in _LIBREOFFICE_WINDOWS:
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def _executable(engine):
+    if engine == 'reportlab':
+        return None
+    if engine == 'libreoffice':
+        return find_soffice()
+    return shutil.which(engine)
+
+
+def _stat_key(path):
+    try:
+        return [path, os.stat(path).st_mtime_ns] if path else None
+    except OSError:
+        return None
+
+
+def _environment_key():
+    import pandoc_jobs
+
+    executables = {engine: _stat_key(_executable(engine)) for engine in ENGINES if engine != 'reportlab'}
+    return {
+        'pandoc': _stat_key(pandoc_jobs.find_pandoc()),
+        'executables': executables,
+        'reportlab': backends.available('reportlab'),
+        # With UNO, LibreOffice keeps a listener running instead of starting per file
+        'uno': backends.available('uno'),
+        'docx_writer': _stat_key(str(Path(__file__).with_name('docx_stream.py'))),
+    }
+
+
+def _missing(engine, environment):
+    """Why an engine cannot run at all, or None if it is worth a trial."""
+    if engine == 'reportlab':
+        return None if environment['reportlab'] else 'reportlab not installed'
+    if environment['executables'].get(engine) is None:
+        return 'not found'
+    if engine in PANDOC_ENGINES and environment['pandoc'] is None:
+        return 'needs pandoc'
+    return None
+
+
+def render(engine, md_file, pdf_file, extra_args=None, timeout=None):
+    """Render md_file to pdf_file with one engine; returns (success, error)."""
+    md_file, pdf_file = Path(md_file), Path(pdf_file)
+    if engine == 'reportlab':
+        import convert_to_pdf
+        import pandoc_ast
+        import section_cache
+
+        ast = pandoc_ast.cached_ast(md_file)
+        try:
+            if ast is not None:
+                if convert_to_pdf.use_chapters(md_file):
+                    convert_to_pdf.write_chapters_to_pdf(pandoc_ast.ast_to_blocks(ast), str(pdf_file),
+                                                         cache_sections=section_cache.enabled(md_file))
+                else:
+                    convert_to_pdf.write_blocks_to_pdf(pandoc_ast.ast_to_blocks(ast), str(pdf_file))
+                return True, None
+            if convert_to_pdf.markdown_to_pdf_reportlab(str(md_file), str(pdf_file)):
+                return True, None
+            return False, 'reportlab rendering failed'
+        except Exception as e:
+            return False, str(e)
+    if engine == 'libreoffice':
+        import convert_to_pdf
+        import docx_stream
+
+        with tempfile.TemporaryDirectory(prefix='pdf-engine-') as tmp:
+            docx_file = Path(tmp) / f'{pdf_file.stem}.docx'
+            if not docx_stream.convert_markdown_to_word_streaming(str(md_file), str(docx_file)):
+                return False, 'could not write the intermediate .docx'
+            if convert_to_pdf.docx_to_pdf_libreoffice(str(docx_file), str(pdf_file), timeout=timeout):
+                return True, None
+            return False, 'LibreOffice conversion failed'
+    if engine in PANDOC_ENGINES:
+        import pandoc_jobs
+
+        job = pandoc_jobs.pandoc_job(md_file, pdf_file, 'pdf', extra_args, pdf_engine=engine)
+        for result in pandoc_jobs.iter_results([job], concurrency=1, timeout=timeout or pandoc_jobs.DEFAULT_TIMEOUT,
+                                               retries=0):
+            return result['success'], result['error']
+    return False, f'unknown PDF engine: {engine}'
+
+
+def _trial(engine):
+    with tempfile.TemporaryDirectory(prefix='pdf-probe-') as tmp:
+        md_file = Path(tmp) / 'probe.md'
+        md_file.write_text(_SAMPLE, encoding='utf-8')
+        pdf_file = md_file.with_suffix('.pdf')
+        if engine == 'reportlab':
+            # Time the rendering, not the one-off import
+            import convert_to_pdf  # noqa: F401
+            import reportlab.platypus  # noqa: F401
+        started = time.perf_counter()
+        success, error = render(engine, md_file, pdf_file, timeout=TRIAL_TIMEOUT)
+        seconds = time.perf_counter() - started
+        if success and not pdf_file.exists():
+            success, error = False, 'no PDF was written'
+    return {'working': success, 'seconds': round(seconds, 4) if success else None,
+            'error': None if success else ((error or '').strip() or 'failed').splitlines()[-1][:300]}
+
+
+def _load_cache():
+    try:
+        with open(PROBE_CACHE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if data.get('version') == PROBE_VERSION else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(data):
+    try:
+        PROBE_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = PROBE_CACHE.with_name(f'{PROBE_CACHE.name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, PROBE_CACHE)
+    except OSError:
+        pass
+
+
+def probe(refresh=False):
+    """Return {'engines': {name: {'working', 'seconds', 'error'}}, 'order': [fastest first]}."""
+    global _probe
+    if _probe is not None and not refresh:
+        return _probe
+
+    environment = _environment_key()
+    data = {} if refresh else _load_cache()
+    if data.get('environment') != environment:
+        engines = {}
+        for engine in ENGINES:
+            reason = _missing(engine, environment)
+            engines[engine] = _trial(engine) if reason is None else {'working': False, 'seconds': None,
+                                                                       'error': reason}
+        order = sorted((name for name, result in engines.items() if result['working']),
+                       key=lambda name: engines[name]['seconds'])
+        data = {'version': PROBE_VERSION, 'environment': environment, 'engines': engines, 'order': order}
+        _save_cache(data)
+    _probe = data
+    return data
+
+
+def engine_order(include_pandoc=True, preferred=None):
+    """Working engines, fastest first; the preferred one (CONVERT_PDF_ENGINE) leads if it works."""
+    order = list(probe()['order'])
+    preferred = preferred or os.environ.get(ENV_PDF_ENGINE, '').strip().lower()
+    if preferred in order:
+        order.remove(preferred)
+        order.insert(0, preferred)
+    if not include_pandoc:
+        order = [engine for engine in order if engine not in PANDOC_ENGINES]
+    return order
+
+
+def best_engine():
+    """The engine PDF jobs are routed to, or None when no engine works."""
+    order = engine_order()
+    return order[0] if order else None
+
+
+def convert(md_file, pdf_file, extra_args=None, engines=None, timeout=None):
+    """Render md_file to pdf_file with the first engine that works; returns its name or None."""
+    for engine in engine_order() if engines is None else engines:
+        success, error = render(engine, md_file, pdf_file, extra_args, timeout)
+        if success and Path(pdf_file).exists():
+            return engine
+        print(f"   [WARNING] {engine} could not render {Path(pdf_file).name}: {error}")
+    return None
+
+
+if __name__ == '__main__':
+    result = probe(refresh=True)
+    for name in ENGINES:
+        engine = result['engines'][name]
+        if engine['working']:
+            print(f"[SUCCESS] {name}: sample rendered in {engine['seconds']:.3f}s")
+        else:
+            print(f"[SKIPPED] {name}: {engine['error']}")
+    print(f"[INFO] PDF jobs go to: {', '.join(engine_order()) or 'nothing (no working engine)'}")
+    print(f"[INFO] Probe cached in {PROBE_CACHE}")
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Full-text search over the converted Markdown corpus.
+
+Finding a note among the reports, fix notes and guides used to mean
+grepping raw Markdown or opening .docx files one by one. Every batch run
+(see convert_all_docs) now keeps an SQLite FTS5 index up to date in
+.conversion-cache/search.sqlite. Each heading starts a section, stored with:
+
+    path      the Markdown source
+    heading   its heading path, e.g. "Deployment > Rollback"
+    anchor    the heading's id (#rollback), the one pandoc gives it in the outputs
+    body      the plain text under it: paragraphs, lists, table cells, code
+
+The index is incremental: a file is read again only when its size or
+modification time changed, and re-indexed only when its contents did.
+Files that were deleted drop out of the index.
+
+Usage:
+    python search_index.py "payment webhook"            # all words, best matches first
+    python search_index.py "stock*" -n 5                # prefix search
+    python search_index.py --raw 'NEAR(cart total, 5)'  # FTS5 query syntax
+    python search_index.py --update docs -r             # index without converting
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+from conversion_manifest import file_hash
+from markdown_blocks import BLANK, CODE, HEADING, RULE, TABLE, is_alignment_row, iter_blocks
+from markdown_inline import heading_id, plain_text
+
+INDEX_PATH = Path(__file__).parent / '.conversion-cache' / 'search.sqlite'
+INDEX_VERSION = 1
+# Relevance weight of a match in the heading path, relative to one in the body text
+HEADING_WEIGHT = 5.0
+HEADING_SEPARATOR = ' > '
+
+_SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS documents (
+    path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT, sections INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS sections USING fts5(
+    path UNINDEXED, anchor UNINDEXED, heading, body, tokenize='porter unicode61'
+);
+INSERT OR IGNORE INTO meta VALUES ('version', '{INDEX_VERSION}');
+'''
+
+
+def connect(index_path=INDEX_PATH):
+    """Open the index, creating it (or recreating an outdated one); raises sqlite3.Error without FTS5."""
+    index_path = Path(index_path)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(index_path, timeout=30)
+    try:
+        version = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    except sqlite3.OperationalError:
+        version = None
+    if version is not None and version[0] != str(INDEX_VERSION):
+        db.executescript('DROP TABLE IF EXISTS sections; DROP TABLE IF EXISTS documents; DROP TABLE meta;')
+    db.executescript(_SCHEMA)
+    return db
+
+
+def block_text(block):
+    """The searchable plain text of one non-heading block."""
+    if block.kind == CODE:
+        return block.text
+    if block.kind == TABLE:
+        return '\n'.join(' '.join(plain_text(cell) for cell in row) for row in block.rows
+                         if not is_alignment_row(row))
+    if block.kind in (BLANK, RULE):
+        return ''
+    return plain_text(block.text)
+
+
+def document_sections(md_file):
+    """(anchor, heading path, body) for every section of a Markdown file.
+
+    Text before the first heading is a section with no heading or anchor.
+    """
+    sections = []
+    used = set()
+    headings = []
+    anchor, body = '', []
+    with open(md_file, 'r', encoding='utf-8') as f:
+        for block in iter_blocks(f):
+            if block.kind == HEADING:
+                if anchor or body:
+                    sections.append((anchor, HEADING_SEPARATOR.join(text for _, text in headings), '\n'.join(body)))
+                while headings and headings[-1][0] >= block.level:
+                    headings.pop()
+                headings.append((block.level, plain_text(block.text)))
+                anchor, body = heading_id(block.text, used), []
+            else:
+                text = block_text(block)
+                if text:
+                    body.append(text)
+    if anchor or body:
+        sections.append((anchor, HEADING_SEPARATOR.join(text for _, text in headings), '\n'.join(body)))
+    return sections
+
+
+def update(md_files, index_path=INDEX_PATH, prune=True):
+    """Bring the index up to date for md_files; returns (reindexed, unchanged, removed) counts.
+
+    With prune, documents whose source no longer exists are removed as well.
+    """
+    db = connect(index_path)
+    reindexed = unchanged = removed = 0
+    try:
+        with db:
+            known = {path: (size, mtime_ns, digest) for path, size, mtime_ns, digest
+                     in db.execute('SELECT path, size, mtime_ns, sha256 FROM documents')}
+            for md_file in md_files:
+                path = str(Path(md_file).resolve())
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entry = known.get(path)
+                if entry and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+                    unchanged += 1
+                    continue
+                digest = file_hash(path)
+                if entry and entry[2] == digest:
+                    # Touched but not edited: just remember the new stat
+                    db.execute('UPDATE documents SET size = ?, mtime_ns = ? WHERE path = ?',
+                               (stat.st_size, stat.st_mtime_ns, path))
+                    unchanged += 1
+                    continue
+                try:
+                    sections = document_sections(path)
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"   [WARNING] Could not index {Path(path).name}: {e}")
+                    continue
+                db.execute('DELETE FROM sections WHERE path = ?', (path,))
+                db.executemany('INSERT INTO sections (path, anchor, heading, body) VALUES (?, ?, ?, ?)',
+                               [(path, anchor, heading, body) for anchor, heading, body in sections])
+                db.execute('INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)',
+                           (path, stat.st_size, stat.st_mtime_ns, digest, len(sections)))
+                reindexed += 1
+            if prune:
+                for path in known:
+                    if not os.path.exists(path):
+                        db.execute('DELETE FROM sections WHERE path = ?', (path,))
+                        db.execute('DELETE FROM documents WHERE path = ?', (path,))
+                        removed += 1
+    finally:
+        db.close()
+    return reindexed, unchanged, removed
+
+
+def update_quietly(md_files, index_path=INDEX_PATH):
+    """update() for the batch runs: prints one line, and never fails the build."""
+    started = time.perf_counter()
+    try:
+        reindexed, unchanged, removed = update(md_files, index_path)
+    except sqlite3.Error as e:
+        print(f"[WARNING] Search index not updated: {e}")
+        return False
+    if reindexed or removed:
+        print(f"[INFO] Search index: {reindexed} files indexed, {unchanged} unchanged, {removed} removed "
+              f"in {time.perf_counter() - started:.2f}s")
+    return True
+
+
+def fts_query(text):
+    """An FTS5 query matching all the words of text; a trailing * keeps a word a prefix search."""
+    terms = []
+    for word in text.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def search(query, limit=20, index_path=INDEX_PATH, raw=False):
+    """Best matching sections first: [{'path', 'anchor', 'heading', 'snippet', 'score'}]."""
+    match = query if raw else fts_query(query)
+    if not match:
+        return []
+    db = connect(index_path)
+    try:
+        rows = db.execute(
+            "SELECT path, anchor, heading, snippet(sections, 3, '[', ']', ' ... ', 12), "
+            "bm25(sections, 0, 0, ?, 1.0) AS score "
+            "FROM sections WHERE sections MATCH ? ORDER BY score LIMIT ?",
+            (HEADING_WEIGHT, match, limit)).fetchall()
+    finally:
+        db.close()
+    return [{'path': path, 'anchor': anchor, 'heading': heading, 'snippet': snippet, 'score': score}
+            for path, anchor, heading, snippet, score in rows]
+
+
+def display_path(path):
+    """path relative to the working directory when it is below it."""
+    try:
+        return str(Path(path).relative_to(Path.cwd()))
+    except ValueError:
+        return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Search the converted Markdown documents.')
+    parser.add_argument('query', nargs='*', help='Words to find (all of them must match)')
+    parser.add_argument('-n', '--limit', type=int, default=20, help='Most results to show (default: 20)')
+    parser.add_argument('--raw', action='store_true', help='Pass the query to SQLite FTS5 as written')
+    parser.add_argument('--update', nargs='*', metavar='INPUT',
+                        help='Index these files, directories or globs first (default: project root)')
+    parser.add_argument('-r', '--recursive', action='store_true', help='Search --update directories recursively')
+    parser.add_argument('--rebuild', action='store_true', help='Delete the index before updating it')
+    parser.add_argument('--index', default=str(INDEX_PATH), help=f'Index file (default: {INDEX_PATH})')
+    args = parser.parse_args(argv)
+
+    if args.rebuild:
+        Path(args.index).unlink(missing_ok=True)
+        if args.update is None:
+            args.update = []
+    try:
+        if args.update is not None:
+            from convert_all_docs import collect_markdown_files
+
+            md_files = collect_markdown_files(args.update or [str(Path(__file__).parent)], recursive=args.recursive)
+            started = time.perf_counter()
+            reindexed, unchanged, removed = update(md_files, args.index)
+            print(f"[INFO] {reindexed} files indexed, {unchanged} unchanged, {removed} removed "
+                  f"in {time.perf_counter() - started:.2f}s")
+        if not args.query:
+            return 0
+        started = time.perf_counter()
+        results = search(' '.join(args.query), args.limit, args.index, raw=args.raw)
+        elapsed = time.perf_counter() - started
+    except sqlite3.Error as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+    for result in results:
+        location = display_path(result['path']) + (f"#{result['anchor']}" if result['anchor'] else '')
+        print(location)
+        if result['heading']:
+            print(f"   {result['heading']}")
+        snippet = ' '.join(result['snippet'].split())
+        if snippet:
+            print(f"   {snippet}")
+    print(f"[INFO] {len(results)} results in {elapsed * 1000:.1f} ms")
+    return 0 if results else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Section-level cache of rendered fragments, for incremental rebuilds of long documents.
+
+The build manifest skips unchanged files, but a one-line fix in a long
+guide used to re-render the whole document. Here a document's blocks are
+split into sections, and each section is hashed together with the
+converter that renders it. The rendered fragment of every section is kept
+between builds, so only the changed sections are rendered again and the
+output is put back together from the cached fragments:
+
+    Word (python-docx)   the section's body XML, plus the hyperlinks and
+                         images it refers to; sections start at every heading
+    PDF (reportlab)      the rendered chapter PDF and its headings; chapters
+                         are the ones write_chapters_to_pdf splits at
+
+The fragments of one output live in one file in .conversion-cache/sections,
+rewritten atomically after each build with only the current sections, so
+the cache never outgrows the documents. Sources smaller than
+SECTION_CACHE_BYTES are rendered in full: for them the bookkeeping costs
+about as much as it saves. Set CONVERT_SECTION_CACHE=1 to cache every
+document, or 0 to never cache.
+"""
+
+import hashlib
+import io
+import os
+import pickle
+from pathlib import Path
+
+import conversion_profile
+from conversion_manifest import converter_identity, fingerprint
+from markdown_blocks import HEADING
+
+CACHE_DIR = Path(__file__).parent / '.conversion-cache' / 'sections'
+CACHE_VERSION = 1
+SECTION_CACHE_BYTES = 16 * 1024
+ENV_SECTION_CACHE = 'CONVERT_SECTION_CACHE'
+
+_R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_REL_ATTRIBUTES = (f'{{{_R_NS}}}id', f'{{{_R_NS}}}embed', f'{{{_R_NS}}}link')
+_BODY_NAMESPACES = {
+    'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
+    'r': _R_NS,
+    'wp': 'http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing',
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+    'pic': 'http://schemas.openxmlformats.org/drawingml/2006/picture',
+}
+
+
+def enabled(source_file):
+    """True if the outputs of source_file should be built from cached sections."""
+    setting = os.environ.get(ENV_SECTION_CACHE, '').strip()
+    if setting in ('0', '1'):
+        return setting == '1'
+    try:
+        return Path(source_file).stat().st_size >= SECTION_CACHE_BYTES
+    except OSError:
+        return False
+
+
+def namespace(kind, modules, options=None):
+    """Key of everything besides a section's blocks that shapes its fragment: code, libraries, options."""
+    files = [Path(__file__).with_name(f'{module}.py') for module in modules]
+    return fingerprint(converter_identity(*files), kind, options)
+
+
+def split_sections(blocks):
+    """Split blocks before every heading; anything before the first heading is a section of its own."""
+    sections = [[]]
+    for block in blocks:
+        if block.kind == HEADING and sections[-1]:
+            sections.append([])
+        sections[-1].append(block)
+    return sections if sections[0] else []
+
+
+def section_key(blocks):
+    return hashlib.sha256(repr(list(blocks)).encode('utf-8')).hexdigest()
+
+
+class SectionCache:
+    """The cached fragments of one output, by section key.
+
+    get() and put() record which sections the current build uses; save()
+    keeps exactly those.
+    """
+
+    def __init__(self, output_file, namespace):
+        output_id = hashlib.sha1(str(Path(output_file).resolve()).encode('utf-8')).hexdigest()
+        self.path = CACHE_DIR / f'{output_id}.pickle'
+        self.namespace = namespace
+        self.fragments = {}
+        self.used = {}
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+            if data.get('version') == CACHE_VERSION and data.get('namespace') == namespace:
+                self.fragments = data['fragments']
+        except (OSError, pickle.PickleError, EOFError, AttributeError, KeyError, TypeError, ValueError):
+            pass
+
+    def get(self, key):
+        fragment = self.fragments.get(key)
+        if fragment is not None:
+            self.used[key] = fragment
+            self.hits += 1
+            conversion_profile.count('sections_reused')
+        else:
+            self.misses += 1
+        return fragment
+
+    def put(self, key, fragment):
+        self.used[key] = fragment
+        conversion_profile.count('sections_rendered')
+
+    def save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({'version': CACHE_VERSION, 'namespace': self.namespace, 'fragments': self.used}, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+def _section_properties(doc):
+    """The body's final sectPr, which python-docx adds content in front of; None if there is none."""
+    try:
+        # Negative indexes are counted from the end, without walking the whole body
+        last = doc.element.body[-1]
+    except IndexError:
+        return None
+    return last if last.tag.endswith('}sectPr') else None
+
+
+def mark_docx(doc):
+    """Remember where the next section starts (pass to capture_docx)."""
+    try:
+        return doc.element.body[-2 if _section_properties(doc) is not None else -1]
+    except IndexError:
+        return None
+
+
+def capture_docx(doc, mark):
+    """The fragment for the body elements added since mark_docx(): (xml, relationships)."""
+    from lxml import etree
+
+    first = mark.getnext() if mark is not None else next(iter(doc.element.body), None)
+    elements = []
+    if first is not None:
+        for element in [first, *first.itersiblings()]:
+            if element.tag.endswith('}sectPr'):
+                break
+            elements.append(element)
+    relationships = {}
+    for element in elements:
+        for node in element.iter():
+            for attribute in _REL_ATTRIBUTES:
+                rid = node.get(attribute)
+                if rid and rid not in relationships:
+                    rel = doc.part.rels[rid]
+                    if rel.is_external:
+                        relationships[rid] = ('external', rel.reltype, rel.target_ref)
+                    else:
+                        part = rel.target_part
+                        relationships[rid] = ('part', rel.reltype, part.blob, part.partname.ext)
+    return b''.join(etree.tostring(element) for element in elements), relationships
+
+
+def insert_docx(doc, fragment):
+    """Append a captured fragment to doc, re-creating its relationships."""
+    from docx.oxml import parse_xml
+
+    xml, relationships = fragment
+    declarations = ' '.join(f'xmlns:{prefix}="{uri}"' for prefix, uri in _BODY_NAMESPACES.items())
+    elements = list(parse_xml(f'<w:body {declarations}>'.encode('utf-8') + xml + b'</w:body>'))
+    if relationships:
+        new_ids = {}
+        for rid, rel in relationships.items():
+            if rel[0] == 'external':
+                new_ids[rid] = doc.part.relate_to(rel[2], rel[1], is_external=True)
+            else:
+                # Images are the only parts the converters link from the body
+                new_ids[rid], _ = doc.part.get_or_add_image(io.BytesIO(rel[2]))
+        for element in elements:
+            for node in element.iter():
+                for attribute in _REL_ATTRIBUTES:
+                    rid = node.get(attribute)
+                    if rid:
+                        node.set(attribute, new_ids[rid])
+    section_properties = _section_properties(doc)
+    if section_properties is not None:
+        for element in elements:
+            section_properties.addprevious(element)
+    else:
+        doc.element.body.extend(elements)
+
+
+def renumber_drawings(doc):
+    """Give every picture a unique id again: fragments rendered in different builds reuse ids."""
+    from docx.oxml.ns import qn
+
+    for number, node in enumerate(doc.element.body.iter(qn('wp:docPr')), start=1):
+        node.set('id', str(number))
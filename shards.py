@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Split a batch conversion across several machines, and check the result.
+
+A full release build (every report to DOCX, PDF and HTML) can be spread
+over N CI runners with no shared service: each runs the same command with
+its own shard,
+
+    python convert_all_docs.py --shard 1/4     # on runner 1, ... --shard 4/4 on runner 4
+
+and converts only the files assigned to it. Every runner computes the same
+assignment on its own, from the relative paths and sizes of the sources:
+files are placed largest first, each on the shard that ranks highest for
+its path (rendezvous hashing) among those with room left, so shards get
+about the same amount of Markdown and a file keeps its shard while the
+corpus changes little. A shard then writes a partial manifest
+(.conversion-shard-1-of-4.json) with every output it is responsible for
+and the ones it built.
+
+After collecting the outputs and partial manifests of all runners,
+
+    python shards.py merge .conversion-shard-*-of-4.json
+
+checks that every output of the corpus was built exactly once, by the shard
+it was assigned to, combines the partial manifests into the build manifest
+(so the next build is incremental again), and rebuilds the HTML index
+pages. It exits non-zero if a shard is missing or an output is missing,
+failed or was built twice. `python shards.py plan 4` prints the assignment.
+
+All runners must see the same checkout: a source that differs in content
+between them can change the assignment.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+from conversion_manifest import MANIFEST_NAME, BuildManifest
+
+PARTIAL_VERSION = 1
+PROJECT_ROOT = Path(__file__).parent
+# A shard may take this much more than an even share before files go to their next-ranked shard
+BALANCE_SLACK = 0.10
+# Fixed cost of a file, in bytes of Markdown: every output pays a process or pandoc start-up
+FILE_OVERHEAD_BYTES = 4096
+
+
+def parse_shard(spec):
+    """(index, count) from 'I/N', with 1 <= I <= N; raises ValueError."""
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f'shard must look like 2/4, not {spec!r}') from None
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f'shard {spec} is out of range: use 1/N to N/N')
+    return index, count
+
+
+def partial_path(index, count, directory=PROJECT_ROOT):
+    return Path(directory) / f'.conversion-shard-{index}-of-{count}.json'
+
+
+def source_key(md_path):
+    """The path every runner knows a source by: relative to the project, with / separators."""
+    md_path = Path(md_path).resolve()
+    try:
+        return md_path.relative_to(PROJECT_ROOT.resolve()).as_posix()
+    except ValueError:
+        return md_path.as_posix()
+
+
+def weight(md_path):
+    """Expected conversion cost of a file; CRLF counts as one byte, so Windows and Linux runners agree."""
+    with open(md_path, 'rb') as f:
+        data = f.read()
+    return FILE_OVERHEAD_BYTES + len(data) - data.count(b'\r\n')
+
+
+def _rank(key, shard):
+    return hashlib.sha256(f'{key}\n{shard}'.encode('utf-8')).digest()
+
+
+def assign(md_files, count):
+    """{md path: shard index (1-based)} for a list of sources, the same on every machine."""
+    costs = {md_path: weight(md_path) for md_path in md_files}
+    keys = {md_path: source_key(md_path) for md_path in md_files}
+    loads = {shard: 0 for shard in range(1, count + 1)}
+    placed = 0
+    assignment = {}
+    for md_path in sorted(md_files, key=lambda p: (-costs[p], keys[p])):
+        placed += costs[md_path]
+        # Bounded loads: no shard may run ahead of an even share of what is placed so far, plus the slack
+        capacity = (1 + BALANCE_SLACK) * placed / count
+        preferred = sorted(loads, key=lambda shard: _rank(keys[md_path], shard), reverse=True)
+        shard = next((shard for shard in preferred if loads[shard] + costs[md_path] <= capacity), None)
+        if shard is None:
+            shard = min(preferred, key=lambda s: loads[s])
+        loads[shard] += costs[md_path]
+        assignment[md_path] = shard
+    return assignment
+
+
+def write_partial(path, index, count, planned, assignment, results, manifest):
+    """Write the partial manifest of one shard.
+
+    planned lists (md path, format, output path) for the whole corpus, and
+    assignment maps each md path to its shard, so that any one partial
+    tells the merge step everything that should have been built.
+    """
+    expected = {}
+    for md_path, format_type, output_file in planned:
+        key, _ = manifest.entry(output_file)
+        expected[key] = {'source': source_key(md_path), 'format': format_type, 'shard': assignment[md_path]}
+    outputs = {}
+    failed = {}
+    for result in results:
+        key, entry = manifest.entry(result['output'])
+        if result['success'] and entry is not None:
+            outputs[key] = entry
+        else:
+            failed[key] = result['error'] or 'not recorded in the manifest'
+    data = {'version': PARTIAL_VERSION, 'shard': index, 'count': count, 'expected': expected,
+            'outputs': outputs, 'failed': failed}
+    path = Path(path)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _load_partial(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != PARTIAL_VERSION:
+        raise ValueError(f'unsupported partial manifest version {data.get("version")!r}')
+    return data
+
+
+def merge(partial_files, manifest_path=None):
+    """Check the partial manifests of all shards and combine them into the build manifest; True if complete."""
+    partials = {}
+    errors = []
+    for path in partial_files:
+        try:
+            data = _load_partial(path)
+        except (OSError, ValueError) as e:
+            print(f"[ERROR] Cannot read {path}: {e}")
+            return False
+        if data['shard'] in partials:
+            errors.append(f"shard {data['shard']}/{data['count']} appears twice ({path})")
+        partials[data['shard']] = data
+    if not partials:
+        print("[ERROR] No partial manifests given.")
+        return False
+
+    first = next(iter(partials.values()))
+    count, expected = first['count'], first['expected']
+    for shard, data in sorted(partials.items()):
+        if data['count'] != count or data['expected'] != expected:
+            errors.append(f"shard {shard}/{data['count']} planned a different build (other sources, formats "
+                          f"or shard count)")
+    for shard in range(1, count + 1):
+        if shard not in partials:
+            errors.append(f"shard {shard}/{count} is missing")
+
+    built = {}
+    for shard, data in sorted(partials.items()):
+        for key in data['outputs']:
+            built.setdefault(key, []).append(shard)
+    for key, shards in sorted(built.items()):
+        planned = expected.get(key)
+        if planned is None:
+            errors.append(f"{key} was built by shard {shards[0]} but is not part of the build")
+        elif len(shards) > 1:
+            errors.append(f"{key} was built {len(shards)} times (shards {', '.join(map(str, shards))})")
+        elif shards[0] != planned['shard']:
+            errors.append(f"{key} was built by shard {shards[0]} but assigned to shard {planned['shard']}")
+    for key, planned in sorted(expected.items()):
+        if key not in built and planned['shard'] in partials:
+            reason = partials[planned['shard']]['failed'].get(key, 'not built')
+            errors.append(f"{key} is missing: {reason}")
+
+    for error in errors:
+        print(f"[ERROR] {error}")
+    if errors:
+        print(f"[FAILED] {len(built)} of {len(expected)} outputs built exactly once; {len(errors)} problems")
+        return False
+
+    manifest = BuildManifest(manifest_path)
+    for data in partials.values():
+        manifest.merge(data['outputs'])
+    manifest.save()
+    _write_html_indexes(manifest.root, expected)
+    print(f"[SUCCESS] {len(expected)} outputs from {count} shards, each built exactly once; "
+          f"manifest written to {manifest.path}")
+    return True
+
+
+def _write_html_indexes(root, expected):
+    """Index the HTML pages collected from every shard; each shard only listed its own."""
+    directories = {(Path(root) / key).parent for key, planned in expected.items() if planned['format'] == 'html'}
+    directories = [directory for directory in sorted(directories) if directory.is_dir()]
+    if directories:
+        import html_output
+
+        for directory in directories:
+            html_output.write_index(directory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Plan and merge sharded batch conversions.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    plan = commands.add_parser('plan', help='Show which shard converts each file')
+    plan.add_argument('count', type=int, help='Number of shards')
+    plan.add_argument('inputs', nargs='*', help='Markdown files, directories or glob patterns (default: project root)')
+    plan.add_argument('-r', '--recursive', action='store_true', help='Search directories recursively')
+    plan.add_argument('-v', '--verbose', action='store_true', help='List the files of every shard')
+    combine = commands.add_parser('merge', help='Verify the partial manifests of all shards and combine them')
+    combine.add_argument('partials', nargs='+', help='Partial manifests (.conversion-shard-I-of-N.json)')
+    combine.add_argument('--manifest', help=f'Build manifest to write (default: {MANIFEST_NAME} in the project root)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'merge':
+        return 0 if merge(args.partials, args.manifest) else 1
+
+    if args.count < 1:
+        parser.error('count must be at least 1')
+    from convert_all_docs import collect_markdown_files
+
+    md_files = collect_markdown_files(args.inputs or [str(PROJECT_ROOT)], recursive=args.recursive)
+    assignment = assign(md_files, args.count)
+    for shard in range(1, args.count + 1):
+        files = [md_path for md_path in md_files if assignment[md_path] == shard]
+        size = sum(weight(md_path) for md_path in files)
+        print(f"[INFO] Shard {shard}/{args.count}: {len(files)} files, {size / 1024:.0f} KB")
+        if args.verbose:
+            for md_path in files:
+                print(f"   {source_key(md_path)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import os
+
+import pytest
+
+import artifact_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    root = tmp_path / 'store'
+    monkeypatch.setenv(artifact_store.ENV_STORE_DIR, str(root))
+    monkeypatch.delenv(artifact_store.ENV_STORE, raising=False)
+    monkeypatch.delenv(artifact_store.ENV_STORE_MAX_MB, raising=False)
+    monkeypatch.setattr(artifact_store, '_stats', {})
+    return root
+
+
+def make_file(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_put_then_fetch(store, tmp_path):
+    source = make_file(tmp_path / 'REPORT.docx', b'docx bytes')
+    assert artifact_store.put('output', 'k1', source)
+    destination = tmp_path / 'elsewhere' / 'REPORT.docx'
+    assert artifact_store.fetch('output', 'k1', destination)
+    assert destination.read_bytes() == b'docx bytes'
+    assert artifact_store.stats() == {'output': {'hits': 1, 'misses': 0, 'stored': 1}}
+
+
+def test_fetch_misses(store, tmp_path):
+    destination = tmp_path / 'out.pdf'
+    assert not artifact_store.fetch('output', 'unknown', destination)
+    assert not destination.exists()
+    # Kinds are separate namespaces
+    artifact_store.put('ast', 'k1', make_file(tmp_path / 'a.json', b'{}'))
+    assert not artifact_store.fetch('output', 'k1', destination)
+    assert artifact_store.stats()['output']['misses'] == 2
+
+
+def test_identical_files_are_stored_once(store, tmp_path):
+    artifact_store.put('output', 'k1', make_file(tmp_path / 'a.docx', b'same'))
+    artifact_store.put('output', 'k2', make_file(tmp_path / 'b.docx', b'same'))
+    artifact_store.put('output', 'k3', make_file(tmp_path / 'c.docx', b'other'))
+    assert artifact_store.usage() == (2, len(b'same') + len(b'other'))
+
+
+def test_put_replaces_a_key(store, tmp_path):
+    artifact_store.put('output', 'k1', make_file(tmp_path / 'a.docx', b'old'))
+    artifact_store.put('output', 'k1', make_file(tmp_path / 'a.docx', b'new'))
+    assert artifact_store.fetch('output', 'k1', tmp_path / 'out.docx')
+    assert (tmp_path / 'out.docx').read_bytes() == b'new'
+
+
+def test_disabled_store(store, tmp_path, monkeypatch):
+    monkeypatch.setenv(artifact_store.ENV_STORE, '0')
+    assert not artifact_store.enabled()
+    assert not artifact_store.put('output', 'k1', make_file(tmp_path / 'a.docx', b'x'))
+    assert not artifact_store.fetch('output', 'k1', tmp_path / 'out.docx')
+    assert not store.exists()
+
+
+def test_keys():
+    assert artifact_store.make_key('a', 1) == artifact_store.make_key('a', 1)
+    assert artifact_store.make_key('a', 1) != artifact_store.make_key('a', 2)
+
+
+def test_output_key_depends_on_contents_name_format_and_fingerprint(tmp_path):
+    first = make_file(tmp_path / 'one' / 'REPORT.md', b'# Report')
+    same = make_file(tmp_path / 'two' / 'REPORT.md', b'# Report')
+    renamed = make_file(tmp_path / 'two' / 'OTHER.md', b'# Report')
+    key = artifact_store.output_key(first, 'docx', 'fp')
+    assert artifact_store.output_key(same, 'docx', 'fp') == key
+    assert artifact_store.output_key(renamed, 'docx', 'fp') != key
+    assert artifact_store.output_key(first, 'pdf', 'fp') != key
+    assert artifact_store.output_key(first, 'docx', 'fp2') != key
+    first.write_bytes(b'# Report v2')
+    assert artifact_store.output_key(first, 'docx', 'fp') != key
+
+
+def test_max_bytes(store, monkeypatch):
+    assert artifact_store.max_bytes() == artifact_store.DEFAULT_MAX_MB * 2**20
+    monkeypatch.setenv(artifact_store.ENV_STORE_MAX_MB, '0.5')
+    assert artifact_store.max_bytes() == 2**19
+    monkeypatch.setenv(artifact_store.ENV_STORE_MAX_MB, 'lots')
+    assert artifact_store.max_bytes() == artifact_store.DEFAULT_MAX_MB * 2**20
+
+
+def test_trim_evicts_least_recently_used(store, tmp_path):
+    for index in range(5):
+        artifact_store.put('output', f'k{index}', make_file(tmp_path / f'{index}.pdf', bytes([index]) * 1000))
+    # Last used in this order, k3 longest ago
+    for index, key in enumerate(['k3', 'k0', 'k4', 'k1', 'k2']):
+        ref = artifact_store._ref_path('output', key)
+        stored = artifact_store._object_path(ref.read_text(encoding='utf-8'))
+        os.utime(stored, (1_000_000 + index, 1_000_000 + index))
+
+    assert artifact_store.trim(limit=10_000) == (0, 0)
+    removed, freed = artifact_store.trim(limit=3_000)
+    # Down to 90% of the cap: two files of 1000 bytes remain
+    assert (removed, freed) == (3, 3000)
+    assert artifact_store.usage() == (2, 2000)
+    assert not artifact_store._ref_path('output', 'k3').exists()
+    assert not artifact_store.fetch('output', 'k0', tmp_path / 'out.pdf')
+    assert artifact_store.fetch('output', 'k2', tmp_path / 'out.pdf')
+
+
+def test_fetch_marks_a_file_as_used(store, tmp_path):
+    artifact_store.put('output', 'old', make_file(tmp_path / 'a.pdf', b'a' * 1000))
+    artifact_store.put('output', 'new', make_file(tmp_path / 'b.pdf', b'b' * 1000))
+    for index, key in enumerate(['old', 'new']):
+        stored = artifact_store._object_path(artifact_store._ref_path('output', key).read_text(encoding='utf-8'))
+        os.utime(stored, (1_000_000 + index, 1_000_000 + index))
+    assert artifact_store.fetch('output', 'old', tmp_path / 'out.pdf')
+    artifact_store.trim(limit=1_500)
+    assert artifact_store.fetch('output', 'old', tmp_path / 'out.pdf')
+    assert not artifact_store.fetch('output', 'new', tmp_path / 'out.pdf')
+
+
+def test_worker_counts_add_up_in_the_parent(store, tmp_path):
+    artifact_store.put('ast', 'k1', make_file(tmp_path / 'a.json', b'{}'))
+    artifact_store.fetch('ast', 'k1', tmp_path / 'b.json')
+    worker = artifact_store.take_stats()
+    assert worker == {'ast': {'hits': 1, 'misses': 0, 'stored': 1}}
+    assert artifact_store.stats() == {}
+
+    artifact_store.fetch('output', 'missing', tmp_path / 'out.docx')
+    artifact_store.add_stats(worker)
+    artifact_store.add_stats(worker)
+    artifact_store.add_stats(None)
+    assert artifact_store.stats() == {'ast': {'hits': 2, 'misses': 0, 'stored': 2},
+                                      'output': {'hits': 0, 'misses': 1, 'stored': 0}}
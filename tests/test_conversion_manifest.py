@@ -0,0 +1,175 @@
+import ast
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+import conversion_manifest
+from conversion_manifest import (
+    CONVERTER_MODULES, NOT_CONVERTER_MODULES, BuildManifest, build_fingerprint, converter_files, converter_identity,
+    file_hash, fingerprint
+)
+
+ROOT = Path(conversion_manifest.__file__).parent
+
+
+@pytest.fixture
+def tree(tmp_path):
+    source = tmp_path / 'REPORT.md'
+    source.write_text('# Report\n', encoding='utf-8')
+    output = tmp_path / 'REPORT.docx'
+    output.write_bytes(b'docx bytes')
+    return tmp_path, source, output
+
+
+def test_file_hash(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'x' * 3000)
+    assert file_hash(path, chunk_size=1024) == hashlib.sha256(b'x' * 3000).hexdigest()
+
+
+def test_converter_files_cover_every_module():
+    files = converter_files()
+    assert [path.stem for path in files] == list(CONVERTER_MODULES)
+    assert all(path.exists() for path in files)
+
+
+def local_imports(name):
+    """The repo modules a module imports, at the top level or inside functions."""
+    tree = ast.parse((ROOT / f'{name}.py').read_text(encoding='utf-8'))
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split('.')[0])
+    return {name for name in names if (ROOT / f'{name}.py').exists()}
+
+
+def test_converter_modules_are_what_the_converters_import():
+    # The converters are the scripts that key their outputs with the build manifest
+    pending = [path.stem for path in ROOT.glob('convert_*.py') if 'conversion_manifest' in local_imports(path.stem)]
+    imported = set()
+    while pending:
+        name = pending.pop()
+        if name not in imported:
+            imported.add(name)
+            pending.extend(local_imports(name))
+    assert not set(CONVERTER_MODULES) & set(NOT_CONVERTER_MODULES)
+    assert imported - set(NOT_CONVERTER_MODULES) == set(CONVERTER_MODULES)
+
+
+def test_converter_identity_hashes_each_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversion_manifest, '_identity_cache', {})
+    monkeypatch.setattr(conversion_manifest.backends, 'library_versions', lambda: {'docx': '1.0'})
+    script = tmp_path / 'converter.py'
+    script.write_text('A = 1\n', encoding='utf-8')
+    identity = converter_identity(script)
+    assert identity['converter.py'] == file_hash(script)
+    assert identity['docx'] == '1.0'
+    # Cached per process: the file is hashed once per run
+    script.write_text('A = 2\n', encoding='utf-8')
+    assert converter_identity(script) is identity
+
+
+def test_fingerprint_depends_on_identity_format_and_options():
+    identity = {'converter.py': 'abc'}
+    key = fingerprint(identity, 'docx', {'toc': False})
+    assert key == fingerprint(dict(identity), 'docx', {'toc': False})
+    assert key != fingerprint(identity, 'pdf', {'toc': False})
+    assert key != fingerprint(identity, 'docx', {'toc': True})
+    assert key != fingerprint({'converter.py': 'abd'}, 'docx', {'toc': False})
+    assert fingerprint(identity, 'docx') == fingerprint(identity, 'docx', {})
+
+
+def test_build_fingerprint_options(monkeypatch):
+    monkeypatch.delenv('CONVERT_PDF_CHAPTERS', raising=False)
+    docx = build_fingerprint('docx')
+    assert docx == build_fingerprint('docx')
+    assert docx != build_fingerprint('docx', toc=True)
+    assert docx != build_fingerprint('docx', streaming=True)
+    assert build_fingerprint('html', streaming=True) == build_fingerprint('html')
+    pdf = build_fingerprint('pdf')
+    monkeypatch.setenv('CONVERT_PDF_CHAPTERS', '1')
+    assert build_fingerprint('pdf') != pdf
+
+
+def test_recorded_output_is_up_to_date(tree):
+    root, source, output = tree
+    manifest = BuildManifest(root / '.conversion-manifest.json')
+    assert not manifest.is_up_to_date(source, output, 'key')
+    manifest.record(source, output, 'key', 'pandoc')
+    assert manifest.is_up_to_date(source, output, 'key')
+    assert not manifest.is_up_to_date(source, output, 'other key')
+
+
+def test_changes_make_an_output_stale(tree):
+    root, source, output = tree
+    manifest = BuildManifest(root / '.conversion-manifest.json')
+    manifest.record(source, output, 'key')
+
+    output.write_bytes(b'edited by hand')
+    assert not manifest.is_up_to_date(source, output, 'key')
+    output.write_bytes(b'docx bytes')
+    assert manifest.is_up_to_date(source, output, 'key')
+
+    source.write_text('# Report, revised\n', encoding='utf-8')
+    assert not manifest.is_up_to_date(source, output, 'key')
+
+    manifest.record(source, output, 'key')
+    output.unlink()
+    assert not manifest.is_up_to_date(source, output, 'key')
+
+
+def test_touched_files_are_still_up_to_date(tree):
+    root, source, output = tree
+    manifest = BuildManifest(root / '.conversion-manifest.json')
+    manifest.record(source, output, 'key')
+    later = source.stat().st_mtime_ns + 5_000_000_000
+    os.utime(source, ns=(later, later))
+    os.utime(output, ns=(later, later))
+    assert manifest.is_up_to_date(source, output, 'key')
+
+
+def test_save_and_load(tree):
+    root, source, output = tree
+    path = root / '.conversion-manifest.json'
+    manifest = BuildManifest(path)
+    manifest.save()
+    assert not path.exists()
+
+    manifest.record(source, output, 'key', 'python-docx')
+    manifest.save()
+    data = json.loads(path.read_text(encoding='utf-8'))
+    assert data['version'] == conversion_manifest.MANIFEST_VERSION
+    assert data['outputs']['REPORT.docx']['source'] == 'REPORT.md'
+    assert data['outputs']['REPORT.docx']['backend'] == 'python-docx'
+
+    reloaded = BuildManifest(path)
+    assert reloaded.is_up_to_date(source, output, 'key')
+    assert reloaded.entry(output) == ('REPORT.docx', data['outputs']['REPORT.docx'])
+
+
+def test_unreadable_or_old_manifest_starts_empty(tmp_path):
+    path = tmp_path / '.conversion-manifest.json'
+    path.write_text('{not json', encoding='utf-8')
+    assert BuildManifest(path).entries == {}
+    path.write_text(json.dumps({'version': 0, 'outputs': {'a.docx': {}}}), encoding='utf-8')
+    assert BuildManifest(path).entries == {}
+
+
+def test_forget_and_merge(tree):
+    root, source, output = tree
+    path = root / '.conversion-manifest.json'
+    manifest = BuildManifest(path)
+    manifest.record(source, output, 'key')
+    key, entry = manifest.entry(output)
+    manifest.forget(output)
+    assert manifest.entry(output) == (key, None)
+    assert not manifest.is_up_to_date(source, output, 'key')
+
+    manifest.merge({key: entry})
+    manifest.save()
+    assert BuildManifest(path).is_up_to_date(source, output, 'key')
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+import artifact_store
+import diagrams
+
+posix_only = pytest.mark.skipif(os.name != 'posix', reason='the test renderers are shell commands')
+
+
+@pytest.fixture
+def renderer(tmp_path, monkeypatch):
+    monkeypatch.setattr(diagrams, 'CACHE_DIR', tmp_path / 'diagrams')
+    monkeypatch.setattr(diagrams, 'RENDER_TIMEOUT', 0.5)
+    monkeypatch.setattr(artifact_store, 'fetch', lambda *args: False)
+    monkeypatch.setattr(artifact_store, 'put', lambda *args: None)
+
+    def use(command):
+        monkeypatch.setenv('CONVERT_MERMAID_RENDERER', command)
+        diagrams._identities.clear()
+    yield use
+    diagrams._identities.clear()
+
+
+def cached(suffix):
+    return sorted(diagrams.CACHE_DIR.glob(f'*{suffix}'))
+
+
+@posix_only
+def test_rejected_diagram_is_not_retried(renderer, tmp_path):
+    calls = tmp_path / 'calls'
+    renderer(f'sh -c "echo x >> {calls}; echo syntax error >&2; exit 1"')
+    assert diagrams.render('mermaid', 'graph A-->') is None
+    assert diagrams.render('mermaid', 'graph A-->') is None
+    assert len(calls.read_text().split()) == 1
+    assert cached('.failed')[0].read_text() == 'syntax error'
+
+
+@posix_only
+def test_timeout_is_not_cached(renderer):
+    renderer('sleep 5')
+    assert diagrams.render('mermaid', 'graph A-->B') is None
+    assert cached('') == []
+
+
+def test_missing_renderer_is_not_cached(renderer, tmp_path):
+    renderer(f'{tmp_path / "no-mmdc"} {{input}} {{output}}')
+    assert diagrams.render('mermaid', 'graph A-->B') is None
+    assert cached('') == []
+
+
+@posix_only
+def test_rendered_image_is_reused(renderer, tmp_path):
+    calls = tmp_path / 'calls'
+    renderer(f'sh -c "echo x >> {calls}; cp $0 $1" {{input}} {{output}}')
+    image = diagrams.render('mermaid', 'graph A-->B')
+    assert image is not None and image.exists()
+    assert diagrams.render('mermaid', 'graph A-->B  \n') == image
+    assert len(calls.read_text().split()) == 1
@@ -0,0 +1,25 @@
+import re
+import zipfile
+
+from docx_stream import StreamingDocxWriter, fit_row
+from markdown_blocks import tokenize
+
+
+def test_fit_row():
+    assert fit_row(['a'], 3) == ['a', '', '']
+    assert fit_row(['a', 'b', 'c'], 3) == ['a', 'b', 'c']
+    assert fit_row(['a', 'b', 'c', 'd'], 2) == ['a', 'b | c | d']
+
+
+def test_table_rows_match_the_grid(tmp_path):
+    out = tmp_path / 'out.docx'
+    lines = ['| A | B | C |\n', '|---|:-:|--:|\n', '| 1 |\n', '| 1 | 2 | 3 | 4 | 5 |\n', '| 1 | 2 | 3 |\n']
+    with StreamingDocxWriter(str(out)) as writer:
+        writer.write_tokens(tokenize(lines))
+    with zipfile.ZipFile(out) as package:
+        document = package.read('word/document.xml').decode('utf-8')
+    assert document.count('<w:gridCol ') == 3
+    rows = re.findall(r'<w:tr>.*?</w:tr>', document)
+    assert len(rows) == 4
+    assert [row.count('<w:tc>') for row in rows] == [3, 3, 3, 3]
+    assert '3 | 4 | 5' in rows[2]
@@ -0,0 +1,82 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from file_watcher import InotifyWatcher, PollingWatcher, make_watcher, wait_for_changes
+
+
+def write_later(*writes):
+    """Write (delay, path, text) in a thread, each delay after the previous write."""
+    def run():
+        for delay, path, text in writes:
+            time.sleep(delay)
+            path.write_text(text, encoding='utf-8')
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+@pytest.fixture
+def polling(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'old.md').write_text('# Old\n', encoding='utf-8')
+    watcher = PollingWatcher([tmp_path], recursive=True, interval=0.02)
+    yield tmp_path, watcher
+    watcher.close()
+
+
+def test_polling_sees_new_and_edited_markdown(polling):
+    root, watcher = polling
+    assert watcher.wait(0.05) == set()
+    (root / 'old.md').write_text('# Old, edited\n', encoding='utf-8')
+    (root / 'sub' / 'new.md').write_text('# New\n', encoding='utf-8')
+    (root / 'notes.txt').write_text('not markdown\n', encoding='utf-8')
+    assert watcher.wait(1.0) == {(root / 'old.md').resolve(), (root / 'sub' / 'new.md').resolve()}
+    assert watcher.wait(0.05) == set()
+
+
+def test_debounce_collects_a_burst_of_writes(polling):
+    root, watcher = polling
+    paths = [root / f'{name}.md' for name in ('a', 'b', 'c')]
+    thread = write_later(*[(0.05, path, f'# {path.stem}\n') for path in paths])
+    changed = wait_for_changes(watcher, debounce=0.3, timeout=2.0)
+    thread.join()
+    assert changed == {path.resolve() for path in paths}
+
+
+def test_debounce_returns_after_a_quiet_period(polling):
+    root, watcher = polling
+    first, second = root / 'first.md', root / 'second.md'
+    thread = write_later((0.05, first, '# First\n'), (0.8, second, '# Second\n'))
+    started = time.monotonic()
+    assert wait_for_changes(watcher, debounce=0.2, timeout=2.0) == {first.resolve()}
+    assert time.monotonic() - started < 0.8
+    assert wait_for_changes(watcher, debounce=0.2, timeout=2.0) == {second.resolve()}
+    thread.join()
+
+
+def test_no_change_returns_empty_after_timeout(polling):
+    _, watcher = polling
+    started = time.monotonic()
+    assert wait_for_changes(watcher, debounce=0.1, timeout=0.2) == set()
+    assert time.monotonic() - started >= 0.2
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux only')
+def test_inotify_watches_new_directories(tmp_path):
+    watcher = make_watcher([tmp_path], recursive=True)
+    try:
+        assert isinstance(watcher, InotifyWatcher)
+        (tmp_path / 'new').mkdir()
+        assert watcher.wait(0.5) == set()
+        (tmp_path / 'new' / 'doc.md').write_text('# Doc\n', encoding='utf-8')
+        assert watcher.wait(1.0) == {(tmp_path / 'new' / 'doc.md').resolve()}
+    finally:
+        watcher.close()
+
+
+def test_poll_option_forces_polling(tmp_path):
+    watcher = make_watcher([tmp_path], poll=True, interval=0.1)
+    assert isinstance(watcher, PollingWatcher) and watcher.interval == 0.1
@@ -0,0 +1,91 @@
+from markdown_blocks import (
+    BLANK, BULLET, CHECKBOX, CODE, CODE_LINE, FENCE_CLOSE, FENCE_OPEN, HEADING, NUMBERED, PARAGRAPH, RULE, TABLE,
+    TABLE_ROW, Block, is_alignment_row, iter_blocks, normalize_table, split_table_row, tokenize
+)
+
+
+def kinds(tokens):
+    return [token.kind for token in tokens]
+
+
+def test_tokenize_classifies_each_line():
+    lines = ['# Title #', '', 'Some text', '---', '1. first', '- item', '* [x] done', '| a | b |']
+    tokens = list(tokenize(lines))
+    assert kinds(tokens) == [HEADING, BLANK, PARAGRAPH, RULE, NUMBERED, BULLET, CHECKBOX, TABLE_ROW]
+    assert tokens[0] == Block(HEADING, 'Title', level=1)
+    assert tokens[4].text == 'first'
+    assert tokens[6].checked and tokens[6].text == 'done'
+    assert tokens[7].rows == ['a', 'b']
+
+
+def test_tokenize_strips_line_endings():
+    assert list(tokenize(['## Windows\r\n'])) == [Block(HEADING, 'Windows', level=2)]
+
+
+def test_heading_needs_a_space_after_the_hashes():
+    assert kinds(tokenize(['#hashtag', '####### seven'])) == [PARAGRAPH, PARAGRAPH]
+
+
+def test_fenced_code_is_not_interpreted():
+    tokens = list(tokenize(['```python', '# not a heading', '- not a bullet', '```', 'after']))
+    assert kinds(tokens) == [FENCE_OPEN, CODE_LINE, CODE_LINE, FENCE_CLOSE, PARAGRAPH]
+    assert tokens[0].lang == 'python'
+    assert tokens[1].text == '# not a heading'
+
+
+def test_fence_closes_only_with_the_same_marker():
+    tokens = list(tokenize(['~~~', '```', '~~~']))
+    assert kinds(tokens) == [FENCE_OPEN, CODE_LINE, FENCE_CLOSE]
+
+
+def test_list_levels_follow_indentation():
+    tokens = list(tokenize(['- top', '  - nested', '    1. deeper', '- top again']))
+    assert [(token.kind, token.level) for token in tokens] == [
+        (BULLET, 0), (BULLET, 1), (NUMBERED, 2), (BULLET, 0)
+    ]
+
+
+def test_rules_are_not_bullets():
+    assert kinds(tokenize(['***', '- - -', '___', '+++'])) == [RULE, RULE, RULE, PARAGRAPH]
+
+
+def test_iter_blocks_groups_code_and_tables():
+    lines = ['', '# Doc', '```sh', 'echo 1', 'echo 2', '```', '| h1 | h2 |', '|---|:--:|', '| a | b |', 'text']
+    blocks = list(iter_blocks(lines))
+    assert kinds(blocks) == [HEADING, CODE, TABLE, PARAGRAPH]
+    assert blocks[1] == Block(CODE, 'echo 1\necho 2', lang='sh')
+    assert blocks[2].rows == [['h1', 'h2'], ['---', ':--:'], ['a', 'b']]
+
+
+def test_iter_blocks_flushes_unclosed_blocks():
+    assert list(iter_blocks(['```', 'code'])) == [Block(CODE, 'code')]
+    assert kinds(iter_blocks(['| a |'])) == [TABLE]
+
+
+def test_iter_blocks_streams():
+    def lines():
+        yield '# First'
+        raise AssertionError('read past the first block')
+
+    assert next(iter_blocks(lines())) == Block(HEADING, 'First', level=1)
+
+
+def test_split_table_row_with_and_without_outer_pipes():
+    assert split_table_row('| a | b |') == ['a', 'b']
+    assert split_table_row('a | b') == ['a', 'b']
+    assert split_table_row('|  | b|') == ['', 'b']
+
+
+def test_normalize_table_drops_alignment_row_and_pads():
+    rows = [['Name', 'Qty', 'Note'], [':---', '---:', ':-:'], ['apple', '3']]
+    assert is_alignment_row(rows[1])
+    assert not is_alignment_row(rows[2])
+    body, alignments = normalize_table(rows)
+    assert body == [['Name', 'Qty', 'Note'], ['apple', '3', '']]
+    assert alignments == ['left', 'right', 'center']
+
+
+def test_normalize_table_without_alignment_row():
+    body, alignments = normalize_table([['a'], ['b', 'c']])
+    assert body == [['a', ''], ['b', 'c']]
+    assert alignments == [None, None]
@@ -0,0 +1,66 @@
+from markdown_inline import Run, has_markup, heading_id, parse_inline, plain_text
+
+
+def plain(text, **formats):
+    return Run(text, formats.get('bold', False), formats.get('italic', False), formats.get('strike', False),
+               formats.get('code', False), formats.get('link'))
+
+
+def test_plain_text_is_one_run():
+    assert not has_markup('Just words, 100%.')
+    assert parse_inline('Just words, 100%.') == [plain('Just words, 100%.')]
+    assert parse_inline('') == []
+
+
+def test_emphasis_and_strikethrough():
+    assert parse_inline('a **b** *c* __d__ _e_ ~~f~~') == [
+        plain('a '), plain('b', bold=True), plain(' '), plain('c', italic=True), plain(' '),
+        plain('d', bold=True), plain(' '), plain('e', italic=True), plain(' '), plain('f', strike=True),
+    ]
+
+
+def test_bold_italic_nesting():
+    assert parse_inline('***both*** and **bold *and italic***') == [
+        plain('both', bold=True, italic=True), plain(' and '), plain('bold ', bold=True),
+        plain('and italic', bold=True, italic=True),
+    ]
+
+
+def test_unmatched_delimiters_and_snake_case_stay_literal():
+    assert parse_inline('2 * 3 = 6 and **open') == [plain('2 * 3 = 6 and **open')]
+    assert parse_inline('call snake_case_name()') == [plain('call snake_case_name()')]
+
+
+def test_escapes_merge_into_one_run():
+    assert parse_inline('a \\*b\\* c') == [plain('a *b* c')]
+
+
+def test_code_spans_keep_their_contents():
+    assert parse_inline('run `x **y**` now') == [plain('run '), plain('x **y**', code=True), plain(' now')]
+    assert parse_inline('``a ` b``') == [plain('a ` b', code=True)]
+    assert parse_inline('`unclosed') == [plain('`unclosed')]
+
+
+def test_links_and_autolinks():
+    assert parse_inline('see [the **docs**](https://example.com "Docs") or <mailto:a@b.c>') == [
+        plain('see '), plain('the ', link='https://example.com'),
+        plain('docs', bold=True, link='https://example.com'), plain(' or '),
+        plain('mailto:a@b.c', link='mailto:a@b.c'),
+    ]
+
+
+def test_plain_text_drops_markup():
+    assert plain_text('**Deploy** the `api` [now](x)') == 'Deploy the api now'
+
+
+def test_heading_id_matches_pandoc():
+    assert heading_id('Deployment & Rollback') == 'deployment-rollback'
+    assert heading_id('1.2 **Payment** Webhooks') == 'payment-webhooks'
+    assert heading_id('v2.0_release-notes') == 'v2.0_release-notes'
+    assert heading_id('123') == 'section'
+
+
+def test_heading_id_numbers_duplicates():
+    used = set()
+    assert [heading_id('Setup', used) for _ in range(3)] == ['setup', 'setup-1', 'setup-2']
+    assert heading_id('Setup 1', used) == 'setup-1-1'
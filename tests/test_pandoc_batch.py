@@ -0,0 +1,135 @@
+import os
+import re
+import sys
+import time
+
+import pytest
+
+import pandoc_batch
+
+posix_only = pytest.mark.skipif(os.name != 'posix', reason='the fake pandoc is a POSIX script')
+
+
+def lua_long_string(literal):
+    """What Lua reads from a long string literal: up to the first matching closing bracket."""
+    match = re.match(r'\[(=*)\[', literal)
+    assert match, literal
+    close = f']{match.group(1)}]'
+    end = literal.index(close, match.end())
+    assert end + len(close) == len(literal), f'{literal!r} closes early'
+    value = literal[match.end():end]
+    # Lua skips a line break right after the opening bracket
+    return value[1:] if value.startswith('\n') else value
+
+
+@pytest.mark.parametrize('value', [
+    '', 'plain', '/tmp/docs/report.md', 'notes[1]', 'x]', 'x]=', 'a]]b', ']]=]', ']=]]==]', 'C:\\Docs\\a b.md',
+    '\nstarts with a newline',
+])
+def test_lua_string_round_trips(value):
+    assert lua_long_string(pandoc_batch._lua_string(value)) == value
+
+
+FAKE_PANDOC = r'''#!@PYTHON@
+# Stands in for pandoc running the batch filter: converts every job in jobs.tsv,
+# hangs (with a child "PDF engine") on sources named STUCK
+import os, re, subprocess, sys, time
+if '--version' in sys.argv:
+    print('pandoc 3.1.0')
+    sys.exit(0)
+lua = open(sys.argv[sys.argv.index('--lua-filter') + 1], encoding='utf-8').read()
+paths = dict(re.findall(r'local (jobs_path|results_path) = \[=*\[(.*?)\]=*\]', lua))
+data = open(paths['jobs_path'], 'rb').read()
+with open(os.path.join(os.environ['FAKE_PANDOC_LOG'], 'jobs.tsv'), 'ab') as f:
+    f.write(data)
+with open(paths['results_path'], 'w') as results:
+    for line in data.decode('utf-8').splitlines():
+        source, fmt, output, ast = line.split('\t')
+        if 'STUCK' in source:
+            child = subprocess.Popen(['sleep', '60'])
+            open(os.path.join(os.environ['FAKE_PANDOC_LOG'], 'child.pid'), 'w').write(str(child.pid))
+            time.sleep(60)
+        time.sleep(0.2)
+        open(output, 'w').write(fmt)
+        results.write(f'OK\t{output}\t\n')
+        results.flush()
+'''
+
+
+@pytest.fixture
+def fake_pandoc(tmp_path, monkeypatch):
+    path = tmp_path / 'pandoc'
+    path.write_text(FAKE_PANDOC.replace('@PYTHON@', sys.executable), encoding='utf-8')
+    path.chmod(0o755)
+    log = tmp_path / 'log'
+    log.mkdir()
+    monkeypatch.setenv('FAKE_PANDOC_LOG', str(log))
+    monkeypatch.setattr(pandoc_batch.diagrams, 'pandoc_args', lambda: [])
+    return str(path), log
+
+
+def make_jobs(tmp_path, names, formats=('docx', 'pdf')):
+    jobs = []
+    for name in names:
+        source = tmp_path / f'{name}.md'
+        source.write_text('# Doc\n', encoding='utf-8')
+        jobs += [(source, tmp_path / f'{name}.{format_type}', format_type) for format_type in formats]
+    return jobs
+
+
+def alive(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().split(')')[-1].split()[0] != 'Z'
+    except OSError:
+        return False
+
+
+@posix_only
+def test_batch_converts_every_job(tmp_path, fake_pandoc):
+    pandoc, log = fake_pandoc
+    jobs = make_jobs(tmp_path, ['a', 'b'])
+    results = pandoc_batch.convert_batch(jobs, pandoc_path=pandoc)
+    assert all(result['success'] for result in results.values())
+    assert len(results) == 4
+    # Wall-clock time, not the fake pandoc's CPU time
+    assert all(result['seconds'] >= 0.1 for result in results.values())
+    # Rows end in a bare \n on every platform, so the last column has no stray \r
+    assert b'\r' not in (log / 'jobs.tsv').read_bytes()
+
+
+@posix_only
+def test_a_stuck_file_times_out_on_its_own(tmp_path, fake_pandoc):
+    pandoc, log = fake_pandoc
+    jobs = make_jobs(tmp_path, ['a', 'STUCK', 'c'])
+    started = time.monotonic()
+    results = pandoc_batch.convert_batch(jobs, pandoc_path=pandoc, timeout=1)
+    assert time.monotonic() - started < 10
+    by_name = {os.path.basename(output): result for output, result in results.items()}
+    assert by_name['STUCK.docx']['error'] == 'pandoc timed out after 1s'
+    assert not by_name['STUCK.pdf']['success']
+    # The files after the stuck one ran in a fresh pandoc
+    assert by_name['a.pdf']['success'] and by_name['c.docx']['success'] and by_name['c.pdf']['success']
+    # Its PDF engine was killed along with it
+    pid = int((log / 'child.pid').read_text())
+    for _ in range(50):
+        if not alive(pid):
+            break
+        time.sleep(0.05)
+    assert not alive(pid)
+
+
+@posix_only
+def test_missing_results_report_the_pandoc_error(tmp_path, fake_pandoc):
+    pandoc, _ = fake_pandoc
+    broken = tmp_path / 'broken-pandoc'
+    broken.write_text(f'#!/bin/sh\n[ "$1" = --version ] && echo "pandoc 3.1.0" && exit 0\n'
+                      f'echo "Error running filter" >&2\nexit 83\n', encoding='utf-8')
+    broken.chmod(0o755)
+    results = pandoc_batch.convert_batch(make_jobs(tmp_path, ['a']), pandoc_path=str(broken))
+    assert [result['error'] for result in results.values()] == ['Error running filter'] * 2
+
+
+def test_old_or_missing_pandoc(tmp_path):
+    results = pandoc_batch.convert_batch(make_jobs(tmp_path, ['a'], ('docx',)), pandoc_path=str(tmp_path / 'none'))
+    assert list(results.values())[0]['error'].startswith('pandoc >= 2.17 not found')
@@ -0,0 +1,105 @@
+import os
+import time
+
+import pytest
+
+import pandoc_jobs
+from pandoc_jobs import PandocJob
+
+posix_only = pytest.mark.skipif(os.name != 'posix', reason='the test jobs are shell commands')
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(pandoc_jobs, 'RETRY_DELAY', 0.0)
+
+
+def shell_job(tmp_path, script, name='out.docx'):
+    output = tmp_path / name
+    return PandocJob(str(tmp_path / 'in.md'), str(output), 'docx', ['sh', '-c', script.replace('@OUT@', str(output))])
+
+
+def alive(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().split(')')[-1].split()[0] != 'Z'
+    except OSError:
+        return False
+
+
+@posix_only
+def test_successful_job(tmp_path):
+    [result] = pandoc_jobs.iter_results([shell_job(tmp_path, 'echo done > "@OUT@"')])
+    assert result['success'] and result['attempts'] == 1 and result['error'] is None
+
+
+@posix_only
+def test_conversion_errors_are_not_retried(tmp_path):
+    [result] = pandoc_jobs.iter_results([shell_job(tmp_path, 'echo "bad input" >&2; exit 3')], retries=2)
+    assert not result['success']
+    assert result['attempts'] == 1
+    assert result['error'] == 'bad input'
+
+
+@posix_only
+def test_crashes_are_retried(tmp_path):
+    marker = tmp_path / 'crashed-once'
+    script = f'if [ -e "{marker}" ]; then echo ok > "@OUT@"; else touch "{marker}"; kill -9 $$; fi'
+    [result] = pandoc_jobs.iter_results([shell_job(tmp_path, script)], retries=1)
+    assert result['success'] and result['attempts'] == 2
+
+
+@posix_only
+def test_timeout_kills_the_process_group_and_retries(tmp_path):
+    pids = tmp_path / 'pids'
+    # The child stands in for the PDF engine pandoc starts
+    script = f'sleep 60 & echo $! >> "{pids}"; echo partial > "@OUT@"; wait'
+    started = time.monotonic()
+    [result] = pandoc_jobs.iter_results([shell_job(tmp_path, script)], timeout=0.5, retries=1)
+    assert time.monotonic() - started < 10
+    assert not result['success']
+    assert result['attempts'] == 2
+    assert result['error'] == 'pandoc timed out after 0.5s'
+    assert not (tmp_path / 'out.docx').exists()
+    children = [int(pid) for pid in pids.read_text().split()]
+    assert len(children) == 2
+    assert not any(alive(pid) for pid in children)
+
+
+@posix_only
+def test_results_stream_as_jobs_finish(tmp_path):
+    jobs = [shell_job(tmp_path, 'sleep 1; echo > "@OUT@"', 'slow.docx'),
+            shell_job(tmp_path, 'echo > "@OUT@"', 'fast.docx')]
+    order = [os.path.basename(result['output']) for result in pandoc_jobs.iter_results(jobs, concurrency=2)]
+    assert order == ['fast.docx', 'slow.docx']
+
+
+def test_missing_executable(tmp_path):
+    job = PandocJob('in.md', str(tmp_path / 'out.docx'), 'docx', [str(tmp_path / 'no-pandoc')])
+    [result] = pandoc_jobs.iter_results([job])
+    assert result['error'].startswith('Could not start pandoc')
+
+
+def test_errors_in_the_runner_reach_the_caller():
+    with pytest.raises(AttributeError):
+        list(pandoc_jobs.iter_results([('not', 'a', 'job')]))
+
+
+@posix_only
+def test_closing_early_kills_running_jobs(tmp_path):
+    pids = tmp_path / 'pids'
+    jobs = [shell_job(tmp_path, 'echo > "@OUT@"', 'fast.docx'),
+            shell_job(tmp_path, f'sleep 60 & echo $! >> "{pids}"; wait', 'slow.docx')]
+    results = pandoc_jobs.iter_results(jobs, concurrency=2)
+    assert os.path.basename(next(results)['output']) == 'fast.docx'
+    for _ in range(50):
+        if pids.exists() and pids.read_text().strip():
+            break
+        time.sleep(0.05)
+    results.close()
+    pid = int(pids.read_text())
+    for _ in range(50):
+        if not alive(pid):
+            break
+        time.sleep(0.05)
+    assert not alive(pid)
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+
+import pytest
+
+import search_index
+
+
+def has_fts5():
+    try:
+        sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE t USING fts5(x)')
+    except sqlite3.Error:
+        return False
+    return True
+
+
+pytestmark = pytest.mark.skipif(not has_fts5(), reason='SQLite is built without FTS5')
+
+GUIDE = '''Intro about the payment service.
+
+# Deployment
+
+Roll out with the **blue-green** script.
+
+## Rollback
+
+Run `rollback.sh` to restore the previous release.
+'''
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    guide = tmp_path / 'GUIDE.md'
+    guide.write_text(GUIDE, encoding='utf-8')
+    notes = tmp_path / 'NOTES.md'
+    notes.write_text('# Webhooks\n\nThe payment webhook retries three times.\n', encoding='utf-8')
+    return tmp_path / 'search.sqlite', guide, notes
+
+
+def headings(index, query):
+    return [result['heading'] for result in search_index.search(query, index_path=index)]
+
+
+def test_document_sections(corpus):
+    _, guide, _ = corpus
+    assert search_index.document_sections(guide) == [
+        ('', '', 'Intro about the payment service.'),
+        ('deployment', 'Deployment', 'Roll out with the blue-green script.'),
+        ('rollback', 'Deployment > Rollback', 'Run rollback.sh to restore the previous release.'),
+    ]
+
+
+def test_search_ranks_and_anchors(corpus):
+    index, guide, notes = corpus
+    assert search_index.update([guide, notes], index) == (2, 0, 0)
+    [result] = search_index.search('restore release', index_path=index)
+    assert result['path'] == str(guide.resolve())
+    assert result['anchor'] == 'rollback'
+    assert '[restore]' in result['snippet']
+    assert sorted(headings(index, 'payment')) == ['', 'Webhooks']
+    # A match in the heading outranks one in the body
+    notes.write_text('# Webhooks\n\nThe payment webhook retries three times.\n\n# Retries\n\nSee webhooks.\n',
+                     encoding='utf-8')
+    search_index.update([notes], index, prune=False)
+    assert headings(index, 'webhooks') == ['Webhooks', 'Retries']
+    assert headings(index, 'rollb*') == ['Deployment > Rollback']
+    assert search_index.search('   ', index_path=index) == []
+
+
+def test_edits_are_reindexed(corpus):
+    index, guide, notes = corpus
+    search_index.update([guide, notes], index)
+    assert search_index.update([guide, notes], index) == (0, 2, 0)
+
+    # Touched without an edit: the text is not indexed again
+    later = guide.stat().st_mtime_ns + 5_000_000_000
+    os.utime(guide, ns=(later, later))
+    assert search_index.update([guide, notes], index) == (0, 2, 0)
+
+    guide.write_text(GUIDE.replace('rollback.sh', 'revert.sh').replace('## Rollback', '## Revert'), encoding='utf-8')
+    assert search_index.update([guide, notes], index) == (1, 1, 0)
+    assert headings(index, 'revert') == ['Deployment > Revert']
+    assert headings(index, 'rollback') == []
+    assert headings(index, 'webhook') == ['Webhooks']
+
+
+def test_deleted_files_drop_out(corpus):
+    index, guide, notes = corpus
+    search_index.update([guide, notes], index)
+    notes.unlink()
+    assert search_index.update([guide], index, prune=False) == (0, 1, 0)
+    assert headings(index, 'webhook') == ['Webhooks']
+    assert search_index.update([guide], index) == (0, 1, 1)
+    assert headings(index, 'webhook') == []
+
+
+def test_outdated_index_is_rebuilt(corpus):
+    index, guide, notes = corpus
+    search_index.update([guide, notes], index)
+    with sqlite3.connect(index) as db:
+        db.execute("UPDATE meta SET value = '0' WHERE key = 'version'")
+    assert search_index.update([guide, notes], index) == (2, 0, 0)
@@ -0,0 +1,77 @@
+import docx
+import pytest
+
+import convert_security_report
+import section_cache
+from markdown_blocks import iter_blocks
+
+SOURCE = '''Preamble text.
+
+# One
+
+First section, with **bold** text.
+
+# Two
+
+| A | B |
+|---|---|
+| 1 | 2 |
+
+# Three
+
+- last
+'''
+
+
+@pytest.fixture
+def caches(tmp_path, monkeypatch):
+    monkeypatch.setattr(section_cache, 'CACHE_DIR', tmp_path / 'sections')
+    built = []
+
+    class RecordingCache(section_cache.SectionCache):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            built.append(self)
+    monkeypatch.setattr(section_cache, 'SectionCache', RecordingCache)
+    return built
+
+
+def build(text, docx_file):
+    convert_security_report.write_blocks_to_word(iter_blocks(text.splitlines(keepends=True)), str(docx_file),
+                                                 cache_sections=True)
+    return [paragraph.text for paragraph in docx.Document(str(docx_file)).paragraphs if paragraph.text]
+
+
+def test_split_sections():
+    sections = section_cache.split_sections(list(iter_blocks(SOURCE.splitlines(keepends=True))))
+    assert len(sections) == 4
+    assert [section[0].text for section in sections[1:]] == ['One', 'Two', 'Three']
+    assert section_cache.split_sections([]) == []
+
+
+def test_only_the_edited_section_is_rendered_again(tmp_path, caches):
+    docx_file = tmp_path / 'report.docx'
+    first = build(SOURCE, docx_file)
+    assert (caches[-1].hits, caches[-1].misses) == (0, 4)
+
+    assert build(SOURCE, docx_file) == first
+    assert (caches[-1].hits, caches[-1].misses) == (4, 0)
+
+    edited = SOURCE.replace('First section', 'The first section')
+    text = build(edited, docx_file)
+    assert (caches[-1].hits, caches[-1].misses) == (3, 1)
+    assert 'The first section, with bold text.' in text
+    assert len(docx.Document(str(docx_file)).tables) == 1
+
+    # The old version of the edited section is dropped when the cache is saved
+    saved = section_cache.SectionCache(docx_file, caches[-1].namespace)
+    assert len(saved.fragments) == 4
+    build(SOURCE, docx_file)
+    assert (caches[-1].hits, caches[-1].misses) == (3, 1)
+
+
+def test_a_new_namespace_starts_empty(tmp_path, caches):
+    docx_file = tmp_path / 'report.docx'
+    build(SOURCE, docx_file)
+    assert section_cache.SectionCache(docx_file, caches[-1].namespace).fragments
+    assert section_cache.SectionCache(docx_file, 'other converter').fragments == {}
@@ -0,0 +1,153 @@
+import json
+
+import pytest
+
+import shards
+from conversion_manifest import BuildManifest
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    monkeypatch.setattr(shards, 'PROJECT_ROOT', tmp_path)
+    files = []
+    for index, size in enumerate([90_000, 40_000, 35_000, 20_000, 8_000, 3_000, 1_000, 500]):
+        md_path = tmp_path / 'docs' / f'REPORT_{index}.md'
+        md_path.parent.mkdir(exist_ok=True)
+        md_path.write_text('# Report\n' + 'x' * size, encoding='utf-8')
+        files.append(md_path)
+    return tmp_path, files
+
+
+def test_parse_shard():
+    assert shards.parse_shard('2/4') == (2, 4)
+    assert shards.parse_shard('1/1') == (1, 1)
+    for spec in ('0/4', '5/4', '1/0', 'two/4', '1-4'):
+        with pytest.raises(ValueError):
+            shards.parse_shard(spec)
+
+
+def test_source_key_is_relative_to_the_project(corpus):
+    root, files = corpus
+    assert shards.source_key(files[0]) == 'docs/REPORT_0.md'
+
+
+def test_weight_counts_crlf_once(tmp_path):
+    unix, windows = tmp_path / 'unix.md', tmp_path / 'windows.md'
+    unix.write_bytes(b'a\nb\n')
+    windows.write_bytes(b'a\r\nb\r\n')
+    assert shards.weight(unix) == shards.weight(windows) == shards.FILE_OVERHEAD_BYTES + 4
+
+
+def test_assign_is_deterministic_and_complete(corpus):
+    _, files = corpus
+    assignment = shards.assign(files, 3)
+    assert set(assignment) == set(files)
+    assert set(assignment.values()) <= {1, 2, 3}
+    assert shards.assign(list(reversed(files)), 3) == assignment
+    assert set(shards.assign(files, 1).values()) == {1}
+
+
+def test_assign_balances_load(corpus):
+    root, files = corpus
+    for index in range(40):
+        md_path = root / 'docs' / f'NOTE_{index}.md'
+        md_path.write_text('n' * (2_000 + 300 * index), encoding='utf-8')
+        files.append(md_path)
+    assignment = shards.assign(files, 4)
+    loads = [sum(shards.weight(p) for p in files if assignment[p] == shard) for shard in range(1, 5)]
+    assert max(loads) <= (1 + shards.BALANCE_SLACK) * sum(loads) / 4 + max(shards.weight(p) for p in files)
+    assert min(loads) > 0
+
+
+def test_assign_keeps_most_files_when_one_is_added(corpus):
+    root, files = corpus
+    before = shards.assign(files, 2)
+    extra = root / 'docs' / 'NEW.md'
+    extra.write_text('new', encoding='utf-8')
+    after = shards.assign(files + [extra], 2)
+    moved = [p for p in files if before[p] != after[p]]
+    assert len(moved) <= len(files) // 2
+
+
+def build_shards(root, files, count, skip=(), extra=()):
+    """Simulate every shard's run; returns the partial manifest paths."""
+    assignment = shards.assign(files, count)
+    planned = [(md_path, 'docx', md_path.with_suffix('.docx')) for md_path in files]
+    partials = []
+    for index in range(1, count + 1):
+        if index in skip:
+            continue
+        manifest = BuildManifest(root / '.conversion-manifest.json')
+        results = []
+        for md_path, _, output in planned:
+            if assignment[md_path] == index or (index, md_path) in extra:
+                output.write_bytes(md_path.read_bytes())
+                manifest.record(md_path, output, 'key', 'python-docx')
+                results.append({'output': str(output), 'success': True, 'error': None})
+        path = shards.partial_path(index, count, root)
+        shards.write_partial(path, index, count, planned, assignment, results, manifest)
+        partials.append(path)
+    return partials, assignment
+
+
+def test_merge_combines_complete_shards(corpus):
+    root, files = corpus
+    partials, _ = build_shards(root, files, 3)
+    data = json.loads(partials[0].read_text(encoding='utf-8'))
+    assert len(data['expected']) == len(files)
+
+    assert shards.merge(partials, root / '.conversion-manifest.json')
+    manifest = BuildManifest(root / '.conversion-manifest.json')
+    for md_path in files:
+        assert manifest.is_up_to_date(md_path, md_path.with_suffix('.docx'), 'key')
+
+
+def test_merge_rejects_a_missing_shard(corpus, capsys):
+    root, files = corpus
+    partials, _ = build_shards(root, files, 3, skip={2})
+    assert not shards.merge(partials, root / '.conversion-manifest.json')
+    assert 'shard 2/3 is missing' in capsys.readouterr().out
+    assert not (root / '.conversion-manifest.json').exists()
+
+
+def test_merge_rejects_outputs_built_twice_or_by_the_wrong_shard(corpus, capsys):
+    root, files = corpus
+    assignment = shards.assign(files, 2)
+    stray = next(p for p in files if assignment[p] == 1)
+    partials, _ = build_shards(root, files, 2, extra={(2, stray)})
+    assert not shards.merge(partials, root / '.conversion-manifest.json')
+    assert 'was built 2 times' in capsys.readouterr().out
+
+    partials, _ = build_shards(root, files, 2)
+    first, second = (json.loads(path.read_text(encoding='utf-8')) for path in partials)
+    key = next(iter(first['outputs']))
+    second['outputs'][key] = first['outputs'].pop(key)
+    for path, data in zip(partials, (first, second)):
+        path.write_text(json.dumps(data), encoding='utf-8')
+    assert not shards.merge(partials, root / '.conversion-manifest.json')
+    assert f'{key} was built by shard 2 but assigned to shard 1' in capsys.readouterr().out
+
+
+def test_merge_reports_failed_outputs(corpus, capsys):
+    root, files = corpus
+    partials, assignment = build_shards(root, files, 2)
+    data = json.loads(partials[1].read_text(encoding='utf-8'))
+    key = next(iter(data['outputs']))
+    data['failed'][key] = 'pandoc crashed'
+    del data['outputs'][key]
+    partials[1].write_text(json.dumps(data), encoding='utf-8')
+    assert not shards.merge(partials, root / '.conversion-manifest.json')
+    assert f'{key} is missing: pandoc crashed' in capsys.readouterr().out
+
+
+def test_merge_rejects_duplicate_or_mismatched_partials(corpus, capsys):
+    root, files = corpus
+    partials, _ = build_shards(root, files, 2)
+    assert not shards.merge([partials[0], partials[0], partials[1]], root / '.conversion-manifest.json')
+    assert 'appears twice' in capsys.readouterr().out
+
+    first = root / 'first.json'
+    first.write_bytes(partials[0].read_bytes())
+    other, _ = build_shards(root, files[:-1], 2)
+    assert not shards.merge([first, other[1]], root / '.conversion-manifest.json')
+    assert 'planned a different build' in capsys.readouterr().out